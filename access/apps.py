@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
 
 
 class AccessConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'access'
+
+    def ready(self):
+        # Services are built on first use (see registry), only publishing
+        # metrics has to start with the first request of every process.
+        if settings.METRICS["PATH"]:
+            from .registry import publish_metrics
+
+            request_started.connect(publish_metrics, dispatch_uid="access.publish_metrics")
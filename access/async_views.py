@@ -0,0 +1,122 @@
+import json
+from uuid import UUID
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from .models import AccessLogStatus, CachedDecision
+from .registry import services
+from .serializers import (
+    BatchAccessSerializer,
+    BatchCheckAccessSerializer,
+    CheckAccessSerializer,
+    GetOperationQuerySerializer,
+    ValidationErrorSerializer,
+)
+from .views import AccessViewSet, _flatten_errors
+
+# Async twins of the hot AccessViewSet endpoints for ASGI servers. They share
+# the viewset's services and decision cache and answer with the same JSON,
+# but skip DRF's sync request cycle and the sync-to-async thread hop.
+
+JSON = "application/json"
+renderer = JSONRenderer()
+
+
+def _json_response(data, response_status: int = status.HTTP_200_OK) -> HttpResponse:
+    return _content_response(renderer.render(data), response_status)
+
+
+def _content_response(content: bytes, response_status: int) -> HttpResponse:
+    response = HttpResponse(content, status=response_status, content_type=JSON)
+    if not content:
+        # Like DRF's Response, one without a body has no media type.
+        del response["Content-Type"]
+    return response
+
+
+def _validation_error(errors) -> HttpResponse:
+    return _json_response(
+        ValidationErrorSerializer({"errors": errors}).data,
+        status.HTTP_422_UNPROCESSABLE_ENTITY,
+    )
+
+
+async def _write_log(entries: list[tuple[str, str, AccessLogStatus]]) -> None:
+    log_service = services.get("log")
+    if log_service.buffered:
+        # Only queues the lines for the writer thread.
+        log_service.write_entries(entries)
+    else:
+        await sync_to_async(log_service.write_entries, thread_sensitive=False)(entries)
+
+
+@require_GET
+async def get_access(request):
+    access_service = services.get("access")
+    decision_cache = services.get("decision_cache")
+
+    cache_key = None
+    if decision_cache is not None:
+        cache_key = (request.GET.get("user"), request.GET.get("resource"), JSON)
+        cached = decision_cache.get(cache_key, access_service.versions)
+        if cached is not None:
+            if cached.log_status is AccessLogStatus.RESOURCE_NOT_FOUND:
+                access_service.forbidden_access.record(cached.user, cached.resource)
+            await _write_log([(cached.user, cached.resource, cached.log_status)])
+            return _content_response(cached.content, cached.status)
+
+    query_ser = CheckAccessSerializer(data=request.GET)
+    if not query_ser.is_valid():
+        return _validation_error(query_ser.errors)
+
+    user, resource = query_ser.data["user"], query_ser.data["resource"]
+    version = access_service.versions.get(user, 0)
+    log_status, response_status, data = AccessViewSet._access_decision(access_service.check_access(user, resource))
+    await _write_log([(user, resource, log_status)])
+
+    content = renderer.render(data)
+    if cache_key is not None:
+        decision_cache.put(cache_key, CachedDecision(version, response_status, data, content, log_status, user, resource))
+    return _content_response(content, response_status)
+
+
+@csrf_exempt
+@require_POST
+async def post_access_batch(request):
+    try:
+        body = json.loads(request.body)
+    except ValueError as exc:
+        return _json_response({"detail": f"JSON parse error - {exc}"}, status.HTTP_400_BAD_REQUEST)
+
+    in_batch = BatchCheckAccessSerializer(data=body)
+    if not in_batch.is_valid():
+        return _validation_error(_flatten_errors(in_batch.errors))
+
+    pairs = [(check["user"], check["resource"]) for check in in_batch.validated_data["checks"]]
+    results, log_entries = AccessViewSet._batch_decisions(pairs, services.get("access").check_access_batch(pairs))
+    await _write_log(log_entries)
+    return _json_response(BatchAccessSerializer({"results": results}).data)
+
+
+@require_GET
+async def get_log_file_status(request):
+    query_ser = GetOperationQuerySerializer(data=request.GET)
+    if not query_ser.is_valid():
+        return _validation_error(query_ser.errors)
+
+    ops_service = services.get("ops")
+    op_id = UUID(query_ser.data.get("id"))
+    wait = query_ser.validated_data.get("wait")
+    if wait:
+        op = await ops_service.wait_operation_async(op_id, timeout=wait)
+    else:
+        op = ops_service.get_operation(op_id)
+
+    if op is None:
+        return _content_response(b"", status.HTTP_410_GONE if ops_service.is_expired(op_id) else status.HTTP_404_NOT_FOUND)
+    return _json_response(AccessViewSet._operation_data(op))
@@ -0,0 +1,328 @@
+import gc
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable
+
+import django
+import rest_framework
+from django.conf import settings
+from rest_framework.test import APIClient
+
+from .models import AccessLogStatus
+from .registry import services
+from .services.access_service import AccessService
+from .services.decision_cache import DecisionCache
+from .services.log_service import LogService
+from .services.ops_service import OperationsService
+
+GROUPS = ("access", "log", "ops", "http", "startup")
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+# Grants added per timed chunk, so names for 10M grants are never all in memory.
+CHUNK = 100_000
+LOOKUPS = 100_000
+# Expiring grants get deadlines spread over this many seconds.
+EXPIRY_SPREAD = 24 * 60 * 60
+LOG_ENTRIES = 20_000
+OPERATIONS = 2_000
+REQUESTS = 2_000
+BATCH_SIZE = 100
+# Run in a fresh interpreter.
+IMPORT_URLS = "import django; django.setup(); import rights_verification_system.urls"
+FIRST_REQUEST = IMPORT_URLS + """
+from django.test import Client
+from django.test.utils import override_settings
+with override_settings(ALLOWED_HOSTS=["localhost"]):
+    Client(HTTP_HOST="localhost").get("/access", {"user": "nobody", "resource": "nothing"})
+"""
+
+
+class Suite:
+    """Microbenchmarks of the services and in-process HTTP benchmarks of AccessViewSet.
+
+    Every benchmark runs ``repeat`` times on data generated from ``seed`` and
+    keeps the per operation time of each run. ``ns_per_op`` is the fastest
+    run, the least disturbed by the rest of the machine, and is what
+    baselines are compared on. The cyclic garbage collector is off while
+    timing.
+    """
+
+    def __init__(self, sizes=DEFAULT_SIZES, repeat: int = 3, seed: int = 0, groups=GROUPS, log: Callable = print):
+        self.sizes = sizes
+        self.repeat = repeat
+        self.seed = seed
+        self.groups = groups
+        self.log = log
+        self.results: dict[str, dict] = {}
+
+    def run(self) -> dict:
+        for group in self.groups:
+            getattr(self, f"bench_{group}")()
+        return {
+            "meta": {
+                "created": datetime.now(timezone.utc).isoformat(),
+                "python": sys.version.split()[0],
+                "django": django.__version__,
+                "djangorestframework": rest_framework.__version__,
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "seed": self.seed,
+                "repeat": self.repeat,
+                "sizes": list(self.sizes),
+            },
+            "results": self.results,
+        }
+
+    def bench_access(self) -> None:
+        for size in self.sizes:
+            runs = []
+            for _ in range(self.repeat):
+                # Drop the previous table before building the next one.
+                service = None
+                gc.collect()
+                service = access_service()
+                elapsed = 0
+                for start in range(0, size, CHUNK):
+                    grants = [grant(i) for i in range(start, min(start + CHUNK, size))]
+                    with timer() as chunk:
+                        for user, resource in grants:
+                            service.add_entry(user, resource, read=True)
+                    elapsed += chunk()
+                runs.append(elapsed)
+            self.record(f"access.add_entry[n={size}]", size, runs)
+
+            rng = random.Random(self.seed)
+            hits = [grant(rng.randrange(size)) for _ in range(LOOKUPS)]
+            misses = [(user, resource + "-missing") for user, resource in hits[:LOOKUPS // 10]]
+            self.measure(f"access.check_access[n={size}]", len(hits), lambda: _check_all(service, hits))
+            self.measure(f"access.check_access_denied[n={size}]", len(misses), lambda: _check_all(service, misses))
+            service = hits = misses = None
+
+            # The same grants with an expiry each, then one sweep past all of them revokes the whole table.
+            runs, sweeps = [], []
+            for _ in range(self.repeat):
+                service = None
+                gc.collect()
+                service = access_service()
+                elapsed = 0
+                for start in range(0, size, CHUNK):
+                    grants = [(*grant(i), 1 + i * 7919 % EXPIRY_SPREAD) for i in range(start, min(start + CHUNK, size))]
+                    with timer() as chunk:
+                        for user, resource, expires_in in grants:
+                            service.add_entry(user, resource, read=True, expires_in=expires_in)
+                    elapsed += chunk()
+                runs.append(elapsed)
+                # Without the scheduler's sweep competing for the locks.
+                service.close()
+                with timer() as sweep:
+                    service.expire_due(time.time() + 2 * EXPIRY_SPREAD)
+                sweeps.append(sweep())
+            self.record(f"access.add_entry_expiring[n={size}]", size, runs)
+            self.record(f"access.expire_due[n={size}]", size, sweeps)
+            service = None
+
+    def bench_log(self) -> None:
+        rng = random.Random(self.seed)
+        entries = [(*grant(rng.randrange(10_000)), rng.choice(list(AccessLogStatus))) for _ in range(LOG_ENTRIES)]
+        for buffered in (False, True):
+            with tempfile.TemporaryDirectory() as log_dir:
+                service = log_service(log_dir, buffered)
+
+                def __write():
+                    for user, resource, status in entries:
+                        service.write_entry(user, resource, status)
+                    service.flush()
+
+                try:
+                    self.measure(f"log.write_entry[buffered={buffered}]", len(entries), __write)
+                finally:
+                    service.close()
+
+    def bench_ops(self) -> None:
+        service = OperationsService(
+            executor="thread",
+            max_workers=settings.OPERATIONS["MAX_WORKERS"],
+            max_operations=settings.OPERATIONS["MAX_OPERATIONS"],
+        )
+
+        runs = []
+        for _ in range(self.repeat):
+            gc.collect()
+            with timer() as elapsed:
+                ids = [service.execute_operation(_noop) for _ in range(OPERATIONS)]
+            runs.append(elapsed())
+            # Waiting is not scheduling overhead, but must not leak into the next run.
+            for op_id in ids:
+                service.wait_operation(op_id, 10)
+        self.record("ops.execute_operation", OPERATIONS, runs)
+
+        def __round_trip():
+            for _ in range(OPERATIONS):
+                service.wait_operation(service.execute_operation(_noop), 10)
+
+        self.measure("ops.round_trip", OPERATIONS, __round_trip)
+
+    def bench_http(self) -> None:
+        rng = random.Random(self.seed)
+        size = 10_000
+        checks = [grant(rng.randrange(size)) for _ in range(REQUESTS)]
+        client = APIClient(HTTP_HOST="localhost")
+        with tempfile.TemporaryDirectory() as log_dir, isolated_views(log_dir) as service:
+            for i in range(size):
+                service.add_entry(*grant(i), read=True)
+
+            def __get():
+                for user, resource in checks:
+                    client.get("/access", {"user": user, "resource": resource})
+
+            def __post():
+                for user, resource in checks:
+                    client.post("/access", {"user": user, "resource": resource, "write": True}, format="json")
+
+            batches = [
+                {"checks": [{"user": user, "resource": resource} for user, resource in checks[i:i + BATCH_SIZE]]}
+                for i in range(0, len(checks), BATCH_SIZE)
+            ]
+
+            def __batch():
+                for batch in batches:
+                    client.post("/access/batch", batch, format="json")
+
+            self.measure("http.get_access", len(checks), __get)
+            self.measure("http.post_access", len(checks), __post)
+            self.measure(f"http.post_access_batch[checks={BATCH_SIZE}]", len(batches), __batch)
+
+    def bench_startup(self) -> None:
+        """Cold start in a new process: interpreter, Django setup and the URL conf, then one request."""
+        with tempfile.TemporaryDirectory() as work_dir:
+            os.makedirs(os.path.join(work_dir, settings.STATIC_URL.lstrip("/"), "log"))
+            self.measure("startup.import_urls", 1, lambda: _run_python(IMPORT_URLS, work_dir))
+            self.measure("startup.first_request", 1, lambda: _run_python(FIRST_REQUEST, work_dir))
+
+    def measure(self, name: str, ops: int, func: Callable[[], None]) -> None:
+        runs = []
+        for _ in range(self.repeat):
+            gc.collect()
+            with timer() as elapsed:
+                func()
+            runs.append(elapsed())
+        self.record(name, ops, runs)
+
+    def record(self, name: str, ops: int, runs: list[int]) -> None:
+        per_op = [run / ops for run in runs]
+        self.results[name] = {
+            "ops": ops,
+            "ns_per_op": round(min(per_op), 1),
+            "median_ns_per_op": round(statistics.median(per_op), 1),
+            "runs_ns_per_op": [round(run, 1) for run in per_op],
+        }
+        self.log(name, self.results[name])
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[dict]:
+    """Per benchmark in both runs, the relative change of ``ns_per_op`` and whether it exceeds ``threshold``."""
+    changes = []
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        change = result["ns_per_op"] / base["ns_per_op"] - 1
+        changes.append({
+            "name": name,
+            "ns_per_op": result["ns_per_op"],
+            "baseline_ns_per_op": base["ns_per_op"],
+            "change": round(change, 4),
+            "regression": change > threshold,
+        })
+    return changes
+
+
+def grant(i: int) -> tuple[str, str]:
+    # Ten resources per user, like a directory of a few files each.
+    return f"user{i // 10}", f"/data/{i // 10}/file{i % 10}"
+
+
+def access_service() -> AccessService:
+    return AccessService(
+        forbidden_capacity=settings.ACCESS["FORBIDDEN_CAPACITY"],
+        holders_index=settings.ACCESS["HOLDERS_INDEX"],
+    )
+
+
+def log_service(log_dir: str, buffered: bool) -> LogService:
+    return LogService(
+        output_log_path=os.path.join(log_dir, ""),
+        buffered=buffered,
+        flush_interval=settings.ACCESS_LOG["FLUSH_INTERVAL"],
+        flush_size=settings.ACCESS_LOG["FLUSH_SIZE"],
+        max_bytes=settings.ACCESS_LOG["MAX_BYTES"],
+        rotate_interval=settings.ACCESS_LOG["ROTATE_INTERVAL"],
+        compression=settings.ACCESS_LOG["COMPRESSION"],
+        index=settings.ACCESS_LOG["INDEX"],
+    )
+
+
+@contextmanager
+def isolated_views(log_dir: str):
+    """Points AccessViewSet at fresh services, so a benchmark neither sees nor changes the served state."""
+    service = access_service()
+    logs = log_service(log_dir, settings.ACCESS_LOG["BUFFERED"])
+    fresh = {
+        "access": service,
+        "log": logs,
+        "decision_cache": DecisionCache(
+            settings.ACCESS["DECISION_CACHE_SIZE"],
+        ) if settings.ACCESS["DECISION_CACHE_SIZE"] else None,
+    }
+    saved = {name: services.replace(name, instance) for name, instance in fresh.items()}
+    try:
+        yield service
+    finally:
+        for name, instance in saved.items():
+            services.replace(name, instance)
+        logs.close()
+
+
+@contextmanager
+def timer():
+    """Yields a function returning the nanoseconds spent in the block, with the garbage collector off."""
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    start = time.perf_counter_ns()
+    end = None
+    try:
+        yield lambda: end - start
+    finally:
+        end = time.perf_counter_ns()
+        if gc_enabled:
+            gc.enable()
+
+
+def _check_all(service: AccessService, pairs: list[tuple[str, str]]) -> None:
+    check_access = service.check_access
+    for user, resource in pairs:
+        check_access(user, resource)
+
+
+def _noop() -> None:
+    pass
+
+
+def _run_python(script: str, work_dir: str) -> None:
+    # The access log path is relative, keep the child's log out of the served one.
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=work_dir,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, (str(settings.BASE_DIR), os.environ.get("PYTHONPATH"))))},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f"Startup benchmark failed:\n{result.stderr}")
@@ -0,0 +1,442 @@
+import asyncio
+import http.client
+import io
+import json
+import math
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from bisect import bisect
+from collections import Counter, defaultdict
+from itertools import accumulate
+from typing import Iterable, Iterator
+
+from .models import AccessLogStatus
+from .services.log_service import COMPRESSORS
+
+ROUTES = ("access", "forbidden", "log", "log_status")
+DEFAULT_MIX = {"access": 90, "forbidden": 4, "log": 1, "log_status": 5}
+OPENERS = {suffix: opener for opener, suffix in COMPRESSORS.values()}
+
+
+class LoadRequest:
+    __slots__ = ("route", "method", "path", "query", "body", "content_type")
+
+    def __init__(self, route: str, method: str, path: str, query: dict | None = None, body: bytes = b"", content_type: str = ""):
+        self.route = route
+        self.method = method
+        self.path = path
+        self.query = urllib.parse.urlencode(query) if query else ""
+        self.body = body
+        self.content_type = content_type
+
+    @classmethod
+    def json(cls, route: str, path: str, data) -> "LoadRequest":
+        return cls(route, "POST", path, body=json.dumps(data).encode(), content_type="application/json")
+
+
+class Zipf:
+    """Ranks ``0..n-1``, rank ``k`` drawn with probability proportional to ``1 / (k + 1) ** s``."""
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.cumulative = list(accumulate(1 / (k + 1) ** s for k in range(n)))
+        self.rng = rng
+
+    def __call__(self) -> int:
+        return bisect(self.cumulative, self.rng.random() * self.cumulative[-1])
+
+
+class SyntheticWorkload:
+    """Requests over ``users`` users with ``resources`` granted resources each, both Zipf popular.
+
+    ``hit_ratio`` of the access checks ask for a granted resource, the rest
+    for a resource nobody holds. ``write_ratio`` of the access requests are
+    POST /access updates of a granted resource, which keep it readable so
+    the hit ratio holds. The other routes are picked by ``mix`` weights.
+    """
+
+    def __init__(
+            self,
+            users: int = 1000,
+            resources: int = 10,
+            zipf: float = 1.1,
+            hit_ratio: float = 0.9,
+            write_ratio: float = 0.05,
+            mix: dict[str, float] | None = None,
+            seed: int = 0,
+    ):
+        self.users = users
+        self.resources = resources
+        self.hit_ratio = hit_ratio
+        self.write_ratio = write_ratio
+        self.mix = mix or DEFAULT_MIX
+        self.rng = random.Random(seed)
+        self.user = Zipf(users, zipf, self.rng)
+        self.resource = Zipf(resources, zipf, self.rng)
+        self.operation_id = None
+
+    def prepare(self, target) -> None:
+        """Grants every user its resources in one bulk request and starts the export polled by log/status/."""
+        grants = "".join(
+            json.dumps({"user": user_name(u), "resource": resource_name(u, r), "read": True}) + "\n"
+            for u in range(self.users)
+            for r in range(self.resources)
+        )
+        _expect(target.request(LoadRequest("setup", "POST", "access/bulk", body=grants.encode(), content_type="application/x-ndjson")))
+        if self.mix.get("log_status"):
+            body = _expect(target.request(LoadRequest("setup", "GET", "log/")))
+            self.operation_id = json.loads(body)["id"]
+
+    def __iter__(self) -> Iterator[LoadRequest]:
+        rng = self.rng
+        routes = list(self.mix)
+        weights = list(accumulate(self.mix.values()))
+        while True:
+            route = routes[bisect(weights, rng.random() * weights[-1])]
+            if route == "access":
+                yield self.access_request()
+            elif route == "forbidden":
+                yield LoadRequest("GET access/forbidden", "GET", "access/forbidden", {"top": 10})
+            elif route == "log":
+                yield LoadRequest("GET log/", "GET", "log/", {"user": user_name(self.user())})
+            else:
+                yield LoadRequest("GET log/status/", "GET", "log/status/", {"id": self.operation_id})
+
+    def access_request(self) -> LoadRequest:
+        u, r = self.user(), self.resource()
+        if self.rng.random() < self.write_ratio:
+            return LoadRequest.json("POST access", "access", {
+                "user": user_name(u),
+                "resource": resource_name(u, r),
+                "read": True,
+                "write": self.rng.random() < 0.5,
+            })
+        resource = resource_name(u, r) if self.rng.random() < self.hit_ratio else f"/data/{u}/missing{r}"
+        return LoadRequest("GET access", "GET", "access", {"user": user_name(u), "resource": resource})
+
+
+class ReplayWorkload:
+    """GET /access for every entry of captured access logs, in order.
+
+    Segments compressed by log rotation are read too. ``prepare`` grants read
+    access to the pairs logged as successful and registers every other user
+    that was known, with a grant without rights on a resource the log never
+    names, so denied checks come out denied rather than for an unknown user.
+    Users the log only ever found unknown stay unknown.
+    """
+
+    def __init__(self, paths: list[str]):
+        self.paths = paths
+
+    def prepare(self, target) -> None:
+        granted, known, resources = set(), set(), set()
+        for user, resource, status in self.entries():
+            resources.add(resource)
+            if status == AccessLogStatus.SUCCESS.value:
+                granted.add((user, resource))
+            elif status != AccessLogStatus.USER_NOT_FOUND.value:
+                known.add(user)
+        placeholder = "/replay-placeholder"
+        while placeholder in resources:
+            placeholder += "_"
+
+        grants = [{"user": user, "resource": resource, "read": True} for user, resource in granted]
+        grants += [{"user": user, "resource": placeholder} for user in known - {user for user, _ in granted}]
+        if grants:
+            body = "".join(json.dumps(grant) + "\n" for grant in grants)
+            _expect(target.request(LoadRequest("setup", "POST", "access/bulk", body=body.encode(), content_type="application/x-ndjson")))
+
+    def __iter__(self) -> Iterator[LoadRequest]:
+        for user, resource, _ in self.entries():
+            yield LoadRequest("GET access", "GET", "access", {"user": user, "resource": resource})
+
+    def entries(self) -> Iterator[tuple[str, str, str]]:
+        for path in self.paths:
+            opener = next((opener for suffix, opener in OPENERS.items() if path.endswith(suffix)), open)
+            with opener(path, "rt", encoding="utf-8") as log_file:
+                next(log_file, None)
+                for line in log_file:
+                    # Users have no ';', resources may.
+                    user, rest = line.rstrip("\n").split(";", 1)
+                    resource, status = rest.rsplit(";", 1)
+                    yield user, resource, status
+
+
+class HTTPTarget:
+    """A running server at ``url``, one keep-alive connection per thread."""
+
+    def __init__(self, url: str):
+        parts = urllib.parse.urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip("/") + "/"
+        self._local = threading.local()
+
+    def request(self, request: LoadRequest) -> tuple[int, bytes]:
+        url = self.prefix + request.path + ("?" + request.query if request.query else "")
+        headers = {"Content-Type": request.content_type} if request.content_type else {}
+        connection = getattr(self._local, "connection", None)
+        for attempt in range(2):
+            if connection is None:
+                connection = self._local.connection = self.connection_class(self.netloc, timeout=60)
+            try:
+                connection.request(request.method, url, body=request.body or None, headers=headers)
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed an idle keep-alive connection, retry once on a new one.
+                connection.close()
+                connection = self._local.connection = None
+                if attempt:
+                    raise
+
+    def close(self) -> None:
+        pass
+
+
+class WSGITarget:
+    """The project's WSGI application called in this process."""
+
+    def __init__(self):
+        from django.core.wsgi import get_wsgi_application
+
+        self.application = get_wsgi_application()
+
+    def request(self, request: LoadRequest) -> tuple[int, bytes]:
+        environ = {
+            "REQUEST_METHOD": request.method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": "/" + request.path,
+            "QUERY_STRING": request.query,
+            "CONTENT_TYPE": request.content_type,
+            "CONTENT_LENGTH": str(len(request.body)),
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": "localhost",
+            "REMOTE_ADDR": "127.0.0.1",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(request.body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        started = []
+        response = self.application(environ, lambda status, headers, exc_info=None: started.append(status))
+        try:
+            body = b"".join(response)
+        finally:
+            if hasattr(response, "close"):
+                response.close()
+        return int(started[0].split(" ", 1)[0]), body
+
+    def close(self) -> None:
+        pass
+
+
+class ASGITarget:
+    """The project's ASGI application, run on an event loop thread of its own.
+
+    Calls from several threads are served concurrently by that loop, sync
+    views in its thread pool.
+    """
+
+    def __init__(self):
+        from django.core.asgi import get_asgi_application
+
+        self.application = get_asgi_application()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="loadgen-asgi", daemon=True)
+        self._thread.start()
+
+    def request(self, request: LoadRequest) -> tuple[int, bytes]:
+        return asyncio.run_coroutine_threadsafe(self._request(request), self.loop).result()
+
+    async def _request(self, request: LoadRequest) -> tuple[int, bytes]:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": request.method,
+            "scheme": "http",
+            "path": "/" + request.path,
+            "raw_path": ("/" + request.path).encode(),
+            "query_string": request.query.encode(),
+            "root_path": "",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"content-length", str(len(request.body)).encode()),
+            ] + ([(b"content-type", request.content_type.encode())] if request.content_type else []),
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        messages = [{"type": "http.request", "body": request.body, "more_body": False}]
+        disconnected = asyncio.Event()
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # Like a client that stays connected until the response is sent.
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        status = None
+        body = []
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                body.append(message.get("body", b""))
+
+        try:
+            await self.application(scope, receive, send)
+        finally:
+            disconnected.set()
+        return status, b"".join(body)
+
+    def close(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+class LoadReport:
+    """Latencies and status codes per route."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, route: str, status: int | None, latency: float) -> None:
+        self.latencies[route].append(latency)
+        self.statuses[route][status] += 1
+
+    def merge(self, other: "LoadReport") -> None:
+        for route, latencies in other.latencies.items():
+            self.latencies[route].extend(latencies)
+            self.statuses[route].update(other.statuses[route])
+
+    def summary(self, elapsed: float) -> dict:
+        routes = {route: self._route_summary(latencies, self.statuses[route], elapsed) for route, latencies in sorted(self.latencies.items())}
+        everything = LoadReport()
+        for route, latencies in self.latencies.items():
+            everything.latencies["total"].extend(latencies)
+            everything.statuses["total"].update(self.statuses[route])
+        if everything.latencies:
+            routes["total"] = self._route_summary(everything.latencies["total"], everything.statuses["total"], elapsed)
+        return routes
+
+    @staticmethod
+    def _route_summary(latencies: list[float], statuses: Counter, elapsed: float) -> dict:
+        latencies = sorted(latencies)
+        return {
+            "requests": len(latencies),
+            "errors": sum(count for status, count in statuses.items() if status is None or status >= 500),
+            "rps": round(len(latencies) / elapsed, 1) if elapsed else 0,
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "p999_ms": round(percentile(latencies, 0.999) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3),
+            "statuses": {str(status): count for status, count in sorted(statuses.items(), key=lambda item: str(item[0]))},
+        }
+
+
+def run_load(
+        target,
+        requests: Iterable[LoadRequest],
+        rate: float = 0,
+        concurrency: int = 1,
+        duration: float | None = None,
+        limit: int | None = None,
+) -> tuple[LoadReport, float]:
+    """Sends ``requests`` to ``target`` from ``concurrency`` threads until ``duration`` or ``limit`` is reached.
+
+    With a ``rate`` the load is open: request ``i`` is due ``i / rate``
+    seconds after the start and its latency counts from then, so time spent
+    queued behind slow responses is part of it. Without one every thread
+    sends its next request as soon as the last one is answered. Returns the
+    report and the elapsed seconds.
+    """
+    requests = iter(requests)
+    lock = threading.Lock()
+    sent = 0
+    start = time.perf_counter()
+    deadline = start + duration if duration else math.inf
+
+    def __next() -> tuple[LoadRequest, float] | None:
+        nonlocal sent
+        with lock:
+            if limit is not None and sent >= limit:
+                return None
+            request = next(requests, None)
+            if request is None:
+                return None
+            due = start + sent / rate if rate else time.perf_counter()
+            sent += 1
+        return (request, due) if due < deadline else None
+
+    def __worker(report: LoadReport) -> None:
+        while (item := __next()) is not None:
+            request, due = item
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                status, _ = target.request(request)
+            except Exception:
+                status = None
+            report.record(request.route, status, time.perf_counter() - due)
+
+    reports = [LoadReport() for _ in range(concurrency)]
+    threads = [threading.Thread(target=__worker, args=(report,), name=f"loadgen-{i}") for i, report in enumerate(reports)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    for report in reports[1:]:
+        reports[0].merge(report)
+    return reports[0], elapsed
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return math.nan
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        route, _, weight = part.partition("=")
+        if route not in ROUTES:
+            raise ValueError(f"Unknown route {route!r}, expected one of {', '.join(ROUTES)}")
+        mix[route] = float(weight)
+        if mix[route] < 0:
+            raise ValueError(f"Negative weight for {route}")
+    if not any(mix.values()):
+        raise ValueError("The mix needs a positive weight")
+    return mix
+
+
+def user_name(u: int) -> str:
+    return f"user{u}"
+
+
+def resource_name(u: int, r: int) -> str:
+    return f"/data/{u}/file{r}"
+
+
+def _expect(response: tuple[int, bytes]) -> bytes:
+    status, body = response
+    if status != 200:
+        raise RuntimeError(f"Setup request failed with {status}: {body[:200]!r}")
+    return body
@@ -0,0 +1,74 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...benchmarks import DEFAULT_SIZES, GROUPS, Suite, compare
+
+
+class Command(BaseCommand):
+    help = "Benchmark the access, log and operations services and the access endpoints in-process"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default=",".join(map(str, DEFAULT_SIZES)),
+            help="comma separated grant counts for the access service benchmarks, e.g. 1000,10000000",
+        )
+        parser.add_argument("--only", nargs="+", choices=GROUPS, default=GROUPS, help="benchmark groups to run")
+        parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark, the fastest is kept")
+        parser.add_argument("--seed", type=int, default=0, help="seed of the generated lookups and log entries")
+        parser.add_argument("--output", help="write the results as JSON to this file")
+        parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="fail when a benchmark is this much slower than the baseline, 0.2 is 20%%",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",")]
+        except ValueError:
+            raise CommandError(f"Invalid --sizes: {options['sizes']}")
+        if options["repeat"] < 1 or any(size < 1 for size in sizes):
+            raise CommandError("--repeat and --sizes must be positive")
+
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"], encoding="utf-8") as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {e}")
+
+        suite = Suite(
+            sizes=sizes,
+            repeat=options["repeat"],
+            seed=options["seed"],
+            groups=options["only"],
+            log=lambda name, result: self.stdout.write(
+                f"{name:<48} {result['ns_per_op']:>14,.1f} ns/op  (median {result['median_ns_per_op']:,.1f})"
+            ),
+        )
+        results = suite.run()
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output_file:
+                json.dump(results, output_file, indent=2)
+
+        if baseline is None:
+            return
+        changes = compare(results, baseline, options["threshold"])
+        self.stdout.write("")
+        for change in changes:
+            self.stdout.write(
+                f"{change['name']:<48} {change['baseline_ns_per_op']:>14,.1f} -> {change['ns_per_op']:>14,.1f} ns/op"
+                f"  {change['change']:+.1%}{'  REGRESSION' if change['regression'] else ''}"
+            )
+        regressions = [change["name"] for change in changes if change["regression"]]
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} benchmarks over {options['threshold']:.0%} slower than the baseline: "
+                + ", ".join(regressions)
+            )
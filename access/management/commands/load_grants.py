@@ -0,0 +1,80 @@
+import json
+import os
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ...serializers import GrantImportReportSerializer
+from ...services.grant_store import StoreLockedError
+from ...services.import_service import ImportService, iter_csv, iter_ndjson
+from ...registry import services
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", iter_ndjson),
+    "csv": ("text/csv", iter_csv),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream user accesses from an NDJSON or CSV file into the access service. In-process loading into "
+        "ACCESS['STORE_PATH'] is for a stopped server, which reads the grants on its next start"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="NDJSON or CSV file with user, resource, read, write, execute")
+        parser.add_argument("--format", choices=FORMATS, help="input format, guessed from the extension by default")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="rows validated per chunk")
+        parser.add_argument("--url", help="POST the file to a running server's /access/bulk instead of loading in-process")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.endswith(".csv") else "ndjson")
+        media_type, iter_rows = FORMATS[fmt]
+
+        if not os.path.isfile(path):
+            raise CommandError(f"File not found: {path}")
+
+        if options["url"]:
+            report = self._upload(options["url"], path, media_type)
+        else:
+            # Without a store or a shared table the grants would only live as long as this command.
+            if not settings.ACCESS["STORE_PATH"] and not settings.ACCESS["SHARED_TABLE_PATH"]:
+                raise CommandError(
+                    "Grants loaded in-process are lost on exit without ACCESS['STORE_PATH'] or "
+                    "ACCESS['SHARED_TABLE_PATH'], pass --url to load them into a running server"
+                )
+            try:
+                access_service = services.get("access")
+            except StoreLockedError:
+                # A server holds the store: this process would neither share its log nor reach its grants.
+                raise CommandError(
+                    f"{settings.ACCESS['STORE_PATH']} is open in a running server, "
+                    "pass --url to load the grants into it or stop it first"
+                ) from None
+            service = ImportService(access_service, chunk_size=options["chunk_size"])
+            with open(path, encoding="utf-8", newline="") as grants_file:
+                report = GrantImportReportSerializer(service.load(iter_rows(grants_file))).data
+
+        for error in report["errors"]:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        self.stdout.write(
+            f"{report['total']} rows: {report['created']} created, "
+            f"{report['updated']} updated, {report['failed']} failed"
+        )
+
+    @staticmethod
+    def _upload(url: str, path: str, media_type: str) -> dict:
+        with open(path, "rb") as grants_file:
+            request = urllib.request.Request(
+                url,
+                data=grants_file,
+                method="POST",
+                headers={
+                    "Content-Type": media_type,
+                    "Content-Length": str(os.path.getsize(path)),
+                },
+            )
+            with urllib.request.urlopen(request) as response:
+                return json.load(response)
@@ -0,0 +1,117 @@
+import json
+import logging
+import tempfile
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...benchmarks import isolated_views
+from ...loadgen import (
+    ASGITarget,
+    HTTPTarget,
+    ReplayWorkload,
+    SyntheticWorkload,
+    WSGITarget,
+    parse_mix,
+    run_load,
+)
+
+TARGETS = {
+    "wsgi": WSGITarget,
+    "asgi": ASGITarget,
+}
+
+
+class Command(BaseCommand):
+    help = "Drive the access and log routes with synthetic or replayed traffic and report latency per route"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            default="wsgi",
+            help="'wsgi' or 'asgi' for the app in this process, or the URL of a running server",
+        )
+        parser.add_argument("--rate", type=float, default=0, help="requests per second, 0 sends as fast as answered")
+        parser.add_argument("--duration", type=float, default=10, help="seconds to run, 0 for no limit")
+        parser.add_argument("--requests", type=int, help="stop after this many requests")
+        parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at most")
+        parser.add_argument("--replay", nargs="+", metavar="PATH", help="replay captured access.csv files instead")
+        parser.add_argument("--users", type=int, default=1000, help="synthetic users")
+        parser.add_argument("--resources", type=int, default=10, help="granted resources per synthetic user")
+        parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of user and resource popularity")
+        parser.add_argument("--hit-ratio", type=float, default=0.9, help="share of checks for a granted resource")
+        parser.add_argument("--write-ratio", type=float, default=0.05, help="share of access requests that are POSTs")
+        parser.add_argument(
+            "--mix",
+            default="access=90,forbidden=4,log=1,log_status=5",
+            help="route weights of access, forbidden, log and log_status",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic workload")
+        parser.add_argument("--no-setup", action="store_true", help="skip granting the workload's resources first")
+        parser.add_argument("--output", help="write the report as JSON to this file")
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be positive")
+        if options["replay"]:
+            workload = ReplayWorkload(options["replay"])
+        else:
+            try:
+                mix = parse_mix(options["mix"])
+            except ValueError as e:
+                raise CommandError(f"Invalid --mix: {e}")
+            if options["users"] < 1 or options["resources"] < 1:
+                raise CommandError("--users and --resources must be positive")
+            workload = SyntheticWorkload(
+                users=options["users"],
+                resources=options["resources"],
+                zipf=options["zipf"],
+                hit_ratio=options["hit_ratio"],
+                write_ratio=options["write_ratio"],
+                mix=mix,
+                seed=options["seed"],
+            )
+
+        with ExitStack() as stack:
+            if options["target"] in TARGETS:
+                # The app in this process gets fresh services, its grants and logs are left alone.
+                stack.enter_context(isolated_views(stack.enter_context(tempfile.TemporaryDirectory())))
+                target = TARGETS[options["target"]]()
+            elif options["target"].startswith(("http://", "https://")):
+                target = HTTPTarget(options["target"])
+            else:
+                raise CommandError(f"Invalid --target: {options['target']}")
+            stack.callback(target.close)
+            # Denied and missing accesses are part of the workload, not worth a warning each.
+            request_logger = logging.getLogger("django.request")
+            stack.callback(request_logger.setLevel, request_logger.level)
+            request_logger.setLevel(logging.ERROR)
+
+            try:
+                if not options["no_setup"]:
+                    workload.prepare(target)
+                report, elapsed = run_load(
+                    target,
+                    workload,
+                    rate=options["rate"],
+                    concurrency=options["concurrency"],
+                    duration=options["duration"] or None,
+                    limit=options["requests"],
+                )
+            except (OSError, RuntimeError, ValueError) as e:
+                raise CommandError(str(e))
+
+        summary = report.summary(elapsed)
+        self.stdout.write(
+            f"{'route':<22} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'p999 ms':>9}  statuses"
+        )
+        for route, result in summary.items():
+            self.stdout.write(
+                f"{route:<22} {result['requests']:>9} {result['errors']:>7} {result['rps']:>9.1f} "
+                f"{result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['p999_ms']:>9.3f}  "
+                + " ".join(f"{status}:{count}" for status, count in result["statuses"].items())
+            )
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output_file:
+                json.dump({"elapsed": round(elapsed, 3), "routes": summary}, output_file, indent=2)
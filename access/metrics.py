@@ -0,0 +1,280 @@
+import atexit
+import fcntl
+import math
+import mmap
+import os
+import struct
+import zlib
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable
+
+# magic, layout checksum, pid
+HEADER = struct.Struct("<8sQQ")
+MAGIC = b"RVSMET01"
+MAX_SLOTS = 4096
+FILE_SIZE = HEADER.size + MAX_SLOTS * 8
+# Guards folding the files of exited processes against reading them.
+LOCK_NAME = "metrics.lock"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds, from in-memory lookups up to disk writes.
+LATENCY_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Counter:
+    __slots__ = ("_registry", "_offset")
+
+    def __init__(self, registry: "MetricsRegistry", offset: int):
+        self._registry = registry
+        self._offset = offset
+
+    def inc(self, amount: float = 1) -> None:
+        self._registry.values[self._offset] += amount
+
+
+class Histogram:
+    __slots__ = ("_registry", "_offset", "_bounds", "_sum")
+
+    def __init__(self, registry: "MetricsRegistry", offset: int, bounds: tuple[float, ...]):
+        self._registry = registry
+        self._offset = offset
+        self._bounds = bounds
+        self._sum = offset + len(bounds) + 1
+
+    def observe(self, value: float) -> None:
+        values = self._registry.values
+        # Buckets are stored non-cumulative, bisect_left keeps ``le`` inclusive.
+        values[self._offset + bisect_left(self._bounds, value)] += 1
+        values[self._sum] += value
+
+
+class MetricsRegistry:
+    """Counters, histograms and gauges of one process in a flat list of floats.
+
+    Every metric owns fixed slots, so recording one is an unlocked list index
+    update; a racing update from another thread can in rare cases be lost.
+    With a directory ``refresh`` copies the list of each process to its own
+    ``<pid>.metrics`` file there, and ``render`` adds up the counters and
+    histograms of every file. The file of an exited process is added to the
+    ``totals-<checksum>.metrics`` file of its layout and removed, by the next
+    ``render`` or by a process that gets its pid, so totals never go back and
+    a reused pid does not wipe them. Other processes are as recent as their
+    last refresh. Gauges are sampled by ``refresh`` too and rendered per
+    ``pid`` for live processes only.
+    """
+
+    def __init__(self, directory: str | None = None):
+        # (kind, name, help, labels, offset, bounds or gauge reader)
+        self.metrics: list[tuple] = []
+        self.size = 0
+        self.checksum = 0
+        self.directory = None
+        self.pid = os.getpid()
+        self._mm = None
+        # The file this process has mapped, any other one under its pid was left by an exited process.
+        self._own_path = None
+        self.values: list[float] = []
+        if directory is not None:
+            self.open(directory)
+        os.register_at_fork(after_in_child=self._reset)
+
+    def counter(self, name: str, help: str, **labels: str) -> Counter:
+        return Counter(self, self._add("counter", name, help, labels, 1))
+
+    def histogram(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS, **labels: str) -> Histogram:
+        return Histogram(self, self._add("histogram", name, help, labels, len(buckets) + 2, buckets), buckets)
+
+    def gauge(self, name: str, help: str, read: Callable[[], float], **labels: str) -> None:
+        self._add("gauge", name, help, labels, 1, read)
+
+    def open(self, directory: str) -> None:
+        """Publishes this process's values through a file in ``directory`` shared with other processes."""
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.pid = os.getpid()
+        self._map()
+        self.refresh()
+        atexit.register(self.refresh)
+
+    def refresh(self) -> None:
+        values = self.values
+        for kind, _, _, _, offset, read in self.metrics:
+            if kind == "gauge":
+                # A failing reader must not break the whole scrape.
+                try:
+                    values[offset] = float(read())
+                except Exception:
+                    values[offset] = math.nan
+        if self._mm is not None:
+            struct.pack_into(f"{self.size}d", self._mm, HEADER.size, *values)
+
+    def render(self) -> str:
+        """Text exposition format 0.0.4 of this process, or of every process sharing the directory."""
+        self.refresh()
+        processes = self._collect()
+        totals = [0.0] * self.size
+        for _, values in processes:
+            for i in range(self.size):
+                totals[i] += values[i]
+
+        lines = []
+        described = set()
+        for kind, name, help, labels, offset, extra in self.metrics:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                lines.append(f"{name}{_labels(labels)} {_number(totals[offset])}")
+            elif kind == "histogram":
+                count = 0.0
+                for i, bound in enumerate((*extra, math.inf)):
+                    count += totals[offset + i]
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': _number(bound)})} {_number(count)}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(totals[offset + len(extra) + 1])}")
+                lines.append(f"{name}_count{_labels(labels)} {_number(count)}")
+            elif self.directory is None:
+                lines.append(f"{name}{_labels(labels)} {_number(totals[offset])}")
+            else:
+                for pid, values in processes:
+                    # Pid 0 holds the totals of exited processes.
+                    if pid == self.pid or pid and _alive(pid):
+                        lines.append(f"{name}{_labels({**labels, 'pid': str(pid)})} {_number(values[offset])}")
+        return "\n".join(lines) + "\n"
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def _add(self, kind: str, name: str, help: str, labels: dict, size: int, extra=None) -> int:
+        if self.size + size > MAX_SLOTS:
+            raise ValueError(f"More than {MAX_SLOTS} metric slots")
+        offset = self.size
+        self.metrics.append((kind, name, help, labels, offset, extra))
+        self.size += size
+        self.values.extend([0.0] * size)
+        # Files of processes running other code are left out of the totals.
+        self.checksum = zlib.crc32(repr((kind, name, sorted(labels.items()), size)).encode(), self.checksum)
+        if self._mm is not None:
+            HEADER.pack_into(self._mm, 0, MAGIC, self.checksum, self.pid)
+        return offset
+
+    def _map(self) -> None:
+        self.close()
+        path = os.path.join(self.directory, f"{self.pid}.metrics")
+        with self._locked():
+            if path != self._own_path:
+                self._fold(path)
+            with open(path, "w+b") as file:
+                file.truncate(FILE_SIZE)
+                self._mm = mmap.mmap(file.fileno(), FILE_SIZE)
+            HEADER.pack_into(self._mm, 0, MAGIC, self.checksum, self.pid)
+        self._own_path = path
+
+    def _reset(self) -> None:
+        # A forked child counts from zero, in its own file.
+        self.pid = os.getpid()
+        self.values = [0.0] * self.size
+        self._own_path = None
+        if self._mm is not None:
+            self._map()
+
+    def _collect(self) -> list[tuple[int, list[float]]]:
+        own = list(self.values)
+        if self.directory is None:
+            return [(self.pid, own)]
+
+        processes = [(self.pid, own)]
+        # Locked, so no file is read both before and after it is folded.
+        with self._locked():
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".metrics") or entry.path == self._own_path:
+                    continue
+                data = _read(entry.path)
+                if data is None:
+                    continue
+                _, checksum, pid = HEADER.unpack_from(data)
+                if not pid:
+                    continue
+                if not _alive(pid):
+                    self._fold(entry.path)
+                elif checksum == self.checksum:
+                    processes.append((pid, list(struct.unpack_from(f"{self.size}d", data, HEADER.size))))
+            # Read last, it may just have grown.
+            totals = _read(os.path.join(self.directory, f"totals-{self.checksum:08x}.metrics"))
+        if totals is not None:
+            processes.append((0, list(struct.unpack_from(f"{self.size}d", totals, HEADER.size))))
+        return processes
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.directory, LOCK_NAME), "a+b") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _fold(self, path: str) -> None:
+        # Adds the file of an exited process to the totals of its layout,
+        # whichever code it ran, and removes it. Called under the lock.
+        data = _read(path)
+        if data is None:
+            return
+        _, checksum, _ = HEADER.unpack_from(data)
+        totals_path = os.path.join(self.directory, f"totals-{checksum:08x}.metrics")
+        values = struct.unpack_from(f"{MAX_SLOTS}d", data, HEADER.size)
+        totals = _read(totals_path)
+        if totals is not None:
+            values = [a + b for a, b in zip(values, struct.unpack_from(f"{MAX_SLOTS}d", totals, HEADER.size))]
+        temp_path = totals_path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, checksum, 0) + struct.pack(f"{MAX_SLOTS}d", *values))
+        os.replace(temp_path, totals_path)
+        os.remove(path)
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value.is_integer():
+        return str(int(value))
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _read(path: str) -> bytes | None:
+    """Contents of a metrics file, None if gone or not one."""
+    try:
+        with open(path, "rb") as file:
+            data = file.read(FILE_SIZE)
+    except OSError:
+        return None
+    if len(data) != FILE_SIZE or data[:len(MAGIC)] != MAGIC:
+        return None
+    return data
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+metrics = MetricsRegistry()
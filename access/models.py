@@ -1,29 +1,49 @@
 from django.db import models
 import enum
+from datetime import datetime, timezone
 from uuid import UUID
 
 
-class AccessRights:
-    def __init__(self, is_read: bool = False, is_write: bool = False, is_exec: bool = False):
-        self.read = is_read
-        self.write = is_write
-        self.execute = is_exec
+class AccessRights(int):
+    """Read/write/execute rights packed into a 3-bit flag.
 
-    def __eq__(self, other: "AccessRights"):
-        return (
-            self.read == other.read
-            and self.write == other.write
-            and self.execute == other.execute
-        )
+    Instances are immutable and interned: there is exactly one object per
+    combination of rights, so a rights table holds only shared references.
+    """
+    __slots__ = ()
+
+    READ = 1
+    WRITE = 2
+    EXECUTE = 4
+
+    def __new__(cls, is_read: bool = False, is_write: bool = False, is_exec: bool = False):
+        return _ACCESS_RIGHTS[bool(is_read) | bool(is_write) << 1 | bool(is_exec) << 2]
+
+    @classmethod
+    def from_mask(cls, mask: int) -> "AccessRights":
+        return _ACCESS_RIGHTS[mask & 0b111]
+
+    @property
+    def read(self) -> bool:
+        return bool(self & AccessRights.READ)
+
+    @property
+    def write(self) -> bool:
+        return bool(self & AccessRights.WRITE)
 
-    def modify(self, is_read: bool = False, is_write: bool = False, is_exec: bool = False):
-        self.read = is_read
-        self.write = is_write
-        self.execute = is_exec
+    @property
+    def execute(self) -> bool:
+        return bool(self & AccessRights.EXECUTE)
 
     def get_rights(self):
         return self.read, self.write, self.execute
 
+    def __repr__(self) -> str:
+        return f"AccessRights(read={self.read}, write={self.write}, execute={self.execute})"
+
+
+_ACCESS_RIGHTS = tuple(int.__new__(AccessRights, mask) for mask in range(8))
+
 
 class AccessLogStatus(enum.Enum):
     SUCCESS = "SUCCESS"
@@ -41,6 +61,63 @@ class AccessLogEntry:
         return f"{self.user};{self.resource};{self.status}"
 
 
+class ForbiddenAccessStat:
+    __slots__ = ("user", "resource", "count", "error", "first_seen", "last_seen")
+
+    def __init__(self, user: str, resource: str, seen: float, count: int = 1, error: int = 0):
+        self.user = user
+        self.resource = resource
+        self.count = count
+        self.error = error
+        self.first_seen = seen
+        self.last_seen = seen
+
+    @property
+    def first_seen_at(self) -> datetime:
+        return datetime.fromtimestamp(self.first_seen, timezone.utc)
+
+    @property
+    def last_seen_at(self) -> datetime:
+        return datetime.fromtimestamp(self.last_seen, timezone.utc)
+
+
+class CachedDecision:
+    __slots__ = ("version", "status", "data", "content", "log_status", "user", "resource")
+
+    def __init__(
+            self,
+            version: int,
+            status: int,
+            data: dict | None,
+            content: bytes,
+            log_status: AccessLogStatus,
+            user: str,
+            resource: str,
+    ):
+        self.version = version
+        self.status = status
+        self.data = data
+        self.content = content
+        self.log_status = log_status
+        self.user = user
+        self.resource = resource
+
+
+class GrantImportReport:
+    def __init__(self, max_errors: int = 100):
+        self.max_errors = max_errors
+        self.total = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+
+    def add_error(self, line: int, errors: dict) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "errors": errors})
+
+
 class Operation:
     id: UUID
     done: bool
@@ -49,6 +126,7 @@ class Operation:
         self.id = id
         self.done = done
         self.result = result
+        self.finished_at: float | None = None
 
     def __eq__(self, other: "Operation") -> bool:
         return (
@@ -0,0 +1,180 @@
+import os
+import threading
+from typing import Callable
+
+from django.conf import settings
+
+from .metrics import metrics
+from .scheduler import scheduler, IntervalTrigger
+from .services.access_service import AccessService
+from .services.decision_cache import DecisionCache
+from .services.grant_store import GrantStore
+from .services.log_service import LogService
+from .services.ops_service import OperationsService
+from .services.shared_table import SharedGrantTable
+
+
+class ServiceRegistry:
+    """Services built on first use, once per process.
+
+    Importing the views builds nothing, so management commands, test runs
+    and pre-fork masters neither touch the access log nor start threads. A
+    forked child keeps the services registered with ``inherit``, plain
+    in-memory state it shares copy-on-write, and builds the others again,
+    since the threads, pools and connections they own stay in the parent.
+    """
+
+    def __init__(self):
+        self._factories: dict[str, Callable] = {}
+        self._inherit: set[str] = set()
+        self._instances: dict[str, object] = {}
+        # Factories may get the services they depend on.
+        self._lock = threading.RLock()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def register(self, name: str, factory: Callable, inherit: bool = False) -> None:
+        self._factories[name] = factory
+        if inherit:
+            self._inherit.add(name)
+
+    def get(self, name: str):
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._instances:
+                self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def peek(self, name: str):
+        """The service if this process has built it, without building it."""
+        return self._instances.get(name)
+
+    def replace(self, name: str, instance):
+        """Swaps in ``instance``, or drops the service when None, and returns the previous one."""
+        with self._lock:
+            previous = self._instances.pop(name, None)
+            if instance is not None:
+                self._instances[name] = instance
+            return previous
+
+    def _after_fork(self) -> None:
+        self._lock = threading.RLock()
+        self._instances = {name: instance for name, instance in self._instances.items() if name in self._inherit}
+
+
+class ServiceAttribute:
+    """Resolves to a registry service on instances, e.g. ``self.access_service`` in views.
+
+    On the class it is the attribute itself, like a property: DRF and
+    drf-spectacular look at every class attribute while the views load.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return services.get(self.name)
+
+
+def _access_service() -> AccessService:
+    return AccessService(
+        forbidden_capacity=settings.ACCESS["FORBIDDEN_CAPACITY"],
+        store=GrantStore(
+            settings.ACCESS["STORE_PATH"],
+            fsync=settings.ACCESS["STORE_FSYNC"],
+            compact_every=settings.ACCESS["STORE_COMPACT_EVERY"],
+        ) if settings.ACCESS["STORE_PATH"] else None,
+        shared_table=SharedGrantTable(
+            settings.ACCESS["SHARED_TABLE_PATH"],
+            capacity=settings.ACCESS["SHARED_TABLE_CAPACITY"],
+        ) if settings.ACCESS["SHARED_TABLE_PATH"] else None,
+        holders_index=settings.ACCESS["HOLDERS_INDEX"] and not settings.ACCESS["SHARED_TABLE_PATH"],
+        expiry_tick=settings.ACCESS["EXPIRY_TICK"],
+    )
+
+
+def _decision_cache() -> DecisionCache | None:
+    # Other workers change a shared table without bumping this process's versions.
+    if settings.ACCESS["DECISION_CACHE_SIZE"] and not settings.ACCESS["SHARED_TABLE_PATH"]:
+        return DecisionCache(settings.ACCESS["DECISION_CACHE_SIZE"])
+    return None
+
+
+def _log_service() -> LogService:
+    return LogService(
+        buffered=settings.ACCESS_LOG["BUFFERED"],
+        flush_interval=settings.ACCESS_LOG["FLUSH_INTERVAL"],
+        flush_size=settings.ACCESS_LOG["FLUSH_SIZE"],
+        max_bytes=settings.ACCESS_LOG["MAX_BYTES"],
+        rotate_interval=settings.ACCESS_LOG["ROTATE_INTERVAL"],
+        compression=settings.ACCESS_LOG["COMPRESSION"],
+        index=settings.ACCESS_LOG["INDEX"],
+        max_segments=settings.ACCESS_LOG["MAX_SEGMENTS"],
+    )
+
+
+def _ops_service() -> OperationsService:
+    return OperationsService(
+        executor=settings.OPERATIONS["EXECUTOR"],
+        max_workers=settings.OPERATIONS["MAX_WORKERS"],
+        ttl=settings.OPERATIONS["TTL"],
+        max_operations=settings.OPERATIONS["MAX_OPERATIONS"],
+        sweep_interval=settings.OPERATIONS["SWEEP_INTERVAL"],
+    )
+
+
+def _metrics_file():
+    if settings.METRICS["PATH"]:
+        metrics.open(settings.METRICS["PATH"])
+        scheduler.add_job(metrics.refresh, trigger=IntervalTrigger(seconds=settings.METRICS["REFRESH_INTERVAL"]))
+    return metrics
+
+
+def publish_metrics(**_) -> None:
+    """``request_started`` receiver sharing this process's metrics with the others from its first request on."""
+    services.get("metrics_file")
+
+
+services = ServiceRegistry()
+# Grants and cached decisions are plain in-memory state a child can share,
+# unless a store or a shared table backs them: the child then opens its own
+# log, lock file and mapping, and its cache follows its own versions.
+_in_memory = not settings.ACCESS["STORE_PATH"] and not settings.ACCESS["SHARED_TABLE_PATH"]
+services.register("access", _access_service, inherit=_in_memory)
+services.register("decision_cache", _decision_cache, inherit=_in_memory)
+services.register("log", _log_service)
+services.register("ops", _ops_service)
+services.register("metrics_file", _metrics_file)
+
+
+def _gauge(name: str, read: Callable) -> Callable[[], float]:
+    # Scrapes must not build services, say truncate the log of a process that served no request yet.
+    def __read() -> float:
+        service = services.peek(name)
+        return 0 if service is None else read(service)
+    return __read
+
+
+if not settings.ACCESS["SHARED_TABLE_PATH"]:
+    # Counting the users of a shared table scans all of it.
+    metrics.gauge("access_users", "Users holding grants.", _gauge("access", lambda service: len(service.rights)))
+metrics.gauge(
+    "access_forbidden_pairs",
+    "Denied (user, resource) pairs tracked.",
+    _gauge("access", lambda service: len(service.forbidden_access)),
+)
+metrics.gauge(
+    "access_expiring_grants",
+    "Grants waiting for their expiry.",
+    _gauge("access", lambda service: len(service.expiries)),
+)
+metrics.gauge("operations_live", "Operations kept, running or finished.", _gauge("ops", lambda service: len(service.operations)))
+metrics.gauge(
+    "operations_running",
+    "Operations submitted and not finished yet.",
+    _gauge("ops", lambda service: service.get_stats()["running"]),
+)
@@ -0,0 +1,73 @@
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.compat import SHORT_SEPARATORS, LONG_SEPARATORS
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets views negotiate ``text/event-stream`` and renders plain responses as one SSE event."""
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get("response")
+        event = "error" if response is not None and response.status_code >= 400 else "message"
+        return format_event(event, data).encode(self.charset)
+
+
+class MetricsRenderer(BaseRenderer):
+    """Passes through the text exposition format returned by ``MetricsRegistry.render``.
+
+    The media type has no ``version`` parameter because DRF would then not
+    match it against ``*/*``, views set ``metrics.CONTENT_TYPE`` themselves.
+    """
+    media_type = "text/plain"
+    format = "txt"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (data if isinstance(data, str) else json.dumps(data)).encode(self.charset)
+
+
+class LeanJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` output from one encoder built up front.
+
+    Payloads of plain JSON types are encoded without the per call encoder
+    setup, anything else (an ``indent`` media type parameter, dates, decimals)
+    is left to ``JSONRenderer``.
+    """
+    encoder = json.JSONEncoder(
+        ensure_ascii=JSONRenderer.ensure_ascii,
+        allow_nan=not JSONRenderer.strict,
+        separators=SHORT_SEPARATORS if JSONRenderer.compact else LONG_SEPARATORS,
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if accepted_media_type is None or "indent" not in accepted_media_type:
+            try:
+                ret = self.encoder.encode(data)
+            except (TypeError, ValueError):
+                pass
+            else:
+                # Same escaping as JSONRenderer, these are invalid in JavaScript strings.
+                return ret.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029").encode()
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class LeanContentNegotiation(DefaultContentNegotiation):
+    """Picks the only renderer for a missing, ``*/*`` or exact ``Accept`` header without parsing it."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        if len(renderers) == 1 and not format_suffix and self.settings.URL_FORMAT_OVERRIDE not in request.query_params:
+            renderer = renderers[0]
+            if request.META.get("HTTP_ACCEPT", "*/*") in ("*/*", renderer.media_type):
+                return renderer, renderer.media_type
+        return super().select_renderer(request, renderers, format_suffix)
+
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -1,5 +1,41 @@
+import os
+import threading
+
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.base import STATE_STOPPED
 from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+
+class LazyScheduler(BackgroundScheduler):
+    """A ``BackgroundScheduler`` whose thread starts with the first job.
+
+    Importing it runs no thread, so a pre-fork master that schedules nothing
+    forks without one. A forked child gets a stopped scheduler with none of
+    the parent's jobs: they belong to services the child builds again on
+    first use (see ``registry``).
+    """
+
+    def __init__(self, gconfig: dict | None = None, **options):
+        self._config = gconfig or {}, options
+        self._start_lock = threading.Lock()
+        super().__init__(self._config[0], **options)
+        os.register_at_fork(after_in_child=self._reset)
+
+    def add_job(self, *args, **kwargs):
+        if self.state == STATE_STOPPED:
+            with self._start_lock:
+                if self.state == STATE_STOPPED:
+                    self.start()
+        return super().add_job(*args, **kwargs)
+
+    def _reset(self) -> None:
+        # The parent's thread, executor pool and locks did not survive the fork.
+        self._start_lock = threading.Lock()
+        self._event = None
+        self._thread = None
+        gconfig, options = self._config
+        super().__init__(gconfig, **options)
+
 
-scheduler = BackgroundScheduler()
-scheduler.start()
+scheduler = LazyScheduler()
@@ -1,4 +1,15 @@
+import re
+from collections.abc import Mapping
+
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.utils.html import is_html_input
+
+from .models import AccessLogStatus
+from .services.access_service import HOLDER_RIGHTS, INHERIT_SUFFIX, ROLE_PREFIX
+from .services.export_service import EXPORT_FORMATS
+from .services.log_index import MAX_COUNT, parse_cursor
 
 
 class CheckAccessSerializer(serializers.Serializer):
@@ -12,8 +23,104 @@ class AccessSerializer(serializers.Serializer):
     execute = serializers.BooleanField(default=False)
 
 
+class OptionalBooleanField(serializers.BooleanField):
+    # Form posts that leave the field out skip it like JSON ones do,
+    # instead of reading it as an unchecked checkbox.
+    default_empty_html = empty
+
+
+def validate_not_role(value: str) -> str:
+    if value.startswith(ROLE_PREFIX):
+        raise serializers.ValidationError(f"Must not start with '{ROLE_PREFIX}', it marks roles.")
+    return value
+
+
+def validate_grant_resource(value: str) -> str:
+    validate_not_role(value)
+    # Grant keys of inherited grants end this way, a literal one would read as inherit.
+    if value.endswith(INHERIT_SUFFIX):
+        raise serializers.ValidationError(f"Must not end with '{INHERIT_SUFFIX}', grant the parent with inherit instead.")
+    return value
+
+
 class ModifyAccessSerializer(CheckAccessSerializer, AccessSerializer):
-    pass
+    inherit = OptionalBooleanField(required=False)
+    # Seconds until the grant is revoked, up to ten years.
+    expires_in = serializers.IntegerField(required=False, min_value=1, max_value=10 * 365 * 24 * 60 * 60)
+
+    def validate_user(self, value):
+        return validate_not_role(value)
+
+    def validate_resource(self, value):
+        return validate_grant_resource(value)
+
+
+class RoleSerializer(serializers.Serializer):
+    role = serializers.CharField(min_length=3, max_length=20, required=True)
+
+
+class ModifyRoleAccessSerializer(RoleSerializer, AccessSerializer):
+    resource = serializers.CharField(min_length=3, required=True)
+    inherit = OptionalBooleanField(required=False)
+
+    def validate_resource(self, value):
+        return validate_grant_resource(value)
+
+
+class RoleMemberSerializer(RoleSerializer):
+    user = serializers.CharField(min_length=3, max_length=20, required=True)
+
+    def validate_user(self, value):
+        return validate_not_role(value)
+
+
+class BatchCheckAccessSerializer(serializers.Serializer):
+    checks = CheckAccessSerializer(many=True, allow_empty=False, max_length=1000)
+
+
+class AccessDecisionSerializer(CheckAccessSerializer, AccessSerializer):
+    status = serializers.CharField()
+
+
+class BatchAccessSerializer(serializers.Serializer):
+    results = AccessDecisionSerializer(many=True)
+
+
+class GrantImportErrorSerializer(serializers.Serializer):
+    line = serializers.IntegerField()
+    errors = serializers.DictField(
+        child=serializers.ListField(
+            child=serializers.CharField()
+        )
+    )
+
+
+class GrantImportReportSerializer(serializers.Serializer):
+    total = serializers.IntegerField()
+    created = serializers.IntegerField()
+    updated = serializers.IntegerField()
+    failed = serializers.IntegerField()
+    errors = GrantImportErrorSerializer(many=True)
+
+
+class ForbiddenAccessQuerySerializer(serializers.Serializer):
+    # Without any of these the endpoint answers with the plain user to
+    # resources mapping it has always returned.
+    STATS_PARAMS = ("user", "top", "offset", "limit")
+
+    user = serializers.CharField(required=False)
+    top = serializers.IntegerField(required=False, min_value=1, max_value=1000)
+    offset = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+
+class ForbiddenAccessEntrySerializer(serializers.Serializer):
+    user = serializers.CharField()
+    resource = serializers.CharField()
+    count = serializers.IntegerField()
+    error = serializers.IntegerField()
+    first_seen = serializers.DateTimeField(source="first_seen_at")
+    last_seen = serializers.DateTimeField(source="last_seen_at")
 
 
 class ForbiddenAccessSerializer(serializers.Serializer):
@@ -24,6 +131,23 @@ class ForbiddenAccessSerializer(serializers.Serializer):
     )
 
 
+class ForbiddenAccessStatsSerializer(serializers.Serializer):
+    count = serializers.IntegerField()
+    results = ForbiddenAccessEntrySerializer(many=True)
+
+
+class HoldersQuerySerializer(serializers.Serializer):
+    resource = serializers.CharField(min_length=3, required=True)
+    right = serializers.ChoiceField(choices=HOLDER_RIGHTS, required=True)
+    offset = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+
+class HoldersSerializer(serializers.Serializer):
+    count = serializers.IntegerField()
+    results = serializers.ListField(child=serializers.CharField())
+
+
 class ValidationErrorSerializer(serializers.Serializer):
     errors = serializers.DictField(
         child=serializers.ListField(
@@ -32,11 +156,217 @@ class ValidationErrorSerializer(serializers.Serializer):
     )
 
 
+class ExportResultSerializer(serializers.Serializer):
+    path = serializers.CharField(required=False)
+    format = serializers.CharField(required=False)
+    bytes = serializers.IntegerField(required=False)
+    rows = serializers.IntegerField(required=False)
+    segments = serializers.ListField(child=serializers.CharField(), required=False)
+    error = serializers.CharField(required=False)
+
+
 class OperationSerializer(serializers.Serializer):
     id = serializers.CharField(required=True, min_length=36, max_length=36)
     done = serializers.BooleanField()
-    result = serializers.DictField()
+    result = ExportResultSerializer(allow_null=True)
+
+
+class GetLogFileQuerySerializer(serializers.Serializer):
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    user = serializers.CharField(required=False)
+    resource = serializers.CharField(required=False)
+    status = serializers.ChoiceField(choices=[s.value for s in AccessLogStatus], required=False)
+    export_format = serializers.ChoiceField(choices=EXPORT_FORMATS, default="csv")
+    compress = serializers.BooleanField(default=False)
+
+
+class LogQuerySerializer(serializers.Serializer):
+    user = serializers.CharField(required=False)
+    resource = serializers.CharField(required=False)
+    status = serializers.ChoiceField(choices=[s.value for s in AccessLogStatus], required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    group_by = serializers.ChoiceField(choices=["user", "resource", "status"], required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+    # Deep pages of entries should follow `next` instead, an offset costs as many rows as it skips.
+    offset = serializers.IntegerField(min_value=0, max_value=MAX_COUNT, default=0)
+    cursor = serializers.CharField(required=False, help_text="`next` of the previous page of entries.")
+
+    def validate_cursor(self, value):
+        try:
+            parse_cursor(value)
+        except ValueError:
+            raise serializers.ValidationError("Invalid cursor.")
+        return value
+
+    def validate(self, attrs):
+        if "cursor" in attrs and "group_by" in attrs:
+            raise serializers.ValidationError({"cursor": ["Groups are paged with offset."]})
+        return attrs
+
+
+class LogEntrySerializer(serializers.Serializer):
+    time = serializers.DateTimeField()
+    user = serializers.CharField()
+    resource = serializers.CharField()
+    status = serializers.CharField()
+
+
+class LogGroupSerializer(serializers.Serializer):
+    key = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class LogQueryResultSerializer(serializers.Serializer):
+    count = serializers.IntegerField(help_text=f"Matching entries, counted up to {MAX_COUNT}.")
+    entries = LogEntrySerializer(many=True, required=False)
+    next = serializers.CharField(required=False, help_text="Cursor of the next page of entries, null on the last one.")
+    groups = LogGroupSerializer(many=True, required=False)
+
+
+class OperationsStatsSerializer(serializers.Serializer):
+    live = serializers.IntegerField()
+    running = serializers.IntegerField()
+    expired = serializers.IntegerField()
+
+
+class DecisionCacheStatsSerializer(serializers.Serializer):
+    size = serializers.IntegerField()
+    capacity = serializers.IntegerField()
+    hits = serializers.IntegerField()
+    misses = serializers.IntegerField()
+    evictions = serializers.IntegerField()
 
 
 class GetOperationQuerySerializer(serializers.Serializer):
     id = serializers.UUIDField(required=True)
+    wait = serializers.FloatField(required=False, min_value=0, max_value=30)
+
+
+# Characters CharField's ProhibitNullCharacters/ProhibitSurrogateCharacters validators reject.
+PROHIBITED_CHARACTERS = re.compile("[\x00\ud800-\udfff]")
+REJECT = object()
+
+
+class CompiledValidator:
+    """A flat serializer's field rules checked without instantiating it.
+
+    Built once from the serializer's ``CharField``, ``BooleanField`` and
+    ``IntegerField`` fields and its ``validate_<field>`` methods. Returns the data the serializer would
+    for input it accepts, or None for anything else, including input that is
+    only valid through a rarer path such as numbers for strings; the
+    serializer itself then decides and reports the errors.
+    """
+
+    def __init__(self, serializer_class: type[serializers.Serializer]):
+        if serializer_class.validate is not serializers.Serializer.validate:
+            raise TypeError(f"{serializer_class.__name__} has object level validation")
+        serializer = serializer_class()
+        self.fields = []
+        for name, field in serializer.fields.items():
+            if isinstance(field, serializers.BooleanField):
+                check = _compile_boolean(field)
+            elif type(field) is serializers.CharField:
+                check = _compile_char(field)
+            elif type(field) is serializers.IntegerField:
+                check = _compile_integer(field)
+            else:
+                raise TypeError(f"{serializer_class.__name__}.{name} is a {type(field).__name__}")
+            if field.source != name or (field.default is not empty and callable(field.default)):
+                raise TypeError(f"{serializer_class.__name__}.{name} has a source or a callable default")
+            self.fields.append((
+                name,
+                check,
+                field.required,
+                field.default,
+                field.default_empty_html,
+                field.allow_null or not field.required,
+                getattr(serializer, f"validate_{name}", None),
+            ))
+
+    def __call__(self, data) -> dict | None:
+        if not isinstance(data, Mapping):
+            return None
+
+        html = is_html_input(data)
+        validated = {}
+        for name, check, required, default, default_empty_html, empty_blank, validate in self.fields:
+            # Field.get_value(): a form that leaves a field out or blank may mean empty.
+            if html:
+                if name not in data:
+                    value = default_empty_html
+                else:
+                    value = data[name]
+                    if value == "" and empty_blank:
+                        return None
+            else:
+                value = data.get(name, empty)
+
+            if value is empty:
+                if required:
+                    return None
+                if default is empty:
+                    continue
+                value = default
+            else:
+                value = check(value)
+                if value is REJECT:
+                    return None
+
+            if validate is not None:
+                try:
+                    value = validate(value)
+                except (serializers.ValidationError, DjangoValidationError):
+                    return None
+            validated[name] = value
+        return validated
+
+
+def _compile_char(field: serializers.CharField):
+    min_length = field.min_length or 0
+    max_length = field.max_length
+    trim_whitespace = field.trim_whitespace
+
+    def check(value):
+        if type(value) is not str:
+            return REJECT
+        if trim_whitespace:
+            value = value.strip()
+        if not value or len(value) < min_length or (max_length is not None and len(value) > max_length):
+            return REJECT
+        if PROHIBITED_CHARACTERS.search(value):
+            return REJECT
+        return value
+
+    return check
+
+
+def _compile_integer(field: serializers.IntegerField):
+    min_value = field.min_value
+    max_value = field.max_value
+
+    def check(value):
+        # JSON numbers only, strings and floats such as 1.0 are left to the serializer.
+        if type(value) is not int:
+            return REJECT
+        if (min_value is not None and value < min_value) or (max_value is not None and value > max_value):
+            return REJECT
+        return value
+
+    return check
+
+
+def _compile_boolean(field: serializers.BooleanField):
+    values = {
+        **dict.fromkeys(field.FALSE_VALUES, False),
+        **dict.fromkeys(field.TRUE_VALUES, True),
+    }
+
+    def check(value):
+        try:
+            return values.get(value, REJECT)
+        except TypeError:
+            return REJECT
+
+    return check
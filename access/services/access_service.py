@@ -1,11 +1,136 @@
-from ..models import AccessRights, AccessLogEntry, AccessLogStatus
+import os
+import threading
+import weakref
+from contextlib import ExitStack, contextmanager
+from itertools import count, islice
+from sys import intern
+from time import perf_counter, time
+
+from ..metrics import metrics
+from ..models import AccessRights, AccessLogEntry, AccessLogStatus, ForbiddenAccessStat
+from ..scheduler import scheduler, IntervalTrigger
+from .forbidden_tracker import ForbiddenAccessTracker
+from .grant_store import GrantStore
+from .pattern_matcher import PatternMatcher, PatternSet, is_pattern
+from .shared_table import SharedGrantTable, SharedRights
+from .timing_wheel import TimingWheel
+
+# Inherited grants are stored under "<prefix>/**" so persistence and the
+# shared table keep them like any other grant.
+INHERIT_SUFFIX = "/**"
+# Roles are persisted as principals named "@<role>", and a membership as a
+# grant of "@<role>" to the user, so the store needs no format of its own.
+ROLE_PREFIX = "@"
+NO_RIGHTS = AccessRights.from_mask(0)
+HOLDER_RIGHTS = ("read", "write", "execute")
+HOLDER_FLAGS = (AccessRights.READ, AccessRights.WRITE, AccessRights.EXECUTE)
+
+CHECK_SECONDS = metrics.histogram("access_check_seconds", "Time to decide one access check.")
+CHECK_BATCH_SECONDS = metrics.histogram("access_check_batch_seconds", "Time to decide one batch of access checks.")
+EXPIRED = metrics.counter("access_grants_expired_total", "Grants revoked when their expiry passed.")
 
 
 class AccessService:
 
-    def __init__(self):
-        self.rights: dict[str: dict[str: AccessRights]] = {}
-        self.forbidden_access: dict[str: list[str]] = {}
+    def __init__(
+            self,
+            forbidden_capacity: int = 0,
+            store: GrantStore | None = None,
+            shared_table: SharedGrantTable | None = None,
+            holders_index: bool = False,
+            stripes: int = 64,
+            expiry_tick: float = 1.0,
+    ):
+        if store is not None and shared_table is not None:
+            raise ValueError("A shared grant table is already persistent, it cannot be combined with a grant store")
+        if holders_index and shared_table is not None:
+            raise ValueError("Other workers change a shared grant table, a local holders index would miss their grants")
+
+        self.store = store
+        # Writers lock the stripe of their user, role changes reach across
+        # users and take every stripe. Readers take no lock: they only do
+        # single dict lookups, which are atomic, on maps writers update in
+        # place or replace whole.
+        self._locks = tuple(threading.Lock() for _ in range(stripes))
+        self._holders_lock = threading.Lock()
+        # Deadlines of expiring grants by (user, grant key). One scheduler job
+        # sweeps them every tick, so a grant costs no job or timer of its own
+        # and lookups never look at the clock. Taken after the stripe and
+        # store locks.
+        self.expiries = TimingWheel(tick=expiry_tick)
+        self._expiry_lock = threading.Lock()
+        self._expiry_job = None
+        service = weakref.ref(self)
+
+        def after_fork():
+            if service() is not None:
+                service()._after_fork()
+        os.register_at_fork(after_in_child=after_fork)
+        # Per-user maps of interned resource names to one of the 8 shared
+        # AccessRights flags, so a grant costs a single dict slot. With a
+        # shared table the same mapping interface reads the memory-mapped
+        # table every worker process writes to.
+        if shared_table is not None:
+            self.rights: dict[str: dict[str: AccessRights]] = SharedRights(shared_table)
+        else:
+            self.rights = store.load() if store is not None else {}
+
+        # Role grants, and for users in at least one role their own grants and
+        # roles. self.rights keeps the effective rights of those users: their
+        # grants OR-ed with their roles'. Members without grants of their own
+        # share one merged map per distinct set of roles.
+        self.roles: dict[str, dict[str, AccessRights]] = {}
+        self.members: dict[str, set[str]] = {}
+        self.memberships: dict[str, frozenset[str]] = {}
+        self.direct: dict[str, dict[str, AccessRights]] = {}
+        self._combined: dict[frozenset[str], dict[str, AccessRights]] = {}
+        self._combined_users: dict[frozenset[str], int] = {}
+
+        # Per-user tries of inherited grants keyed by path segment, with the
+        # grant of a node under the None key. A shared table can be changed
+        # by other processes, so it is probed ancestor by ancestor instead.
+        # A role's inherited and glob grants are indexed once, under
+        # "@<role>", and members' own ones under their name: lookups of
+        # members consult their roles' tries and patterns too.
+        self.trees: dict[str, dict] | None = None if shared_table is not None else {}
+        # Per-user glob grants compiled into one regex each. They are indexed
+        # at startup and on writes through this service, with a shared table
+        # patterns added by other workers show up after a restart.
+        self.patterns: dict[str, PatternMatcher] = {}
+        # Reverse index of effective grants: resource -> (read, write, execute)
+        # holders, each a dict used as an insertion-ordered set of users so
+        # pages are stable. Every held right costs one dict slot, about 26
+        # bytes with the table's spare room, and the user and resource
+        # strings are the interned ones self.rights already holds.
+        self.holders: dict[str, tuple[dict[str, None], ...]] | None = {} if holders_index else None
+        # With the index, the users holding each inherited or glob grant key,
+        # and the glob keys by first segment: the users a resource's
+        # ancestors and matching patterns cover are found without a scan.
+        self.covering: dict[str, dict[str, None]] | None = {} if holders_index else None
+        self._covering_patterns = PatternSet()
+        # Bumped whenever a user's effective rights change, so cached
+        # decisions for the user can tell they are stale. Drawn from one
+        # counter and dropped with the user: a user granted again later gets
+        # a version no decision was ever cached under.
+        self.versions: dict[str, int] = {}
+        self._version = count(1)
+        if shared_table is None:
+            self._load_roles()
+        for user, user_rights in self.rights.items():
+            if user in self.memberships:
+                # _set_roles tracked their effective rights, their own grants are indexed here.
+                for resource, entry in self.direct[user].items():
+                    self._index(user, resource, entry)
+                continue
+            for resource, entry in user_rights.items():
+                self._index(user, resource, entry)
+                self._track(user, resource, 0, entry)
+        self.forbidden_access = ForbiddenAccessTracker(capacity=forbidden_capacity)
+        if store is not None and store.expiries:
+            for (user, resource), deadline in store.expiries.items():
+                self._set_expiry(user, resource, deadline)
+            # Grants that expired while the service was down.
+            self.expire_due()
 
     def add_entry(
             self,
@@ -13,34 +138,602 @@ class AccessService:
             resource: str,
             read: bool = False,
             write: bool = False,
-            execute: bool = False
+            execute: bool = False,
+            inherit: bool = False,
+            expires_in: float | None = None,
     ) -> None:
+        """Grants ``resource`` to ``user``, revoked ``expires_in`` seconds from now if given.
+
+        Granting it again replaces the expiry, or drops it when there is none.
+        """
+        if expires_in is not None and self.trees is None:
+            raise ValueError("Expiring grants need a grant table local to the process, not a shared one")
+        deadline = None if expires_in is None else time() + expires_in
+
+        resource = self.grant_key(resource, inherit)
+        entry = AccessRights(
+            is_read=read,
+            is_write=write,
+            is_exec=execute
+        )
+        with self._locks[hash(user) % len(self._locks)]:
+            if self.store is None:
+                self._put(user, resource, entry)
+                self._set_expiry(user, resource, deadline)
+                return
+
+            with self._logged() as store:
+                self._put(user, resource, entry)
+                store.append(user, resource, entry)
+                self._set_expiry(user, resource, deadline)
+                if deadline is not None:
+                    store.expire(user, resource, deadline)
+
+    def expire_due(self, now: float | None = None) -> int:
+        """Revokes the grants whose expiry passed, returns how many. The scheduler runs it every tick."""
+        with self._expiry_lock:
+            due = self.expiries.advance(time() if now is None else now)
+        stripes = {}
+        for key, deadline in due:
+            stripes.setdefault(hash(key[0]) % len(self._locks), []).append((key, deadline))
 
+        expired = 0
+        for stripe, entries in stripes.items():
+            with self._locks[stripe], self._logged() as store:
+                with self._expiry_lock:
+                    # Skips grants given again since, with a new expiry or none. Those
+                    # only change under the stripe lock, the rest stay due until deleted.
+                    keys = [key for key, deadline in entries if self.expiries.get(key) == deadline]
+                    for key in keys:
+                        self.expiries.cancel(key)
+                for user, resource in keys:
+                    self._delete(user, resource)
+                    if store is not None:
+                        store.delete(user, resource)
+            expired += len(keys)
+        if expired:
+            EXPIRED.inc(expired)
+        return expired
+
+    def _set_expiry(self, user: str, resource: str, deadline: float | None) -> None:
+        # Callers hold the user's stripe lock.
+        if deadline is None:
+            if self.expiries:
+                with self._expiry_lock:
+                    self.expiries.cancel((user, resource))
+            return
+        with self._expiry_lock:
+            self.expiries.schedule((intern(user), intern(resource)), deadline)
+            if self._expiry_job is None:
+                # On the first expiring grant: most services never get one.
+                self._schedule_sweep()
+
+    def _schedule_sweep(self) -> None:
+        self._expiry_job = scheduler.add_job(self.expire_due, trigger=IntervalTrigger(seconds=self.expiries.tick))
+
+    def _after_fork(self) -> None:
+        # A forked child keeps the grants and their deadlines, but its scheduler lost the sweep.
+        self._expiry_lock = threading.Lock()
+        if self._expiry_job is not None:
+            self._schedule_sweep()
+
+    def close(self) -> None:
+        """Stops sweeping expired grants. The scheduler's job would otherwise keep the service alive."""
+        with self._expiry_lock:
+            if self._expiry_job is not None:
+                self._expiry_job.remove()
+                self._expiry_job = None
+
+    def add_role_entry(
+            self,
+            role: str,
+            resource: str,
+            read: bool = False,
+            write: bool = False,
+            execute: bool = False,
+            inherit: bool = False,
+    ) -> None:
+        self._check_roles_supported()
+        resource = intern(self.grant_key(resource, inherit))
         entry = AccessRights(
             is_read=read,
             is_write=write,
             is_exec=execute
         )
-        if user not in self.rights:
-            self.rights[user] = {}
-        self.rights[user][resource] = entry
+        with self._all_locks(), self._logged() as store:
+            self.roles.setdefault(intern(role), {})[resource] = entry
+            # Only the merged maps of role sets with this role and the members'
+            # own maps can change, and only at this resource.
+            before = {}
+            for roles, combined in self._combined.items():
+                if role in roles:
+                    before[roles] = combined.get(resource, 0)
+                    combined[resource] = self._merge(roles, resource)
+            for user in self.members.get(role, ()):
+                user_rights = self.rights[user]
+                combined = self._combined[self.memberships[user]]
+                if user_rights is combined:
+                    self._track(user, resource, before[self.memberships[user]], combined[resource])
+                else:
+                    self._track(user, resource, user_rights.get(resource, 0), combined[resource] | self.direct[user].get(resource, 0))
+                    user_rights[resource] = AccessRights.from_mask(self.direct[user].get(resource, 0) | combined[resource])
+                self._bump(user)
+            self._index(ROLE_PREFIX + role, resource, entry)
+            if store is not None:
+                store.append(ROLE_PREFIX + role, resource, entry)
+
+    def add_member(self, role: str, user: str) -> None:
+        self._check_roles_supported()
+        with self._all_locks(), self._logged() as store:
+            self.roles.setdefault(intern(role), {})
+            self._set_roles(intern(user), self.memberships.get(user, frozenset()) | {role})
+            if store is not None:
+                store.append(user, ROLE_PREFIX + role, NO_RIGHTS)
+
+    def remove_member(self, role: str, user: str) -> bool:
+        self._check_roles_supported()
+        with self._all_locks(), self._logged() as store:
+            if role not in self.memberships.get(user, ()):
+                return False
+            self._set_roles(user, self.memberships[user] - {role})
+            if store is not None:
+                store.delete(user, ROLE_PREFIX + role)
+        return True
+
+    def get_own_rights(self, user: str) -> dict[str, AccessRights]:
+        """The grants ``user`` was given, without those of their roles: what the store keeps."""
+        if user in self.memberships:
+            return self.direct.get(user, {})
+        return self.rights.get(user, {})
+
+    @contextmanager
+    def _all_locks(self):
+        # Always in stripe order, so two role changes cannot deadlock.
+        with ExitStack() as stack:
+            for lock in self._locks:
+                stack.enter_context(lock)
+            yield
+
+    @contextmanager
+    def _logged(self):
+        # Changes and their log records happen under the store lock, in the same order.
+        if self.store is None:
+            yield None
+            return
+        with self.store.lock:
+            yield self.store
+            if self.store.compaction_due():
+                self.store.compact(self._persisted_state)
+
+    def _check_roles_supported(self) -> None:
+        if self.trees is None:
+            raise ValueError("Roles need a grant table local to the process, not a shared one")
+
+    def _put(self, user: str, resource: str, entry: AccessRights) -> None:
+        resource = intern(resource)
+        # Own grants only: those of the user's roles are indexed under the role.
+        self._index(user, resource, entry)
+        roles = self.memberships.get(user)
+        if roles is not None:
+            self.direct[user][resource] = entry
+            user_rights = self.rights[user]
+            combined = self._combined[roles]
+            if user_rights is combined:
+                user_rights = self.rights[user] = dict(combined)
+            entry = AccessRights.from_mask(entry | combined.get(resource, 0))
+        else:
+            if user not in self.rights:
+                self.rights[intern(user)] = {}
+            user_rights = self.rights[user]
+        if self.holders is not None:
+            self._track(user, resource, user_rights.get(resource, 0), entry)
+        user_rights[resource] = entry
+        self._bump(user)
+
+    def _delete(self, user: str, resource: str) -> None:
+        # Revokes one of the user's own grants, what the user's roles grant stays.
+        roles = self.memberships.get(user)
+        if roles is not None:
+            own = self.direct[user]
+            if own.pop(resource, None) is None:
+                return
+            user_rights = self.rights[user]
+            combined = self._combined[roles]
+            entry = combined.get(resource)
+            before = user_rights.get(resource, 0)
+            if not own:
+                # Back to sharing the merged map of the user's roles.
+                self.rights[user] = combined
+            elif entry is None:
+                del user_rights[resource]
+            else:
+                user_rights[resource] = entry
+        else:
+            user_rights = self.rights.get(user)
+            if user_rights is None or resource not in user_rights:
+                return
+            entry = None
+            before = user_rights.pop(resource)
+            # A shared table tells users apart by a marker of its own, and
+            # counting a user's grants there scans the whole table.
+            if self.trees is not None and not user_rights:
+                del self.rights[user]
+        self._track(user, resource, before, entry or 0)
+        self._unindex(user, resource)
+        self._bump(user)
+
+    def _set_roles(self, user: str, roles: frozenset[str]) -> None:
+        before = self.rights.get(user, {})
+        previous = self.memberships.get(user)
+        if previous is not None:
+            for role in previous - roles:
+                self.members[role].discard(user)
+            self._release(previous)
+            own = self.direct.pop(user)
+        else:
+            own = self.rights.get(user, {})
+        for role in roles:
+            self.members.setdefault(role, set()).add(user)
+
+        if not roles:
+            del self.memberships[user]
+            if own:
+                self.rights[user] = own
+            else:
+                # Neither grants nor roles left.
+                self.rights.pop(user, None)
+        else:
+            self.memberships[user] = roles
+            self.direct[user] = own
+            combined = self._acquire(roles)
+            if own:
+                user_rights = dict(combined)
+                for resource, entry in own.items():
+                    user_rights[resource] = AccessRights.from_mask(entry | combined.get(resource, 0))
+                self.rights[user] = user_rights
+            else:
+                self.rights[user] = combined
+
+        after = self.rights.get(user, {})
+        if self.holders is not None:
+            for resource in before.keys() | after.keys():
+                self._track(user, resource, before.get(resource, 0), after.get(resource, 0))
+        self._bump(user)
+
+    def _bump(self, user: str) -> None:
+        # After the write: a reader that saw the old version cannot cache the new rights under it.
+        if user in self.rights:
+            self.versions[user] = next(self._version)
+        else:
+            self.versions.pop(user, None)
+
+    def _track(self, user: str, resource: str, before: int, after: int) -> None:
+        # Keeps self.holders in step with one effective grant changing from before to after.
+        if self.holders is None or before == after:
+            return
+        with self._holders_lock:
+            self._track_locked(user, resource, before, after)
+
+    def _track_locked(self, user: str, resource: str, before: int, after: int) -> None:
+        holders = self.holders.get(resource)
+        if holders is None:
+            holders = self.holders[intern(resource)] = ({}, {}, {})
+        for flag, users in zip(HOLDER_FLAGS, holders):
+            if after & flag:
+                users[intern(user)] = None
+            else:
+                users.pop(user, None)
+        if not any(holders):
+            del self.holders[resource]
+
+    def get_holders(self, resource: str, right: str, offset: int = 0, limit: int = 100) -> tuple[int, list[str]]:
+        """Users whose check of ``resource`` grants ``right``.
+
+        Those granted the resource itself come first, from the index, in the
+        order they got it. Then, sorted, those covered only by an inherited
+        or glob grant: the users holding a grant on one of the resource's
+        ancestors or a pattern matching it are resolved on every call.
+        """
+        flag = HOLDER_FLAGS[HOLDER_RIGHTS.index(right)]
+        with self._holders_lock:
+            users = self.holders.get(resource, ({}, {}, {}))[HOLDER_RIGHTS.index(right)]
+            page = list(islice(users, offset, offset + limit))
+            count = len(users)
+            candidates = set()
+            prefix = resource
+            while True:
+                candidates.update(self.covering.get(prefix + INHERIT_SUFFIX, ()))
+                cut = prefix.rfind("/")
+                if cut < 0:
+                    break
+                prefix = prefix[:cut]
+            for pattern in self._covering_patterns.matching(resource):
+                candidates.update(self.covering[pattern])
+        roles = [principal for principal in candidates if principal.startswith(ROLE_PREFIX)]
+        if roles:
+            # Memberships change under every stripe lock, so under one they stay put.
+            with self._locks[0]:
+                for principal in roles:
+                    candidates.discard(principal)
+                    candidates.update(self.members.get(principal[len(ROLE_PREFIX):], ()))
+
+        covered = []
+        for user in sorted(candidates):
+            user_rights = self.rights.get(user)
+            # A grant on the resource itself wins over inherited and glob ones, the index has it.
+            if user_rights is None or resource in user_rights:
+                continue
+            entry = self._resolve(user, user_rights, resource)
+            if entry is not None and entry & flag:
+                covered.append(user)
+        if len(page) < limit:
+            page += covered[max(offset - count, 0):max(offset - count, 0) + limit - len(page)]
+        return count + len(covered), page
+
+    def _acquire(self, roles: frozenset[str]) -> dict[str, AccessRights]:
+        combined = self._combined.get(roles)
+        if combined is None:
+            combined = self._combined[roles] = {}
+            for resource in {resource for role in roles for resource in self.roles[role]}:
+                combined[resource] = self._merge(roles, resource)
+        self._combined_users[roles] = self._combined_users.get(roles, 0) + 1
+        return combined
+
+    def _release(self, roles: frozenset[str]) -> None:
+        self._combined_users[roles] -= 1
+        if not self._combined_users[roles]:
+            del self._combined_users[roles]
+            del self._combined[roles]
+
+    def _merge(self, roles: frozenset[str], resource: str) -> AccessRights:
+        mask = 0
+        for role in roles:
+            mask |= self.roles[role].get(resource, 0)
+        return AccessRights.from_mask(mask)
+
+    def _load_roles(self) -> None:
+        # Split what the store loaded back into role grants, memberships and own grants.
+        for principal in [principal for principal in self.rights if principal.startswith(ROLE_PREFIX)]:
+            self.roles[intern(principal[len(ROLE_PREFIX):])] = self.rights.pop(principal)
+            for resource, entry in self.roles[principal[len(ROLE_PREFIX):]].items():
+                self._index(principal, resource, entry)
+        memberships = {}
+        for user, user_rights in self.rights.items():
+            roles = [resource for resource in user_rights if resource.startswith(ROLE_PREFIX)]
+            if roles:
+                for resource in roles:
+                    del user_rights[resource]
+                memberships[user] = frozenset(intern(role[len(ROLE_PREFIX):]) for role in roles)
+        for user, roles in memberships.items():
+            self.roles.update({role: {} for role in roles if role not in self.roles})
+            self._set_roles(user, roles)
+
+    def _persisted_state(self) -> tuple[dict[str, dict[str, AccessRights]], dict[tuple[str, str], float]]:
+        rights = self._persisted_rights()
+        # After the grants: a deadline set since is in the new log with its grant.
+        with self._expiry_lock:
+            return rights, dict(self.expiries.deadlines)
+
+    def _persisted_rights(self) -> dict[str, dict[str, AccessRights]]:
+        # The store keeps own grants, role grants and memberships, never effective rights.
+        # Runs on the compaction thread beside writers: each user is copied
+        # under its stripe lock, role grants under one, which role changes take too.
+        persisted = {}
+        for user in list(self.rights):
+            with self._locks[hash(user) % len(self._locks)]:
+                user_rights = self.rights.get(user)
+                if user_rights is None:
+                    continue
+                roles = self.memberships.get(user)
+                if roles is None:
+                    persisted[user] = dict(user_rights)
+                else:
+                    persisted[user] = {**self.direct[user], **{ROLE_PREFIX + role: NO_RIGHTS for role in roles}}
+        with self._locks[0]:
+            for role, role_rights in self.roles.items():
+                persisted[ROLE_PREFIX + role] = dict(role_rights)
+        return persisted
+
+    def _index(self, user: str, resource: str, entry: AccessRights) -> None:
+        if not is_pattern(resource):
+            return
+        inherited = resource.endswith(INHERIT_SUFFIX) and not is_pattern(resource, 0, len(resource) - len(INHERIT_SUFFIX))
+        if self.covering is not None:
+            with self._holders_lock:
+                self.covering.setdefault(intern(resource), {})[intern(user)] = None
+                if not inherited:
+                    self._covering_patterns.add(resource)
+        if inherited:
+            if self.trees is not None:
+                self._plant(user, resource, entry)
+            return
+        matcher = self.patterns.get(user)
+        if matcher is None:
+            matcher = self.patterns[user] = PatternMatcher()
+        matcher.add(resource, entry)
+
+    def _unindex(self, user: str, resource: str) -> None:
+        if not is_pattern(resource):
+            return
+        inherited = resource.endswith(INHERIT_SUFFIX) and not is_pattern(resource, 0, len(resource) - len(INHERIT_SUFFIX))
+        if self.covering is not None:
+            with self._holders_lock:
+                users = self.covering.get(resource)
+                if users is not None and user in users:
+                    del users[user]
+                    if not users:
+                        del self.covering[resource]
+                        self._covering_patterns.remove(resource)
+        if inherited:
+            if self.trees is not None:
+                self._unplant(user, resource)
+            return
+        matcher = self.patterns.get(user)
+        if matcher is not None:
+            matcher.remove(resource)
+            if not matcher:
+                del self.patterns[user]
+
+    @staticmethod
+    def grant_key(resource: str, inherit: bool = False) -> str:
+        return resource.rstrip("/") + INHERIT_SUFFIX if inherit else resource
+
+    def _plant(self, user: str, resource: str, entry: AccessRights) -> None:
+        node = self.trees.setdefault(user, {})
+        for part in resource[:-len(INHERIT_SUFFIX)].split("/"):
+            node = node.setdefault(intern(part), {})
+        node[None] = entry
+
+    def _unplant(self, user: str, resource: str) -> None:
+        node = self.trees.get(user)
+        path = []
+        for part in resource[:-len(INHERIT_SUFFIX)].split("/"):
+            if node is None:
+                return
+            path.append((node, part))
+            node = node.get(part)
+        if node is None or node.pop(None, None) is None:
+            return
+        # Prune the branch left empty, so revoked grants leave no nodes behind.
+        for parent, part in reversed(path):
+            if parent[part]:
+                break
+            del parent[part]
+        if not self.trees[user]:
+            del self.trees[user]
+
+    def _resolve(self, user: str, user_rights, resource: str) -> AccessRights | None:
+        # Grants that cover a resource without naming it: inherited ones first, then patterns.
+        roles = self.memberships.get(user)
+        if roles is not None:
+            return self._resolve_member(user, roles, resource)
+        entry = self._inherited(user, user_rights, resource)
+        if entry is None:
+            matcher = self.patterns.get(user)
+            if matcher is not None:
+                entry = matcher.match(resource)
+        return entry
+
+    def _resolve_member(self, user: str, roles: frozenset[str], resource: str) -> AccessRights | None:
+        # The most specific grant of the user's own and their roles', OR-ed
+        # where several of them hold that same grant, as in a merged map.
+        principals = (user, *(ROLE_PREFIX + role for role in roles))
+        depth, mask = -1, 0
+        for principal in principals:
+            found = self._planted(principal, resource)
+            if found is not None:
+                if found[0] > depth:
+                    depth, mask = found
+                elif found[0] == depth:
+                    mask |= found[1]
+        if depth >= 0:
+            return AccessRights.from_mask(mask)
+
+        rank, mask = None, 0
+        for principal in principals:
+            matcher = self.patterns.get(principal)
+            found = matcher.find(resource) if matcher is not None else None
+            if found is not None:
+                if rank is None or found[0] < rank:
+                    rank, mask = found
+                elif found[0] == rank:
+                    mask |= found[1]
+        return None if rank is None else AccessRights.from_mask(mask)
+
+    def _planted(self, principal: str, resource: str) -> tuple[int, AccessRights] | None:
+        # Depth and grant of the principal's most specific inherited grant covering the resource.
+        node = self.trees.get(principal)
+        if node is None:
+            return None
+        found = None
+        for depth, part in enumerate(resource.split("/")):
+            node = node.get(part)
+            if node is None:
+                break
+            entry = node.get(None)
+            if entry is not None:
+                found = depth, entry
+        return found
+
+    def _inherited(self, user: str, user_rights, resource: str) -> AccessRights | None:
+        # Most specific ancestor (or the resource itself) granted with inherit, in O(depth).
+        if self.trees is not None:
+            node = self.trees.get(user)
+            if node is None:
+                return None
+            found = None
+            for part in resource.split("/"):
+                node = node.get(part)
+                if node is None:
+                    break
+                found = node.get(None, found)
+            return found
+
+        prefix = resource
+        while True:
+            entry = user_rights.get(prefix + INHERIT_SUFFIX)
+            if entry is not None:
+                return entry
+            cut = prefix.rfind("/")
+            if cut < 0:
+                return None
+            prefix = prefix[:cut]
 
     def check_access(self, user: str, resource: str) -> AccessRights | AccessLogStatus:
+        start = perf_counter()
+        try:
+            user_rights = self.rights.get(user)
+            if user_rights is None:
+                status = AccessLogStatus.USER_NOT_FOUND
+                return status
+
+            resource_rights = user_rights.get(resource)
+            if resource_rights is None:
+                resource_rights = self._resolve(user, user_rights, resource)
+            if resource_rights is None:
+                status = AccessLogStatus.RESOURCE_NOT_FOUND
+                self.forbidden_access.record(user, resource)
+                return status
+
+            return resource_rights
+        finally:
+            CHECK_SECONDS.observe(perf_counter() - start)
 
-        user_rights = self.rights.get(user)
-        if user_rights is None:
-            status = AccessLogStatus.USER_NOT_FOUND
-            return status
+    def check_access_batch(self, pairs: list[tuple[str, str]]) -> list[AccessRights | AccessLogStatus]:
+        start = perf_counter()
+        rights = self.rights
+        forbidden_access = self.forbidden_access
+        results = []
 
-        resource_rights = user_rights.get(resource)
-        if resource_rights is None:
-            status = AccessLogStatus.RESOURCE_NOT_FOUND
-            if user not in self.forbidden_access:
-                self.forbidden_access[user] = []
-            self.forbidden_access[user].append(resource)
-            return status
+        for user, resource in pairs:
+            user_rights = rights.get(user)
+            if user_rights is None:
+                results.append(AccessLogStatus.USER_NOT_FOUND)
+                continue
 
-        return resource_rights
+            resource_rights = user_rights.get(resource)
+            if resource_rights is None:
+                resource_rights = self._resolve(user, user_rights, resource)
+            if resource_rights is None:
+                forbidden_access.record(user, resource)
+                results.append(AccessLogStatus.RESOURCE_NOT_FOUND)
+                continue
 
-    def get_forbidden_access(self) -> dict[str, list[str]]:
-        return self.forbidden_access
+            results.append(resource_rights)
+
+        CHECK_BATCH_SECONDS.observe(perf_counter() - start)
+        return results
+
+    def get_forbidden_resources(self) -> dict[str, list[str]]:
+        return self.forbidden_access.resources()
+
+    def get_forbidden_access(
+            self,
+            user: str | None = None,
+            top: int | None = None,
+            offset: int = 0,
+            limit: int = 100,
+    ) -> tuple[int, list[ForbiddenAccessStat]]:
+        if top is not None:
+            return len(self.forbidden_access), self.forbidden_access.top(top)
+        return self.forbidden_access.page(user=user, offset=offset, limit=limit)
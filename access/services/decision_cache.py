@@ -0,0 +1,49 @@
+import threading
+from collections import OrderedDict
+
+from ..models import CachedDecision
+
+
+class DecisionCache:
+    """Bounded LRU of rendered GET /access decisions.
+
+    An entry remembers the version of the user's rights it was computed
+    from. AccessService bumps that version on every change to the user's
+    effective rights, so a stale entry counts as a miss and is replaced on
+    the next check; nothing has to walk the cache to invalidate it.
+    """
+
+    def __init__(self, capacity: int = 100_000):
+        self.capacity = capacity
+        self.entries: OrderedDict[tuple, CachedDecision] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, versions: dict[str, int]) -> CachedDecision | None:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.version != versions.get(entry.user, 0):
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, entry: CachedDecision) -> None:
+        with self._lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
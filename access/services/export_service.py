@@ -0,0 +1,96 @@
+import csv
+import gzip
+import io
+import json
+import lzma
+import os
+import shutil
+
+from ..models import AccessLogEntry
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+OPENERS = {
+    None: open,
+    "gzip": gzip.open,
+    "lzma": lzma.open,
+}
+
+
+class _BoundedReader(io.RawIOBase):
+    def __init__(self, raw, size: int):
+        self.raw = raw
+        self.remaining = size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.raw.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def export_log(
+        sources: list[dict],
+        output_path: str,
+        fmt: str = "csv",
+        compress: bool = False,
+        filters: dict | None = None,
+) -> dict:
+    """Convert snapshotted log segments into a single export file.
+
+    Module-level and fed only plain data, so it can run in a process pool.
+    Every source is read up to the size it had when it was snapshotted, and
+    snapshot links are removed once the export is written.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    filters = {column: value for column, value in (filters or {}).items() if value is not None}
+    fieldnames = list(AccessLogEntry("", "", "").__dict__)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    open_output = gzip.open if compress else open
+    rows = 0
+
+    try:
+        with open_output(output_path, "wt", newline="") as output:
+            writer = csv.DictWriter(output, fieldnames=fieldnames, delimiter=";", lineterminator="\n")
+            if fmt == "csv":
+                writer.writeheader()
+
+            for source in sources:
+                with OPENERS[source["compression"]](source["path"], "rb") as raw:
+                    if source["size"] is not None:
+                        raw = io.BufferedReader(_BoundedReader(raw, source["size"]))
+                    reader = csv.DictReader(io.TextIOWrapper(raw, newline=""), delimiter=";")
+                    for row in reader:
+                        if any(row.get(column) != value for column, value in filters.items()):
+                            continue
+                        if fmt == "ndjson":
+                            output.write(json.dumps(row) + "\n")
+                        else:
+                            writer.writerow(row)
+                        rows += 1
+    finally:
+        for snapshot_dir in {os.path.dirname(source["path"]) for source in sources if source.get("snapshot")}:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    return {
+        "path": output_path,
+        "format": fmt + (".gz" if compress else ""),
+        "bytes": os.path.getsize(output_path),
+        "rows": rows,
+        "segments": [os.path.basename(source["path"]) for source in sources],
+    }
+
+
+def remove_export(result: dict) -> None:
+    """Deletes the file of an export result, once its operation has expired."""
+    path = result.get("path") if isinstance(result, dict) else None
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
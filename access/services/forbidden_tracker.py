@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+from ..models import ForbiddenAccessStat
+
+
+class _Bucket:
+    """The tracked pairs sharing one hit count, in a list ordered by count."""
+
+    __slots__ = ("count", "stats", "lower", "higher")
+
+    def __init__(self, count: int):
+        self.count = count
+        # Oldest first, so the victim of an eviction is the stalest of the least
+        # hit. Ordered so taking it does not rescan the slots left by earlier ones.
+        self.stats: OrderedDict[tuple[str, str], ForbiddenAccessStat] = OrderedDict()
+        self.lower: _Bucket | None = None
+        self.higher: _Bucket | None = None
+
+
+class ForbiddenAccessTracker:
+    """Denied (user, resource) pairs with hit counts and first/last seen times.
+
+    With a capacity, at most that many pairs are tracked using the
+    Space-Saving algorithm: a new pair replaces the one with the fewest hits
+    and inherits its count, recorded as ``error``. Every pair hit more than
+    ``total / capacity`` times is guaranteed to be kept.
+
+    Pairs sit in buckets of equal count, linked from the fewest hits to the
+    most, the Stream-Summary layout of the algorithm: a hit moves a pair one
+    bucket up, the victim is the first pair of the lowest bucket and ``top(n)``
+    walks down from the highest, all without scanning the other pairs.
+    """
+
+    def __init__(self, capacity: int = 0):
+        self.capacity = capacity
+        self.forbidden: dict[str, dict[str, ForbiddenAccessStat]] = {}
+        self.size = 0
+        self.evicted = 0
+        self._buckets: dict[int, _Bucket] = {}
+        self._lowest: _Bucket | None = None
+        self._highest: _Bucket | None = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def record(self, user: str, resource: str) -> None:
+        with self._lock:
+            self._record(user, resource)
+
+    def _record(self, user: str, resource: str) -> None:
+        now = time.time()
+        user_stats = self.forbidden.get(user)
+        if user_stats is not None:
+            stat = user_stats.get(resource)
+            if stat is not None:
+                bucket = self._buckets[stat.count]
+                stat.count += 1
+                stat.last_seen = now
+                self._add(stat, bucket)
+                self._discard(stat, bucket)
+                return
+
+        base = 0
+        if self.capacity and self.size >= self.capacity:
+            base = self._evict_min()
+        if user not in self.forbidden:
+            self.forbidden[user] = {}
+        stat = ForbiddenAccessStat(user, resource, now, count=base + 1, error=base)
+        self.forbidden[user][resource] = stat
+        self.size += 1
+        self._add(stat, None if base == 0 else self._buckets.get(base))
+
+    def top(self, n: int) -> list[ForbiddenAccessStat]:
+        with self._lock:
+            stats = []
+            bucket = self._highest
+            while bucket is not None and len(stats) < n:
+                stats.extend(islice(reversed(bucket.stats.values()), n - len(stats)))
+                bucket = bucket.lower
+            return stats
+
+    def page(self, user: str | None = None, offset: int = 0, limit: int = 100) -> tuple[int, list[ForbiddenAccessStat]]:
+        # Under the lock: a hit of a new pair adds to the dicts being sliced.
+        with self._lock:
+            if user is not None:
+                user_stats = self.forbidden.get(user, {})
+                return len(user_stats), list(islice(user_stats.values(), offset, offset + limit))
+            return self.size, list(islice(self._stats(), offset, offset + limit))
+
+    def resources(self) -> dict[str, list[str]]:
+        with self._lock:
+            return {user: list(user_stats) for user, user_stats in self.forbidden.items()}
+
+    def _stats(self):
+        for user_stats in self.forbidden.values():
+            yield from user_stats.values()
+
+    def _add(self, stat: ForbiddenAccessStat, below: _Bucket | None) -> None:
+        # Files the stat in the bucket of its count, created right above
+        # ``below``, or as the lowest one, when missing.
+        bucket = self._buckets.get(stat.count)
+        if bucket is None:
+            bucket = self._buckets[stat.count] = _Bucket(stat.count)
+            higher = self._lowest if below is None else below.higher
+            bucket.lower, bucket.higher = below, higher
+            if below is None:
+                self._lowest = bucket
+            else:
+                below.higher = bucket
+            if higher is None:
+                self._highest = bucket
+            else:
+                higher.lower = bucket
+        bucket.stats[(stat.user, stat.resource)] = stat
+
+    def _discard(self, stat: ForbiddenAccessStat, bucket: _Bucket) -> None:
+        del bucket.stats[(stat.user, stat.resource)]
+        if bucket.stats:
+            return
+        del self._buckets[bucket.count]
+        if bucket.lower is None:
+            self._lowest = bucket.higher
+        else:
+            bucket.lower.higher = bucket.higher
+        if bucket.higher is None:
+            self._highest = bucket.lower
+        else:
+            bucket.higher.lower = bucket.lower
+
+    def _evict_min(self) -> int:
+        bucket = self._lowest
+        stat = next(iter(bucket.stats.values()))
+        self._discard(stat, bucket)
+
+        user_stats = self.forbidden[stat.user]
+        del user_stats[stat.resource]
+        if not user_stats:
+            del self.forbidden[stat.user]
+        self.size -= 1
+        self.evicted += 1
+        return stat.count
@@ -0,0 +1,276 @@
+import mmap
+import os
+import shutil
+import struct
+import threading
+import zlib
+from array import array
+from sys import intern
+from typing import Callable
+
+from ..models import AccessRights
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+SNAPSHOT_MAGIC = b"RVSSNAP2"
+# Snapshots written before deadlines moved into them.
+SNAPSHOT_MAGIC_V1 = b"RVSSNAP1"
+# magic, string count, user count, grant count, body crc32
+SNAPSHOT_HEADER = struct.Struct("<8sIIQI")
+# crc32, op, user length, resource length, rights mask
+WAL_HEADER = struct.Struct("<IBHIB")
+# Follows the resource of an expire record: the grant's deadline in epoch seconds.
+WAL_DEADLINE = struct.Struct("<d")
+WAL_PUT = 1
+WAL_DELETE = 2
+WAL_EXPIRE = 3
+
+RightsTable = dict[str, dict[str, AccessRights]]
+Deadlines = dict[tuple[str, str], float]
+
+
+class StoreLockedError(RuntimeError):
+    """Another process has the store open."""
+
+
+class GrantStore:
+    """Crash-safe persistence for AccessService.rights.
+
+    Every grant is appended to a write-ahead log as a CRC-checked record.
+    After ``compact_every`` records the log restarts empty, and a background
+    thread copies the table and writes it as a snapshot. A snapshot keeps
+    resource names in one string table and each user's grants as parallel
+    id/mask arrays, so loading it is a handful of bulk decodes plus one
+    ``dict(zip(...))`` per user.
+
+    An expire record follows the put of an expiring grant, and the snapshot
+    holds the deadlines still pending as one more pair of arrays. ``load``
+    leaves them in ``expiries``.
+
+    The copy may already hold changes made after the log switched: those
+    are in the new log too, and replaying it leaves every key it touches as
+    it last was, whatever the snapshot had.
+
+    One process writes a store: ``load`` takes an flock on ``grants.lock``
+    until ``close`` and raises StoreLockedError while another holds it.
+    Two writers would each compact the log the other still appends to.
+    """
+
+    def __init__(self, path: str, fsync: bool = False, compact_every: int = 1_000_000):
+        self.path = str(path)
+        self.fsync = fsync
+        self.compact_every = compact_every
+        self.snapshot_file = os.path.join(self.path, "grants.snapshot")
+        self.wal_file = os.path.join(self.path, "grants.wal")
+        self.compacting_wal_file = self.wal_file + ".compacting"
+        self.lock_file = os.path.join(self.path, "grants.lock")
+        self.lock = threading.Lock()
+        self.wal_records = 0
+        self.expiries: dict[tuple[str, str], float] = {}
+        self._wal = None
+        self._compaction: threading.Thread | None = None
+        self._lock_file = None
+        os.makedirs(self.path, exist_ok=True)
+
+    def load(self) -> RightsTable:
+        self._acquire()
+        self.expiries = {}
+        rights = self._load_snapshot()
+        if os.path.exists(self.compacting_wal_file):
+            self._replay(self.compacting_wal_file, rights)
+        self.wal_records = self._replay(self.wal_file, rights)
+        self._wal = open(self.wal_file, "ab", buffering=0)
+        return rights
+
+    def append(self, user: str, resource: str, rights: AccessRights) -> None:
+        # Callers hold self.lock, so the log order matches the table order.
+        self._log(WAL_PUT, user, resource, rights)
+
+    def delete(self, user: str, resource: str) -> None:
+        self._log(WAL_DELETE, user, resource, 0)
+
+    def expire(self, user: str, resource: str, deadline: float) -> None:
+        # After the put of the grant: replaying a put clears the deadline.
+        self._log(WAL_EXPIRE, user, resource, 0, WAL_DEADLINE.pack(deadline))
+
+    def _log(self, op: int, user: str, resource: str, rights: int, extra: bytes = b"") -> None:
+        user_bytes, resource_bytes = user.encode(), resource.encode()
+        body = WAL_HEADER.pack(0, op, len(user_bytes), len(resource_bytes), rights)[4:] + user_bytes + resource_bytes + extra
+        self._wal.write(struct.pack("<I", zlib.crc32(body)) + body)
+        if self.fsync:
+            os.fsync(self._wal.fileno())
+        self.wal_records += 1
+
+    def compaction_due(self) -> bool:
+        return self.wal_records >= self.compact_every and (self._compaction is None or not self._compaction.is_alive())
+
+    def compact(self, copy: Callable[[], tuple[RightsTable, Deadlines]]) -> None:
+        """Restarts the log, and snapshots what ``copy`` returns in the background.
+
+        Callers hold self.lock, only the log switch happens under it. ``copy``
+        runs on the compaction thread, beside writers, and returns the table
+        and the pending deadlines.
+        """
+        self._wal.close()
+        if os.path.exists(self.compacting_wal_file):
+            # A previous compaction failed: its log is still needed, keep both.
+            with open(self.compacting_wal_file, "ab") as compacting, open(self.wal_file, "rb") as wal:
+                shutil.copyfileobj(wal, compacting)
+            os.remove(self.wal_file)
+        else:
+            os.replace(self.wal_file, self.compacting_wal_file)
+        self._wal = open(self.wal_file, "ab", buffering=0)
+        self.wal_records = 0
+
+        self._compaction = threading.Thread(target=self._write_snapshot, args=(copy,), daemon=True)
+        self._compaction.start()
+
+    def close(self) -> None:
+        if self._compaction is not None:
+            self._compaction.join()
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _acquire(self) -> None:
+        if fcntl is None or self._lock_file is not None:
+            return
+        lock_file = open(self.lock_file, "a+b")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise StoreLockedError(f"{self.path} is in use by another process, a grant store has one writer") from None
+        self._lock_file = lock_file
+
+    def _write_snapshot(self, copy: Callable[[], tuple[RightsTable, Deadlines]]) -> None:
+        table, expiries = copy()
+        resource_ids: dict[str, int] = {}
+        counts = array("I")
+        ids = array("I")
+        masks = bytearray()
+        for user_rights in table.values():
+            counts.append(len(user_rights))
+            for resource, rights in user_rights.items():
+                resource_id = resource_ids.get(resource)
+                if resource_id is None:
+                    resource_id = resource_ids[resource] = len(resource_ids)
+                ids.append(resource_id)
+                masks.append(rights)
+
+        strings = "\0".join(resource_ids).encode()
+        users = "\0".join(table).encode()
+        keys = "\0".join(part for key in expiries for part in key).encode()
+        body = b"".join((
+            struct.pack("<QQ", len(strings), len(users)),
+            strings,
+            users,
+            counts.tobytes(),
+            ids.tobytes(),
+            bytes(masks),
+            struct.pack("<QQ", len(expiries), len(keys)),
+            keys,
+            array("d", expiries.values()).tobytes(),
+        ))
+
+        tmp_file = self.snapshot_file + ".tmp"
+        with open(tmp_file, "wb") as snapshot:
+            snapshot.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(resource_ids), len(table), len(ids), zlib.crc32(body)))
+            snapshot.write(body)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(tmp_file, self.snapshot_file)
+        os.remove(self.compacting_wal_file)
+
+    def _load_snapshot(self) -> RightsTable:
+        if not os.path.exists(self.snapshot_file) or not os.path.getsize(self.snapshot_file):
+            return {}
+
+        with open(self.snapshot_file, "rb") as snapshot, mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, n_strings, n_users, n_grants, crc = SNAPSHOT_HEADER.unpack_from(data)
+            if magic not in (SNAPSHOT_MAGIC, SNAPSHOT_MAGIC_V1):
+                raise ValueError(f"{self.snapshot_file} is not a grant snapshot")
+            view = memoryview(data)[SNAPSHOT_HEADER.size:]
+            try:
+                if zlib.crc32(view) != crc:
+                    raise ValueError(f"{self.snapshot_file} is corrupted")
+
+                strings_len, users_len = struct.unpack_from("<QQ", view)
+                pos = 16
+                resources = list(map(intern, str(view[pos:pos + strings_len], "utf-8").split("\0"))) if n_strings else []
+                pos += strings_len
+                users = list(map(intern, str(view[pos:pos + users_len], "utf-8").split("\0"))) if n_users else []
+                pos += users_len
+                counts = array("I")
+                counts.frombytes(view[pos:pos + 4 * n_users])
+                pos += 4 * n_users
+                ids = array("I")
+                ids.frombytes(view[pos:pos + 4 * n_grants])
+                pos += 4 * n_grants
+                masks = bytes(view[pos:pos + n_grants])
+                pos += n_grants
+                if magic == SNAPSHOT_MAGIC:
+                    n_deadlines, keys_len = struct.unpack_from("<QQ", view, pos)
+                    pos += 16
+                    keys = list(map(intern, str(view[pos:pos + keys_len], "utf-8").split("\0"))) if n_deadlines else []
+                    pos += keys_len
+                    deadlines = array("d")
+                    deadlines.frombytes(view[pos:pos + 8 * n_deadlines])
+                    self.expiries = dict(zip(zip(keys[::2], keys[1::2]), deadlines))
+            finally:
+                view.release()
+
+        flags = [AccessRights.from_mask(mask) for mask in range(8)]
+        rights = {}
+        start = 0
+        for user, count in zip(users, counts):
+            end = start + count
+            rights[user] = dict(zip(map(resources.__getitem__, ids[start:end]), map(flags.__getitem__, masks[start:end])))
+            start = end
+        return rights
+
+    def _replay(self, wal_file: str, rights: RightsTable) -> int:
+        if not os.path.exists(wal_file):
+            return 0
+
+        records = 0
+        with open(wal_file, "rb") as wal:
+            data = wal.read()
+
+        pos = 0
+        while pos + WAL_HEADER.size <= len(data):
+            crc, op, user_len, resource_len, mask = WAL_HEADER.unpack_from(data, pos)
+            end = pos + WAL_HEADER.size + user_len + resource_len + (WAL_DEADLINE.size if op == WAL_EXPIRE else 0)
+            if end > len(data) or zlib.crc32(data[pos + 4:end]) != crc:
+                break
+            user = intern(data[pos + WAL_HEADER.size:pos + WAL_HEADER.size + user_len].decode())
+            resource_start = pos + WAL_HEADER.size + user_len
+            resource = intern(data[resource_start:resource_start + resource_len].decode())
+            if op == WAL_PUT:
+                if user not in rights:
+                    rights[user] = {}
+                rights[user][resource] = AccessRights.from_mask(mask)
+                self.expiries.pop((user, resource), None)
+            elif op == WAL_DELETE:
+                user_rights = rights.get(user)
+                if user_rights is not None:
+                    user_rights.pop(resource, None)
+                    if not user_rights:
+                        del rights[user]
+                self.expiries.pop((user, resource), None)
+            elif op == WAL_EXPIRE:
+                self.expiries[user, resource] = WAL_DEADLINE.unpack_from(data, resource_start + resource_len)[0]
+            records += 1
+            pos = end
+
+        if pos != len(data):
+            # Torn or corrupted tail from a crash: drop it so new records follow valid ones.
+            with open(wal_file, "r+b") as wal:
+                wal.truncate(pos)
+        return records
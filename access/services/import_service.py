@@ -0,0 +1,76 @@
+import csv
+import json
+from itertools import islice
+from typing import Iterable, Iterator
+
+from rest_framework.exceptions import ValidationError
+
+from ..models import GrantImportReport
+from ..serializers import ModifyAccessSerializer
+from .access_service import AccessService
+
+GRANT_FIELDS = ("user", "resource", "read", "write", "execute", "expires_in")
+
+Row = tuple[int, dict | None, dict | None]
+
+
+def iter_ndjson(lines: Iterable[str]) -> Iterator[Row]:
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_no, None, {"non_field_errors": [f"Invalid JSON: {exc}"]}
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, {"non_field_errors": ["Expected a JSON object."]}
+            continue
+        yield line_no, row, None
+
+
+def iter_csv(lines: Iterable[str]) -> Iterator[Row]:
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, {k: v for k, v in row.items() if k in GRANT_FIELDS and v not in ("", None)}, None
+
+
+class ImportService:
+    def __init__(self, access_service: AccessService, chunk_size: int = 1000, max_errors: int = 100):
+        self.access_service = access_service
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+
+    def load(self, rows: Iterable[Row]) -> GrantImportReport:
+        report = GrantImportReport(max_errors=self.max_errors)
+        validator = ModifyAccessSerializer()
+        rows = iter(rows)
+
+        while chunk := list(islice(rows, self.chunk_size)):
+            valid = []
+            for line_no, row, errors in chunk:
+                report.total += 1
+                if errors is None:
+                    try:
+                        valid.append((line_no, validator.run_validation(row)))
+                        continue
+                    except ValidationError as exc:
+                        errors = exc.detail
+                report.add_error(line_no, errors)
+
+            for line_no, grant in valid:
+                key = self.access_service.grant_key(grant["resource"], grant.get("inherit", False))
+                # Own grants only: a right the user holds through a role is still a new grant.
+                exists = key in self.access_service.get_own_rights(grant["user"])
+                try:
+                    self.access_service.add_entry(**grant)
+                except ValueError as exc:
+                    report.add_error(line_no, {"expires_in": [str(exc)]})
+                    continue
+                if exists:
+                    report.updated += 1
+                else:
+                    report.created += 1
+
+        return report
@@ -0,0 +1,163 @@
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+GROUP_BY_COLUMNS = ("user", "resource", "status")
+# Matching entries counted at most, so a page costs O(limit + MAX_COUNT) whatever the log holds.
+MAX_COUNT = 10_000
+
+
+def format_cursor(ts: float, rowid: int) -> str:
+    return f"{ts!r}:{rowid}"
+
+
+def parse_cursor(cursor: str) -> tuple[float, int]:
+    """The (ts, rowid) key of the last entry of the previous page, ValueError if malformed."""
+    ts, _, rowid = cursor.rpartition(":")
+    return float(ts), int(rowid)
+
+
+class LogIndex:
+    """SQLite side table of access log entries, appended by LogService as it writes.
+
+    Every filter column leads a composite index that ends with the timestamp
+    (and, implicitly, the rowid), with and without the status, so a query only
+    visits the rows it returns or counts. Pages continue from a (ts, rowid)
+    cursor rather than an offset, so a deep page costs the same as the first
+    one. Connections are per thread, the one of a thread that exited is closed
+    when the next thread opens its own.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connections: dict[threading.Thread, sqlite3.Connection] = {}
+        self._connections_lock = threading.Lock()
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                ts REAL NOT NULL,
+                user TEXT NOT NULL,
+                resource TEXT NOT NULL,
+                status TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_ts ON entries (ts);
+            CREATE INDEX IF NOT EXISTS entries_user_ts ON entries (user, ts);
+            CREATE INDEX IF NOT EXISTS entries_user_status_ts ON entries (user, status, ts);
+            CREATE INDEX IF NOT EXISTS entries_resource_ts ON entries (resource, ts);
+            CREATE INDEX IF NOT EXISTS entries_resource_status_ts ON entries (resource, status, ts);
+            CREATE INDEX IF NOT EXISTS entries_status_ts ON entries (status, ts);
+            """
+        )
+
+    def add_entries(self, rows: list[tuple[float, str, str, str]]) -> None:
+        conn = self._connection()
+        with conn:
+            conn.executemany("INSERT INTO entries (ts, user, resource, status) VALUES (?, ?, ?, ?)", rows)
+
+    def query(
+            self,
+            user: str | None = None,
+            resource: str | None = None,
+            status: str | None = None,
+            since: datetime | None = None,
+            until: datetime | None = None,
+            limit: int = 100,
+            offset: int = 0,
+            cursor: str | None = None,
+    ) -> tuple[int, list[dict], str | None]:
+        """Count of matches up to MAX_COUNT, the newest entries after ``cursor`` and the cursor of the next page."""
+        where, params = self._where(user, resource, status, since, until)
+        conn = self._connection()
+        count = conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM entries {where} LIMIT ?)", (*params, MAX_COUNT)).fetchone()[0]
+        if cursor is not None:
+            cursor_ts, cursor_rowid = parse_cursor(cursor)
+            where += (" AND " if where else "WHERE ") + "(ts, rowid) < (?, ?)"
+            params += (cursor_ts, cursor_rowid)
+        rows = conn.execute(
+            f"SELECT ts, rowid, user, resource, status FROM entries {where} ORDER BY ts DESC, rowid DESC LIMIT ? OFFSET ?",
+            (*params, limit, offset),
+        ).fetchall()
+        entries = [
+            {
+                "time": datetime.fromtimestamp(ts, timezone.utc),
+                "user": row_user,
+                "resource": row_resource,
+                "status": row_status,
+            }
+            for ts, _, row_user, row_resource, row_status in rows
+        ]
+        return count, entries, format_cursor(*rows[-1][:2]) if len(rows) == limit else None
+
+    def aggregate(
+            self,
+            group_by: str,
+            user: str | None = None,
+            resource: str | None = None,
+            status: str | None = None,
+            since: datetime | None = None,
+            until: datetime | None = None,
+            limit: int = 100,
+            offset: int = 0,
+    ) -> tuple[int, list[dict]]:
+        """Count of matches up to MAX_COUNT and a page of groups, the largest first.
+
+        Unlike a page of entries, ranking the groups reads every match, so it
+        costs as much as the filters leave: narrow them with since and until.
+        """
+        if group_by not in GROUP_BY_COLUMNS:
+            raise ValueError(f"Cannot group access log by {group_by}")
+
+        where, params = self._where(user, resource, status, since, until)
+        conn = self._connection()
+        count = conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM entries {where} LIMIT ?)", (*params, MAX_COUNT)).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {group_by}, COUNT(*) AS hits FROM entries {where} "
+            f"GROUP BY {group_by} ORDER BY hits DESC, {group_by} LIMIT ? OFFSET ?",
+            (*params, limit, offset),
+        )
+        return count, [{"key": key, "count": hits} for key, hits in rows]
+
+    def prune(self, before: float) -> int:
+        """Drops the entries older than ``before``, once their log segments are gone."""
+        conn = self._connection()
+        with conn:
+            return conn.execute("DELETE FROM entries WHERE ts < ?", (before,)).rowcount
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                # Nothing uses the connection of a thread that exited anymore.
+                for thread in [thread for thread in self._connections if not thread.is_alive()]:
+                    self._connections.pop(thread).close()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    @staticmethod
+    def _where(user, resource, status, since, until) -> tuple[str, tuple]:
+        clauses, params = [], []
+        for column, value in (("user", user), ("resource", resource), ("status", status)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until.timestamp())
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", tuple(params)
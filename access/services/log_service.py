@@ -1,24 +1,356 @@
+import atexit
+import gzip
+import json
+import lzma
 import os
+import shutil
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from uuid import uuid4
 
 from rights_verification_system.settings import STATIC_URL
+from ..metrics import metrics
 from ..models import AccessLogEntry, AccessLogStatus
+from .log_index import LogIndex
+
+COMPRESSORS = {
+    "gzip": (gzip.open, ".gz"),
+    "lzma": (lzma.open, ".xz"),
+}
+
+LOGGED = {
+    status: metrics.counter("access_log_entries_total", "Access log entries written, by status.", status=status.value)
+    for status in AccessLogStatus
+}
+WRITE_SECONDS = metrics.histogram("access_log_write_seconds", "Time to write, or queue when buffered, access log entries.")
+FLUSH_SECONDS = metrics.histogram("access_log_flush_seconds", "Time to append a batch of access log lines to the file.")
 
 
 class LogService:
-    def __init__(self, log_file_name: str = "access.csv", output_log_path: str = STATIC_URL + "log/"):
+    def __init__(
+            self,
+            log_file_name: str = "access.csv",
+            output_log_path: str = STATIC_URL + "log/",
+            buffered: bool = False,
+            flush_interval: float = 1.0,
+            flush_size: int = 1000,
+            max_bytes: int = 0,
+            rotate_interval: float = 0,
+            compression: str | None = None,
+            index: bool = False,
+            max_segments: int = 0,
+    ):
+        if compression is not None and compression not in COMPRESSORS:
+            raise ValueError(f"Unsupported log compression: {compression}")
+
         self.log_file_name = log_file_name
         self.output_log_path = output_log_path + (
             "/" if output_log_path[-1] != "/" else ""
         )
         self.log_file = output_log_path + log_file_name
+        self.log_file_stem, self.log_file_ext = os.path.splitext(log_file_name)
+        self.manifest_file = self.output_log_path + self.log_file_stem + ".manifest.json"
+        self.index = LogIndex(self.output_log_path + self.log_file_stem + ".index.sqlite3") if index else None
 
-        with open(self.log_file, "w") as log_file:
-            a = AccessLogEntry("", "", "")
-            log_file.write(";".join(a.__dict__.keys()) + "\n")
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.max_segments = max_segments
+        self.compression = compression
+        self._manifest_lock = threading.Lock()
+        self._manifest = self._load_manifest()
+        self._active_rows = 0
+        self._active_bytes = 0
+
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > len(self._header()):
+            self._active_rows = self._count_rows(self.log_file)
+            self._rotate()
+        else:
+            self._start_active_file()
+
+        self.buffered = buffered
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._write_lock = threading.Lock()
+        self._queue: deque[tuple[str, list | None]] = deque()
+        # Writers check _closed and queue under this lock, so close() cannot
+        # miss a line queued after its final flush.
+        self._queue_lock = threading.Lock()
+        self._closed = False
+        self._wakeup = threading.Condition()
+        self._writer = None
+        if buffered:
+            self._writer = threading.Thread(target=self._drain_loop, name="access-log-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
 
     def write_entry(self, user: str, resource: str, status: AccessLogStatus) -> None:
-        with open(self.log_file, "a") as log_file:
-            log_file.write(str(AccessLogEntry(user=user, resource=resource, status=status.value)) + "\n")
+        start = time.perf_counter()
+        self._write(
+            str(AccessLogEntry(user=user, resource=resource, status=status.value)) + "\n",
+            [(time.time(), user, resource, status.value)] if self.index is not None else None,
+        )
+        LOGGED[status].inc()
+        WRITE_SECONDS.observe(time.perf_counter() - start)
+
+    def write_entries(self, entries: list[tuple[str, str, AccessLogStatus]]) -> None:
+        start = time.perf_counter()
+        lines = "".join(
+            str(AccessLogEntry(user=user, resource=resource, status=status.value)) + "\n"
+            for user, resource, status in entries
+        )
+        rows = None
+        if self.index is not None:
+            now = time.time()
+            rows = [(now, user, resource, status.value) for user, resource, status in entries]
+        self._write(lines, rows)
+        for _, _, status in entries:
+            LOGGED[status].inc()
+        WRITE_SECONDS.observe(time.perf_counter() - start)
+
+    def flush(self) -> None:
+        with self._write_lock:
+            queue = self._queue
+            batch = [queue.popleft() for _ in range(len(queue))]
+            if batch:
+                self._append(
+                    "".join(lines for lines, _ in batch),
+                    [row for _, rows in batch if rows for row in rows],
+                )
+            elif self._rotation_due():
+                self._rotate()
+
+    def close(self) -> None:
+        with self._queue_lock:
+            closing = not self._closed
+            self._closed = True
+        if self._writer is not None and closing:
+            with self._wakeup:
+                self._wakeup.notify()
+            self._writer.join()
+        self.flush()
+        if self.index is not None:
+            self.index.close()
+
+    def rotate(self) -> None:
+        with self._write_lock:
+            self._rotate()
 
     def get_log_file_path(self) -> str:
+        self.flush()
         return self.log_file
+
+    def get_log_files(self, since: datetime | None = None, until: datetime | None = None) -> dict:
+        self.flush()
+        with self._manifest_lock:
+            segments = self._select_segments(since, until)
+        return {"path": self.log_file, "segments": [self._describe_segment(segment) for segment in segments]}
+
+    def snapshot(self, since: datetime | None = None, until: datetime | None = None) -> tuple[list[dict], list[dict]]:
+        self.flush()
+        snapshot_dir = f"{self.output_log_path}exports/.snapshot-{uuid4().hex}/"
+        os.makedirs(snapshot_dir)
+
+        sources = []
+        with self._write_lock, self._manifest_lock:
+            segments = self._select_segments(since, until)
+            for segment in segments:
+                link = snapshot_dir + segment["name"]
+                try:
+                    os.link(self.output_log_path + segment["name"], link)
+                except OSError:
+                    shutil.copyfile(self.output_log_path + segment["name"], link)
+                sources.append({
+                    "path": link,
+                    "size": segment["size"] if segment["name"] == self.log_file_name else None,
+                    "compression": segment["compression"],
+                    "snapshot": True,
+                })
+
+        return sources, [self._describe_segment(segment) for segment in segments]
+
+    def query_entries(self, **filters) -> tuple[int, list[dict], str | None]:
+        self.flush()
+        return self.index.query(**filters)
+
+    def aggregate_entries(self, group_by: str, **filters) -> tuple[int, list[dict]]:
+        self.flush()
+        return self.index.aggregate(group_by, **filters)
+
+    def _write(self, lines: str, rows: list | None = None) -> None:
+        if self.buffered:
+            with self._queue_lock:
+                queued = not self._closed
+                if queued:
+                    self._queue.append((lines, rows))
+        if not self.buffered or not queued:
+            with self._write_lock:
+                self._append(lines, rows)
+            return
+
+        if len(self._queue) >= self.flush_size:
+            with self._wakeup:
+                self._wakeup.notify()
+
+    def _append(self, lines: str, rows: list | None = None) -> None:
+        start = time.perf_counter()
+        data = lines.encode()
+        with open(self.log_file, "ab") as log_file:
+            log_file.write(data)
+        if rows and self.index is not None:
+            self.index.add_entries(rows)
+        FLUSH_SECONDS.observe(time.perf_counter() - start)
+        self._active_rows += lines.count("\n")
+        # Bytes, not characters: MAX_BYTES bounds the file size.
+        self._active_bytes += len(data)
+        if self._rotation_due():
+            self._rotate()
+
+    def _drain_loop(self) -> None:
+        while not self._closed:
+            with self._wakeup:
+                self._wakeup.wait_for(
+                    lambda: self._closed or len(self._queue) >= self.flush_size,
+                    timeout=self.flush_interval,
+                )
+            self.flush()
+
+    def _select_segments(self, since: datetime | None, until: datetime | None) -> list[dict]:
+        since_ts = since.timestamp() if since is not None else float("-inf")
+        until_ts = until.timestamp() if until is not None else float("inf")
+        segments = [
+            dict(segment)
+            for segment in self._manifest["segments"]
+            if segment["start"] <= until_ts and segment["end"] >= since_ts
+        ]
+
+        active_start = self._manifest["active"]["start"]
+        if active_start <= until_ts:
+            segments.append({
+                "name": self.log_file_name,
+                "start": active_start,
+                "end": time.time(),
+                "size": os.path.getsize(self.log_file),
+                "rows": self._active_rows,
+                "compression": None,
+            })
+        return segments
+
+    def _describe_segment(self, segment: dict) -> dict:
+        return {
+            **segment,
+            "path": self.output_log_path + segment["name"],
+            "start": datetime.fromtimestamp(segment["start"], timezone.utc).isoformat(),
+            "end": datetime.fromtimestamp(segment["end"], timezone.utc).isoformat(),
+        }
+
+    def _rotation_due(self) -> bool:
+        if self.max_bytes and self._active_bytes >= self.max_bytes:
+            return True
+        return bool(
+            self.rotate_interval
+            and self._active_rows
+            and time.time() - self._manifest["active"]["start"] >= self.rotate_interval
+        )
+
+    def _rotate(self) -> None:
+        if not self._active_rows:
+            self._start_active_file()
+            return
+
+        now = time.time()
+        with self._manifest_lock:
+            start = self._manifest["active"]["start"]
+            stamp = datetime.fromtimestamp(start, timezone.utc).strftime("%Y%m%dT%H%M%S")
+            # Counts every segment ever rotated: expired ones leave the list, their names stay taken.
+            sequence = self._manifest.get("sequence", len(self._manifest["segments"]))
+            self._manifest["sequence"] = sequence + 1
+            name = f"{self.log_file_stem}.{stamp}.{sequence:06d}{self.log_file_ext}"
+            segment = {
+                "name": name,
+                "start": start,
+                "end": now,
+                "size": os.path.getsize(self.log_file),
+                "rows": self._active_rows,
+                "compression": None,
+            }
+            os.replace(self.log_file, self.output_log_path + name)
+            self._manifest["segments"].append(segment)
+            oldest = self._expire_segments(now)
+        self._start_active_file(now)
+        if self.index is not None:
+            # The index covers the kept segments only, and stays as bounded as they are.
+            self.index.prune(oldest)
+
+        if self.compression is not None:
+            threading.Thread(target=self._compress, args=(segment,), daemon=True).start()
+
+    def _expire_segments(self, now: float) -> float:
+        # Callers hold _manifest_lock. Drops segments removed from disk and the
+        # oldest ones past max_segments, returns the start of the oldest kept.
+        segments = [
+            segment for segment in self._manifest["segments"]
+            if os.path.exists(self.output_log_path + segment["name"])
+        ]
+        if self.max_segments and len(segments) > self.max_segments:
+            for segment in segments[:-self.max_segments]:
+                os.remove(self.output_log_path + segment["name"])
+            segments = segments[-self.max_segments:]
+        self._manifest["segments"] = segments
+        return segments[0]["start"] if segments else now
+
+    def _compress(self, segment: dict) -> None:
+        open_compressed, suffix = COMPRESSORS[self.compression]
+        source = self.output_log_path + segment["name"]
+        try:
+            src = open(source, "rb")
+        except FileNotFoundError:
+            # Expired before its turn.
+            return
+        with src, open_compressed(source + suffix, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+
+        with self._manifest_lock:
+            if not any(kept is segment for kept in self._manifest["segments"]):
+                # Expired while being compressed.
+                os.remove(source + suffix)
+                return
+            segment["name"] += suffix
+            segment["size"] = os.path.getsize(source + suffix)
+            segment["compression"] = self.compression
+            self._save_manifest()
+            os.remove(source)
+
+    def _start_active_file(self, start: float | None = None) -> None:
+        with open(self.log_file, "w") as log_file:
+            log_file.write(self._header())
+        self._active_rows = 0
+        self._active_bytes = 0
+        with self._manifest_lock:
+            self._manifest["active"]["start"] = time.time() if start is None else start
+            self._save_manifest()
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_file) as manifest_file:
+                return json.load(manifest_file)
+        except (FileNotFoundError, ValueError):
+            start = os.path.getmtime(self.log_file) if os.path.exists(self.log_file) else time.time()
+            return {"active": {"start": start}, "segments": []}
+
+    def _save_manifest(self) -> None:
+        tmp_file = self.manifest_file + ".tmp"
+        with open(tmp_file, "w") as manifest_file:
+            json.dump(self._manifest, manifest_file)
+        os.replace(tmp_file, self.manifest_file)
+
+    @staticmethod
+    def _header() -> str:
+        a = AccessLogEntry("", "", "")
+        return ";".join(a.__dict__.keys()) + "\n"
+
+    @staticmethod
+    def _count_rows(path: str) -> int:
+        with open(path, "rb") as log_file:
+            return sum(chunk.count(b"\n") for chunk in iter(lambda: log_file.read(1 << 20), b"")) - 1
@@ -1,41 +1,259 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from uuid import UUID, uuid4
-from typing import Callable
+from typing import Callable, Hashable
 from datetime import datetime
+from ..metrics import metrics
 from ..models import Operation
-from ..scheduler import scheduler, DateTrigger
+from ..scheduler import scheduler, DateTrigger, IntervalTrigger
+
+EXECUTORS = ("thread", "process")
+
+STARTED = metrics.counter("operations_started_total", "Operations accepted, not counting shared ones.")
+FINISHED = metrics.counter("operations_finished_total", "Operations finished, by outcome.", outcome="ok")
+FAILED = metrics.counter("operations_finished_total", "Operations finished, by outcome.", outcome="error")
+EXPIRED = metrics.counter("operations_expired_total", "Operations dropped after their ttl or evicted.")
+RUN_SECONDS = metrics.histogram("operation_seconds", "Time from submitting an operation to its executor until it finishes.")
 
 
 class OperationsService:
 
-    def __init__(self):
-        self.operations: dict[UUID, Operation] = {}
+    def __init__(
+        self,
+        executor: str = "thread",
+        max_workers: int | None = None,
+        ttl: float = 0,
+        max_operations: int = 0,
+        sweep_interval: float = 60,
+    ):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unsupported operations executor: {executor}")
+
+        # Ordered from least to most recently used.
+        self.operations: OrderedDict[UUID, Operation] = OrderedDict()
+        self.expired: OrderedDict[UUID, None] = OrderedDict()
+        self.expired_total = 0
+        self.ttl = ttl
+        self.max_operations = max_operations
+        self.executor = executor
+        self.max_workers = max_workers
+        self._pool: Executor | None = None
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+        self._keyed: dict[Hashable, UUID] = {}
+        self._keys: dict[UUID, Hashable] = {}
+        # Called with the result of an operation once it expires, to release
+        # what the result points at.
+        self._cleanups: dict[UUID, Callable] = {}
+        # Futures of async waiters, resolved on their own event loop when the
+        # operation finishes or expires.
+        self._waiters: dict[UUID, list[asyncio.Future]] = {}
+        if ttl:
+            scheduler.add_job(self.sweep, trigger=IntervalTrigger(seconds=sweep_interval))
 
     def execute_operation(
         self,
         func: Callable,
         run_date: datetime | str = None,
         args: list | tuple = (),
+        key: Hashable = None,
+        args_factory: Callable[[], tuple] = None,
+        cleanup: Callable = None,
     ) -> UUID:
-        op_id = uuid4()
-        self.operations[op_id] = Operation(op_id)
+        evicted = None
+        with self._lock:
+            if key is not None and key in self._keyed:
+                return self._keyed[key]
+            op_id = uuid4()
+            self.operations[op_id] = Operation(op_id)
+            STARTED.inc()
+            if self.max_operations and len(self.operations) > self.max_operations:
+                evicted = self._evict_lru()
+            if key is not None:
+                self._keyed[key] = op_id
+                self._keys[op_id] = key
+            if cleanup is not None:
+                self._cleanups[op_id] = cleanup
+        if evicted is not None:
+            evicted()
 
-        def __exec_func() -> None:
-            res = func(*args)
-            self.finish_operation(op_id, res)
+        if args_factory is not None:
+            try:
+                args = args_factory()
+            except Exception as exc:
+                self.finish_operation(op_id, {"error": str(exc)})
+                return op_id
 
-        scheduler.add_job(
-            __exec_func,
-            trigger=DateTrigger(datetime.now() if run_date is None else run_date),
-        )
+        if run_date is None:
+            self._submit(op_id, func, args)
+        else:
+            scheduler.add_job(
+                self._submit,
+                trigger=DateTrigger(run_date),
+                args=(op_id, func, args),
+            )
         return op_id
 
     def finish_operation(self, op_id: UUID, result) -> bool:
-        op: Operation = self.operations.get(op_id)
-        if op is None:
-            return False
-        op.result = result
-        op.done = True
-        return True
+        cleanup = None
+        with self._finished:
+            op: Operation = self.operations.get(op_id)
+            if op is None:
+                # Evicted while running, nobody can fetch the result any more.
+                cleanup = self._cleanups.pop(op_id, None)
+            else:
+                op.result = result
+                op.finished_at = time.monotonic()
+                op.done = True
+                (FAILED if isinstance(result, dict) and "error" in result else FINISHED).inc()
+                key = self._keys.pop(op_id, None)
+                if key is not None:
+                    self._keyed.pop(key, None)
+                self._finished.notify_all()
+                self._wake(op_id)
+                return True
+        # Outside the lock, releasing the result may remove files.
+        if cleanup is not None:
+            cleanup(result)
+        return False
 
     def get_operation(self, op_id: UUID) -> Operation | None:
-        return self.operations.get(op_id)
+        with self._lock:
+            op = self.operations.get(op_id)
+            if op is not None:
+                self.operations.move_to_end(op_id)
+            return op
+
+    def wait_operation(self, op_id: UUID, timeout: float) -> Operation | None:
+        with self._finished:
+            op = self.operations.get(op_id)
+            if op is None:
+                return None
+            self._finished.wait_for(lambda: op.done or op_id not in self.operations, timeout=timeout)
+            if op_id not in self.operations:
+                return None
+            self.operations.move_to_end(op_id)
+            return op
+
+    async def wait_operation_async(self, op_id: UUID, timeout: float) -> Operation | None:
+        """Same as wait_operation, without holding a thread while waiting."""
+        with self._lock:
+            op = self.operations.get(op_id)
+            if op is None:
+                return None
+            waiter = None
+            if not op.done:
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.setdefault(op_id, []).append(waiter)
+
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(waiter, timeout)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    waiters = self._waiters.get(op_id)
+                    if waiters is not None and waiter in waiters:
+                        waiters.remove(waiter)
+                        if not waiters:
+                            del self._waiters[op_id]
+        return self.get_operation(op_id)
+
+    def is_expired(self, op_id: UUID) -> bool:
+        return op_id in self.expired
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "live": len(self.operations),
+            "running": sum(1 for op in list(self.operations.values()) if not op.done),
+            "expired": self.expired_total,
+        }
+
+    def sweep(self) -> int:
+        deadline = time.monotonic() - self.ttl
+        with self._lock:
+            stale = [
+                op_id
+                for op_id, op in self.operations.items()
+                if op.done and op.finished_at <= deadline
+            ]
+            cleanups = [self._expire(op_id) for op_id in stale]
+        for cleanup in cleanups:
+            if cleanup is not None:
+                cleanup()
+        return len(stale)
+
+    def _evict_lru(self) -> Callable[[], None] | None:
+        # Prefer the least recently used finished operation, a running one
+        # is only dropped when nothing else is left.
+        victim = next((op_id for op_id, op in self.operations.items() if op.done), None)
+        return self._expire(next(iter(self.operations)) if victim is None else victim)
+
+    def _wake(self, op_id: UUID) -> None:
+        # Called with self._lock held, from whichever thread finished the operation.
+        for waiter in self._waiters.pop(op_id, ()):
+            try:
+                waiter.get_loop().call_soon_threadsafe(_resolve, waiter)
+            except RuntimeError:
+                # The waiter's event loop is already closed.
+                pass
+
+    def _expire(self, op_id: UUID) -> Callable[[], None] | None:
+        # Waiters see the operation gone and return None. The cleanup of the
+        # result is returned for the caller to run once it releases the lock.
+        self._finished.notify_all()
+        self._wake(op_id)
+        op = self.operations.pop(op_id)
+        cleanup = None
+        if op.done:
+            cleanup = self._cleanups.pop(op_id, None)
+            if cleanup is not None:
+                cleanup = partial(cleanup, op.result)
+        key = self._keys.pop(op_id, None)
+        if key is not None:
+            self._keyed.pop(key, None)
+
+        self.expired_total += 1
+        EXPIRED.inc()
+        self.expired[op_id] = None
+        if len(self.expired) > max(self.max_operations, 1000):
+            self.expired.popitem(last=False)
+        return cleanup
+
+    def _submit(self, op_id: UUID, func: Callable, args: list | tuple) -> None:
+        start = time.perf_counter()
+        future = self._get_pool().submit(func, *args)
+
+        def __finish(done: Future) -> None:
+            try:
+                res = done.result()
+            except Exception as exc:
+                res = {"error": str(exc)}
+            RUN_SECONDS.observe(time.perf_counter() - start)
+            self.finish_operation(op_id, res)
+
+        future.add_done_callback(__finish)
+
+    def _get_pool(self) -> Executor:
+        with self._lock:
+            if self._pool is None:
+                if self.executor == "process":
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="operations",
+                    )
+            return self._pool
+
+
+def _resolve(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
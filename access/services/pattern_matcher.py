@@ -0,0 +1,184 @@
+import re
+
+from ..models import AccessRights
+
+WILDCARDS = re.compile(r"[*?\[]")
+is_pattern = WILDCARDS.search
+
+
+class _Bucket:
+    """The patterns sharing a literal first segment, compiled into one regex."""
+
+    __slots__ = ("patterns", "version", "compiled")
+
+    def __init__(self):
+        # Used as an insertion-ordered set, the rights stay in the matcher.
+        self.patterns: dict[str, None] = {}
+        # Bumped when a pattern is added or removed. Readers compile lazily and
+        # concurrently, so the regex, its order, the specificity of each
+        # alternative and the version they were built from are published
+        # together as one tuple.
+        self.version = 0
+        self.compiled: tuple[int, re.Pattern | None, list[str], list[tuple]] = (0, None, [], [])
+
+    def match(self, resource: str) -> tuple[str, tuple] | None:
+        version, regex, order, ranks = self.compiled
+        if version != self.version:
+            version, regex, order, ranks = self._compile()
+        if regex is None:
+            return None
+        found = regex.fullmatch(resource)
+        if found is None:
+            return None
+        return order[found.lastindex - 1], ranks[found.lastindex - 1]
+
+    def _compile(self) -> tuple[int, re.Pattern | None, list[str], list[tuple]]:
+        version = self.version
+        order = sorted(list(self.patterns), key=_specificity)
+        # Each alternative ends in an empty group: the engine saves and restores
+        # group marks at every branch, so marks set only on success keep a
+        # failed alternative cheap, and lastindex names the one that matched.
+        regex = re.compile("|".join(
+            f"{_translate(pattern)}()" for pattern in order
+        )) if order else None
+        self.compiled = version, regex, order, [_specificity(pattern) for pattern in order]
+        return self.compiled
+
+
+class PatternMatcher:
+    """One user's or role's glob grants compiled into alternation regexes.
+
+    ``*`` matches within a path segment, ``**`` across segments, ``?`` one
+    character and ``[...]`` a character class. Patterns are bucketed by their
+    first path segment when it has no wildcard (``reports/`` for
+    ``reports/*``), the rest share one bucket, and each bucket is one regex
+    whose alternatives are ordered by specificity (most literal characters
+    first), so the first one that matches is the bucket's most specific
+    grant. A lookup runs the bucket of the resource's first segment and the
+    shared one. A bucket is rebuilt on the next lookup after one of its
+    patterns is added or removed, changing the rights of an existing pattern
+    does not recompile anything.
+    """
+
+    def __init__(self):
+        self.patterns: dict[str, AccessRights] = {}
+        self._buckets: dict[str, _Bucket] = {}
+
+    def add(self, pattern: str, rights: AccessRights) -> None:
+        if pattern not in self.patterns:
+            key = _first_segment(pattern)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket()
+            bucket.patterns[pattern] = None
+            bucket.version += 1
+        self.patterns[pattern] = rights
+
+    def remove(self, pattern: str) -> None:
+        if self.patterns.pop(pattern, None) is None:
+            return
+        key = _first_segment(pattern)
+        bucket = self._buckets[key]
+        del bucket.patterns[pattern]
+        bucket.version += 1
+        if not bucket.patterns:
+            del self._buckets[key]
+
+    def match(self, resource: str) -> AccessRights | None:
+        found = self._best(resource)
+        return None if found is None else self.patterns.get(found[0])
+
+    def find(self, resource: str) -> tuple[tuple, AccessRights] | None:
+        """The specificity rank, lower first, and the rights of the most specific pattern matching ``resource``."""
+        found = self._best(resource)
+        rights = None if found is None else self.patterns.get(found[0])
+        return None if rights is None else (found[1], rights)
+
+    def _best(self, resource: str) -> tuple[str, tuple] | None:
+        buckets = self._buckets
+        found = None
+        cut = resource.find("/", 1)
+        literal = buckets.get(resource[:cut + 1]) if cut > 0 else None
+        if literal is not None:
+            found = literal.match(resource)
+        shared = buckets.get("")
+        if shared is not None:
+            other = shared.match(resource)
+            if other is not None and (found is None or other[1] < found[1]):
+                found = other
+        return found
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+
+class PatternSet:
+    """Glob patterns bucketed like PatternMatcher's, listing every one that matches a resource.
+
+    Each pattern is compiled on its own: a lookup tests the patterns of the
+    resource's first-segment bucket and of the shared one.
+    """
+
+    def __init__(self):
+        self._buckets: dict[str, dict[str, re.Pattern]] = {}
+
+    def add(self, pattern: str) -> None:
+        bucket = self._buckets.setdefault(_first_segment(pattern), {})
+        if pattern not in bucket:
+            bucket[pattern] = re.compile(_translate(pattern))
+
+    def remove(self, pattern: str) -> None:
+        key = _first_segment(pattern)
+        bucket = self._buckets.get(key)
+        if bucket is not None and bucket.pop(pattern, None) is not None and not bucket:
+            del self._buckets[key]
+
+    def matching(self, resource: str) -> list[str]:
+        cut = resource.find("/", 1)
+        buckets = (self._buckets.get(resource[:cut + 1]) if cut > 0 else None, self._buckets.get(""))
+        return [
+            pattern
+            for bucket in buckets if bucket is not None
+            for pattern, regex in bucket.items() if regex.fullmatch(resource)
+        ]
+
+
+def _first_segment(pattern: str) -> str:
+    # Up to and including the first "/" past the leading one, "" when there is
+    # a wildcard before it. A pattern only matches resources that start with
+    # its literal first segment, match() cuts them the same way.
+    cut = pattern.find("/", 1)
+    if cut < 0 or is_pattern(pattern, 0, cut):
+        return ""
+    return pattern[:cut + 1]
+
+
+def _specificity(pattern: str) -> tuple[int, int, str]:
+    wildcards = len(WILDCARDS.findall(pattern))
+    return -(len(pattern) - wildcards), wildcards, pattern
+
+
+def _translate(pattern: str) -> str:
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        char = pattern[i]
+        if char == "*":
+            if pattern.startswith("**", i):
+                parts.append(".*")
+                i += 2
+                continue
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[" and (end := pattern.find("]", i + 2)) > 0:
+            body = pattern[i + 1:end].replace("\\", "\\\\").replace("[", "\\[")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"[{body}]")
+            i = end + 1
+            continue
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return "".join(parts)
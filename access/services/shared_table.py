@@ -0,0 +1,423 @@
+import mmap
+import os
+import struct
+import threading
+import weakref
+import zlib
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+from ..models import AccessRights
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+TABLE_MAGIC = b"RVSSHM01"
+# magic, capacity, heap size, seqlock counter, live slots, used slots, heap used, retired
+HEADER = struct.Struct("<8sQQQQQQQ")
+HEADER_SIZE = 128
+SEQ_OFFSET = 24
+RETIRED_OFFSET = 56
+# key offset, key length, key hash, rights mask, state
+SLOT = struct.Struct("<IIIBBxx")
+EMPTY, USED, DELETED = 0, 1, 2
+MAX_LOAD = 0.7
+# Reads of an odd counter before a reader suspects a writer died mid-change.
+SPIN_LIMIT = 1000
+# Failed probes of a table no writer changed meanwhile before the error is raised.
+READ_RETRIES = 3
+
+
+class SharedGrantTable:
+    """Grant table in a memory-mapped file that every local worker process maps.
+
+    Keys are ``user\\0resource`` (``user\\0`` marks a known user) in an
+    open-addressing hash table with a crc32 hash, which is stable across
+    processes. Writers serialize on an flock and bump a seqlock counter
+    around every change, readers take no lock and retry when the counter
+    moved under them. A reader that keeps finding the counter odd takes the
+    flock, which the kernel releases when its holder dies, and evens out a
+    counter a dead writer left odd. When the table fills up a writer builds a larger copy
+    next to it, renames it over the path and marks the old mapping retired,
+    so readers remap on their next lookup.
+
+    An flock is held by an open file description, which a forked child
+    shares with its parent, so each child opens the lock file again.
+    """
+
+    def __init__(self, path: str, capacity: int = 1 << 20, heap_size: int = 64 << 20):
+        if fcntl is None:
+            raise RuntimeError("SharedGrantTable needs fcntl file locks")
+
+        self.path = str(path)
+        self._open_lock()
+        _tables.add(self)
+        with self._write_lock():
+            if not os.path.exists(self.path):
+                self._create(self.path, max(capacity, 8), heap_size)
+        self._map()
+
+    def get(self, user: str, resource: str) -> AccessRights | None:
+        mask = self._read(_key(user, resource))
+        return None if mask is None else AccessRights.from_mask(mask)
+
+    def has_user(self, user: str) -> bool:
+        return self._read(_key(user, "")) is not None
+
+    def put(self, user: str, resource: str, rights: int) -> None:
+        with self._write_lock():
+            self._write(_key(user, ""), 0)
+            self._write(_key(user, resource), int(rights))
+
+    def add_user(self, user: str) -> None:
+        with self._write_lock():
+            self._write(_key(user, ""), 0)
+
+    def delete(self, user: str, resource: str) -> bool:
+        with self._write_lock():
+            key = _key(user, resource)
+            index = self._find(self._mm, _capacity(self._mm), key, zlib.crc32(key))
+            if index is None:
+                return False
+            self._begin()
+            offset = HEADER_SIZE + index * SLOT.size
+            SLOT.pack_into(self._mm, offset, *SLOT.unpack_from(self._mm, offset)[:4], DELETED)
+            self._set_header(live=self._header()[4] - 1)
+            self._end()
+            return True
+
+    def items(self):
+        """Yields ``(user, resource, rights)`` for every grant, scanning the whole table."""
+        failures = 0
+        while True:
+            mm = self._mm
+            seq = self._seq_begin(mm)
+            if seq is None:
+                continue
+            grants = []
+            try:
+                for offset in range(HEADER_SIZE, HEADER_SIZE + _capacity(mm) * SLOT.size, SLOT.size):
+                    key_offset, key_len, _, mask, state = SLOT.unpack_from(mm, offset)
+                    if state == USED:
+                        user, resource = mm[key_offset:key_offset + key_len].decode().split("\0", 1)
+                        if resource:
+                            grants.append((user, resource, AccessRights.from_mask(mask)))
+            except (ValueError, UnicodeDecodeError, struct.error):
+                # Retried when a writer tore the probe, raised when it keeps failing on a table nobody changed.
+                if self._seq_end(mm, seq):
+                    failures += 1
+                    if failures >= READ_RETRIES:
+                        raise
+            else:
+                if self._seq_end(mm, seq):
+                    return iter(grants)
+
+    def users(self) -> list[str]:
+        failures = 0
+        while True:
+            mm = self._mm
+            seq = self._seq_begin(mm)
+            if seq is None:
+                continue
+            users = []
+            try:
+                for offset in range(HEADER_SIZE, HEADER_SIZE + _capacity(mm) * SLOT.size, SLOT.size):
+                    key_offset, key_len, _, _, state = SLOT.unpack_from(mm, offset)
+                    if state == USED and mm[key_offset + key_len - 1] == 0:
+                        users.append(mm[key_offset:key_offset + key_len - 1].decode())
+            except (ValueError, IndexError, UnicodeDecodeError, struct.error):
+                # Retried when a writer tore the probe, raised when it keeps failing on a table nobody changed.
+                if self._seq_end(mm, seq):
+                    failures += 1
+                    if failures >= READ_RETRIES:
+                        raise
+            else:
+                if self._seq_end(mm, seq):
+                    return users
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.items())
+
+    def close(self) -> None:
+        self._mm.close()
+        self._lock_file.close()
+
+    # Readers
+
+    def _read(self, key: bytes) -> int | None:
+        key_hash = zlib.crc32(key)
+        failures = 0
+        while True:
+            mm = self._mm
+            seq = self._seq_begin(mm)
+            if seq is None:
+                continue
+            try:
+                index = self._find(mm, _capacity(mm), key, key_hash)
+                mask = None if index is None else mm[HEADER_SIZE + index * SLOT.size + 12]
+            except (ValueError, IndexError, struct.error):
+                # Retried when a writer tore the probe, raised when it keeps failing on a table nobody changed.
+                if self._seq_end(mm, seq):
+                    failures += 1
+                    if failures >= READ_RETRIES:
+                        raise
+                continue
+            if self._seq_end(mm, seq):
+                return mask
+
+    def _seq_begin(self, mm) -> int | None:
+        # None means the mapping was replaced: the caller retries on the new one.
+        spins = 0
+        while True:
+            if struct.unpack_from("<Q", mm, RETIRED_OFFSET)[0]:
+                if mm is self._mm:
+                    self._remap()
+                return None
+            seq, = struct.unpack_from("<Q", mm, SEQ_OFFSET)
+            if not seq & 1:
+                return seq
+            spins += 1
+            if spins >= SPIN_LIMIT:
+                self._recover(mm)
+                spins = 0
+
+    def _recover(self, mm) -> None:
+        # Waits for the writer holding the flock, if any. Once it is ours no
+        # writer is mid-change, so an odd counter is one a dead writer left.
+        with self._write_lock():
+            seq, = struct.unpack_from("<Q", mm, SEQ_OFFSET)
+            if seq & 1:
+                struct.pack_into("<Q", mm, SEQ_OFFSET, seq + 1)
+
+    @staticmethod
+    def _seq_end(mm, seq: int) -> bool:
+        return struct.unpack_from("<Q", mm, SEQ_OFFSET)[0] == seq
+
+    @staticmethod
+    def _find(mm, capacity: int, key: bytes, key_hash: int) -> int | None:
+        mask = capacity - 1
+        index = key_hash & mask
+        for _ in range(capacity):
+            key_offset, key_len, slot_hash, _, state = SLOT.unpack_from(mm, HEADER_SIZE + index * SLOT.size)
+            if state == EMPTY:
+                return None
+            if state == USED and slot_hash == key_hash and key_len == len(key) and mm[key_offset:key_offset + key_len] == key:
+                return index
+            index = (index + 1) & mask
+        return None
+
+    # Writers, always called with the write lock held
+
+    def _open_lock(self) -> None:
+        self._thread_lock = threading.Lock()
+        self._lock_file = open(self.path + ".lock", "a+b")
+
+    def _after_fork(self) -> None:
+        # Closing the inherited descriptor leaves a lock the parent holds in place, unlocking it would not.
+        if not self._lock_file.closed:
+            self._lock_file.close()
+            self._open_lock()
+
+    @contextmanager
+    def _write_lock(self):
+        with self._thread_lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                if getattr(self, "_mm", None) is not None and struct.unpack_from("<Q", self._mm, RETIRED_OFFSET)[0]:
+                    self._remap()
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _write(self, key: bytes, rights: int) -> None:
+        key_hash = zlib.crc32(key)
+        index = self._find(self._mm, _capacity(self._mm), key, key_hash)
+        if index is not None:
+            offset = HEADER_SIZE + index * SLOT.size + 12
+            if self._mm[offset] != rights:
+                self._begin()
+                self._mm[offset] = rights
+                self._end()
+            return
+
+        _, capacity, heap_size, _, live, used, heap_used, _ = self._header()
+        if used + 1 > capacity * MAX_LOAD or heap_used + len(key) > heap_size:
+            self._grow(len(key))
+            _, capacity, heap_size, _, live, used, heap_used, _ = self._header()
+
+        self._begin()
+        key_offset = HEADER_SIZE + capacity * SLOT.size + heap_used
+        self._mm[key_offset:key_offset + len(key)] = key
+        slot_mask = capacity - 1
+        index = key_hash & slot_mask
+        while SLOT.unpack_from(self._mm, HEADER_SIZE + index * SLOT.size)[4] == USED:
+            index = (index + 1) & slot_mask
+        reused = SLOT.unpack_from(self._mm, HEADER_SIZE + index * SLOT.size)[4] == DELETED
+        SLOT.pack_into(self._mm, HEADER_SIZE + index * SLOT.size, key_offset, len(key), key_hash, rights, USED)
+        self._set_header(live=live + 1, used=used + (not reused), heap_used=heap_used + len(key))
+        self._end()
+
+    def _grow(self, extra_heap: int) -> None:
+        _, capacity, heap_size, _, live, _, heap_used, _ = self._header()
+        new_capacity = capacity * 2 if live + 1 > capacity * MAX_LOAD / 2 else capacity
+        new_heap_size = max(heap_size, (heap_used + extra_heap) * 2)
+
+        tmp_path = self.path + ".tmp"
+        self._create(tmp_path, new_capacity, new_heap_size)
+        with open(tmp_path, "r+b") as new_file, mmap.mmap(new_file.fileno(), 0) as new_mm:
+            heap_start = HEADER_SIZE + new_capacity * SLOT.size
+            new_heap_used = 0
+            slot_mask = new_capacity - 1
+            for offset in range(HEADER_SIZE, HEADER_SIZE + capacity * SLOT.size, SLOT.size):
+                key_offset, key_len, key_hash, rights, state = SLOT.unpack_from(self._mm, offset)
+                if state != USED:
+                    continue
+                new_offset = heap_start + new_heap_used
+                new_mm[new_offset:new_offset + key_len] = self._mm[key_offset:key_offset + key_len]
+                new_heap_used += key_len
+                index = key_hash & slot_mask
+                while SLOT.unpack_from(new_mm, HEADER_SIZE + index * SLOT.size)[4] == USED:
+                    index = (index + 1) & slot_mask
+                SLOT.pack_into(new_mm, HEADER_SIZE + index * SLOT.size, new_offset, key_len, key_hash, rights, USED)
+            HEADER.pack_into(new_mm, 0, TABLE_MAGIC, new_capacity, new_heap_size, 0, live, live, new_heap_used, 0)
+            new_mm.flush()
+
+        os.replace(tmp_path, self.path)
+        struct.pack_into("<Q", self._mm, RETIRED_OFFSET, 1)
+        self._remap()
+
+    def _begin(self) -> None:
+        seq, = struct.unpack_from("<Q", self._mm, SEQ_OFFSET)
+        struct.pack_into("<Q", self._mm, SEQ_OFFSET, seq + 1)
+
+    def _end(self) -> None:
+        self._begin()
+
+    def _header(self) -> tuple:
+        return HEADER.unpack_from(self._mm, 0)
+
+    def _set_header(self, **values) -> None:
+        magic, capacity, heap_size, seq, live, used, heap_used, retired = self._header()
+        HEADER.pack_into(
+            self._mm, 0, magic, capacity, heap_size, seq,
+            values.get("live", live), values.get("used", used), values.get("heap_used", heap_used), retired,
+        )
+
+    # Mapping
+
+    def _map(self) -> None:
+        with open(self.path, "r+b") as table_file:
+            self._mm = mmap.mmap(table_file.fileno(), 0)
+        if self._header()[0] != TABLE_MAGIC:
+            raise ValueError(f"{self.path} is not a shared grant table")
+
+    def _remap(self) -> None:
+        # The old mapping is left to the garbage collector: other threads may still be probing it.
+        self._map()
+
+    @staticmethod
+    def _create(path: str, capacity: int, heap_size: int) -> None:
+        capacity = 1 << (capacity - 1).bit_length()
+        with open(path, "wb") as table_file:
+            table_file.truncate(HEADER_SIZE + capacity * SLOT.size + heap_size)
+            table_file.write(HEADER.pack(TABLE_MAGIC, capacity, heap_size, 0, 0, 0, 0, 0))
+
+
+_tables: "weakref.WeakSet[SharedGrantTable]" = weakref.WeakSet()
+
+
+def _reopen_locks() -> None:
+    for table in list(_tables):
+        table._after_fork()
+
+
+os.register_at_fork(after_in_child=_reopen_locks)
+
+
+def _capacity(mm) -> int:
+    # Readers take the capacity from the mapping they probe, another thread may have remapped meanwhile.
+    return struct.unpack_from("<Q", mm, 8)[0]
+
+
+def _key(user: str, resource: str) -> bytes:
+    return f"{user}\0{resource}".encode()
+
+
+class SharedRights(MutableMapping):
+    """``dict[user, dict[resource, AccessRights]]`` view over a SharedGrantTable.
+
+    Lookups are table probes. Iterating users or a user's grants scans the
+    whole table, so it is meant for snapshots and audits, not request paths.
+    """
+
+    def __init__(self, table: SharedGrantTable):
+        self.table = table
+
+    def get(self, user, default=None):
+        return SharedUserRights(self.table, user) if self.table.has_user(user) else default
+
+    def __getitem__(self, user: str) -> "SharedUserRights":
+        if not self.table.has_user(user):
+            raise KeyError(user)
+        return SharedUserRights(self.table, user)
+
+    def __setitem__(self, user: str, user_rights: dict) -> None:
+        self.table.add_user(user)
+        for resource, rights in user_rights.items():
+            self.table.put(user, resource, rights)
+
+    def __delitem__(self, user: str) -> None:
+        for resource in list(self[user]):
+            self.table.delete(user, resource)
+        self.table.delete(user, "")
+
+    def __contains__(self, user) -> bool:
+        return self.table.has_user(user)
+
+    def __iter__(self):
+        return iter(self.table.users())
+
+    def __len__(self) -> int:
+        return len(self.table.users())
+
+    def items(self):
+        grouped: dict[str, dict[str, AccessRights]] = {user: {} for user in self.table.users()}
+        # A separate scan: users added by other processes since show up here first.
+        for user, resource, rights in self.table.items():
+            grouped.setdefault(user, {})[resource] = rights
+        return grouped.items()
+
+
+class SharedUserRights(MutableMapping):
+    def __init__(self, table: SharedGrantTable, user: str):
+        self.table = table
+        self.user = user
+
+    def get(self, resource, default=None):
+        rights = self.table.get(self.user, resource)
+        return default if rights is None else rights
+
+    def __getitem__(self, resource: str) -> AccessRights:
+        rights = self.table.get(self.user, resource)
+        if rights is None:
+            raise KeyError(resource)
+        return rights
+
+    def __setitem__(self, resource: str, rights: AccessRights) -> None:
+        self.table.put(self.user, resource, rights)
+
+    def __delitem__(self, resource: str) -> None:
+        if not self.table.delete(self.user, resource):
+            raise KeyError(resource)
+
+    def __contains__(self, resource) -> bool:
+        return self.table.get(self.user, resource) is not None
+
+    def __iter__(self):
+        return iter([resource for user, resource, _ in self.table.items() if user == self.user])
+
+    def __len__(self) -> int:
+        return sum(1 for user, _, _ in self.table.items() if user == self.user)
+
@@ -0,0 +1,162 @@
+import math
+import time
+from typing import Hashable
+
+BITS = 6
+SLOTS = 1 << BITS
+MASK = SLOTS - 1
+# 64 ** 6 ticks, over 2000 years at one second a tick. Later deadlines wait
+# in an overflow slot.
+LEVELS = 6
+
+
+class TimingWheel:
+    """Deadlines of keys in hierarchical timing wheels.
+
+    Level ``l`` has 64 slots of ``64 ** l`` ticks each, and a key sits at
+    the lowest level whose slot holds its deadline. Scheduling or cancelling
+    a key is a few dict operations whatever the deadline. A bitmap per level
+    marks the slots holding keys, so ``advance`` jumps straight to the next
+    tick that fires a level 0 slot or moves the keys of a higher one a level
+    down: a stalled sweep or a clock jump costs the slots it empties, not the
+    ticks it skips. Slots are dicts, so a rescheduled or cancelled key leaves
+    nothing behind.
+
+    ``advance`` returns keys once their deadline has passed, never early and
+    at most one tick late. They stay scheduled until cancelled, so a caller
+    can check under its own lock that a key's deadline is still the one that
+    passed before acting on it. Not thread-safe.
+    """
+
+    def __init__(self, tick: float = 1.0, now: float | None = None):
+        self.tick = tick
+        # Ticks up to this one have fired.
+        self.current = math.floor((time.time() if now is None else now) / tick)
+        self.deadlines: dict[Hashable, float] = {}
+        self.levels = [[{} for _ in range(SLOTS)] for _ in range(LEVELS)]
+        # Bit i of a level's mask is set while its slot i holds keys.
+        self.occupied = [0] * LEVELS
+        self.overflow: dict[Hashable, float] = {}
+        # Keys scheduled in a tick that has fired already.
+        self.due: dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
+
+    def get(self, key: Hashable) -> float | None:
+        return self.deadlines.get(key)
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        previous = self.deadlines.get(key)
+        if previous is not None:
+            self._remove(key, previous)
+        self.deadlines[key] = deadline
+        self._place(key, deadline)
+
+    def cancel(self, key: Hashable) -> bool:
+        deadline = self.deadlines.pop(key, None)
+        if deadline is None:
+            return False
+        # Gone from its slot already if it fired.
+        self._remove(key, deadline)
+        return True
+
+    def advance(self, now: float) -> list[tuple[Hashable, float]]:
+        """Fires every tick up to ``now``, returns the keys and deadlines that passed."""
+        target = math.floor(now / self.tick)
+        fired = []
+        if not self.deadlines:
+            self.current = max(self.current, target)
+            return fired
+
+        level0 = self.levels[0]
+        while self.current < target:
+            current = self._next_event()
+            if current is None or current > target:
+                self.current = target
+                break
+            self.current = current
+            if not current & MASK:
+                self._cascade(current)
+            slot = level0[current & MASK]
+            if slot:
+                fired.extend(slot.items())
+                slot.clear()
+                self.occupied[0] &= ~(1 << (current & MASK))
+        # Scheduled in the past, or cascaded down to the tick that just fired.
+        if self.due:
+            fired.extend(self.due.items())
+            self.due.clear()
+        return fired
+
+    def _next_event(self) -> int | None:
+        # The first tick past the current one whose slot holds keys. A level l
+        # slot is reached when the lower digits wrap to 0 with digit l at its
+        # index, and every occupied slot of a level comes before those of the
+        # levels above it, so the lowest level with one decides.
+        current = self.current
+        for level, occupied in enumerate(self.occupied):
+            shift = BITS * level
+            after = occupied >> (((current >> shift) & MASK) + 1)
+            if after:
+                index = ((current >> shift) & MASK) + (after & -after).bit_length()
+                return (current >> (shift + BITS) << (shift + BITS)) | (index << shift)
+        if self.overflow:
+            span = BITS * LEVELS
+            return ((current >> span) + 1) << span
+        return None
+
+    def _cascade(self, current: int) -> None:
+        # Every level whose lower digits just wrapped to 0 hands its slot for
+        # the new digit down, highest first so keys can go down several levels.
+        level = 1
+        while level < LEVELS and not current & ((1 << BITS * level) - 1):
+            level += 1
+        if level == LEVELS and not current & ((1 << BITS * LEVELS) - 1):
+            self._reinsert(self.overflow)
+        for level in range(level - 1, 0, -1):
+            index = (current >> BITS * level) & MASK
+            self.occupied[level] &= ~(1 << index)
+            self._reinsert(self.levels[level][index])
+
+    def _reinsert(self, slot: dict[Hashable, float]) -> None:
+        entries = list(slot.items())
+        slot.clear()
+        for key, deadline in entries:
+            self._place(key, deadline)
+
+    def _place(self, key: Hashable, deadline: float) -> None:
+        level, index = self._position(self._ticks(deadline))
+        if level < 0:
+            self.due[key] = deadline
+        elif level >= LEVELS:
+            self.overflow[key] = deadline
+        else:
+            self.levels[level][index][key] = deadline
+            self.occupied[level] |= 1 << index
+
+    def _remove(self, key: Hashable, deadline: float) -> None:
+        level, index = self._position(self._ticks(deadline))
+        if level < 0:
+            self.due.pop(key, None)
+        elif level >= LEVELS:
+            self.overflow.pop(key, None)
+        else:
+            slot = self.levels[level][index]
+            if slot.pop(key, None) is not None and not slot:
+                self.occupied[level] &= ~(1 << index)
+
+    def _ticks(self, deadline: float) -> int:
+        # The first tick at or after the deadline, so no key fires early.
+        return math.ceil(deadline / self.tick)
+
+    def _position(self, ticks: int) -> tuple[int, int]:
+        # Level and slot of a tick: -1 when it fired already, LEVELS past the wheel.
+        current = self.current
+        if ticks <= current:
+            return -1, 0
+        # The level of the highest base-64 digit where the tick differs from the current one.
+        level = ((ticks ^ current).bit_length() - 1) // BITS
+        if level >= LEVELS:
+            return LEVELS, 0
+        return level, (ticks >> BITS * level) & MASK
@@ -1,18 +1,79 @@
+import collections
+import glob
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
 import time
-from uuid import uuid4
+from datetime import datetime, timedelta, timezone
+from uuid import UUID, uuid4
 
-from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
 from django.conf import settings
 from rest_framework import status
+from django.test import AsyncRequestFactory
 from rest_framework.test import APITestCase, APIRequestFactory
+from apscheduler.schedulers.base import STATE_RUNNING, STATE_STOPPED
+from drf_spectacular.generators import SchemaGenerator
 
-from .models import AccessRights, AccessLogStatus, AccessLogEntry
+from .models import AccessRights, AccessLogStatus, AccessLogEntry, CachedDecision
+from . import async_views
+from .benchmarks import Suite, compare, isolated_views
+from .loadgen import LoadRequest, ReplayWorkload, SyntheticWorkload, WSGITarget, Zipf, parse_mix, percentile, run_load
+from .metrics import MetricsRegistry
+from .registry import ServiceRegistry, services
+from .scheduler import IntervalTrigger, LazyScheduler, scheduler
+from .renderers import EventStreamRenderer, MetricsRenderer
+from .serializers import (
+    AccessSerializer,
+    CompiledValidator,
+    ForbiddenAccessEntrySerializer,
+    ModifyAccessSerializer,
+)
 from .services.access_service import AccessService
+from .services.decision_cache import DecisionCache
+from .services.forbidden_tracker import ForbiddenAccessTracker
+from .services.grant_store import WAL_HEADER, GrantStore, StoreLockedError
+from .services.import_service import ImportService, iter_csv, iter_ndjson
 from .services.log_service import LogService
+from .services.ops_service import OperationsService
+from .services.shared_table import SEQ_OFFSET, SharedGrantTable
+from .services.timing_wheel import TimingWheel
 from .views import AccessViewSet
 
 
+def forbidden_counts(service: AccessService) -> dict[str, dict[str, int]]:
+    return {
+        user: {resource: stat.count for resource, stat in stats.items()}
+        for user, stats in service.forbidden_access.forbidden.items()
+    }
+
+
 # Unit Tests
+class AccessRightsTest(TestCase):
+    def test_rights_flags(self):
+        rights = AccessRights(True, False, True)
+        self.assertEqual(rights.get_rights(), (True, False, True))
+        self.assertEqual(int(rights), AccessRights.READ | AccessRights.EXECUTE)
+        self.assertIs(rights, AccessRights.from_mask(0b101))
+        self.assertNotEqual(rights, AccessRights(True, True, True))
+
+    def test_rights_serialization(self):
+        self.assertEqual(
+            AccessSerializer(AccessRights(False, True, False)).data,
+            {"read": False, "write": True, "execute": False},
+        )
+
+
 class AccessServiceTest(TestCase):
     def setUp(self) -> None:
         self.service = AccessService()
@@ -71,55 +132,1181 @@ class AccessServiceTest(TestCase):
             'result': {
                 'status': AccessLogStatus.RESOURCE_NOT_FOUND,
                 'forbidden_access': {
-                    'dev': [
-                        'image',
-                    ]
+                    'dev': {
+                        'image': 1,
+                    }
                 }
             }
         }
         self.service.rights = self.test_rights
         result = self.service.check_access(**test_table['input'])
         self.assertEqual(result, test_table['result']['status'])
-        self.assertEqual(self.service.forbidden_access, test_table['result']['forbidden_access'])
+        self.assertEqual(forbidden_counts(self.service), test_table['result']['forbidden_access'])
+
+    def test_check_access_batch(self):
+        test_table = {
+            'input': {
+                'pairs': [
+                    ('dev', 'log'),
+                    ('tester', 'log'),
+                    ('dev', 'image'),
+                ],
+            },
+            'result': {
+                'decisions': [
+                    AccessRights(True, True, True),
+                    AccessLogStatus.USER_NOT_FOUND,
+                    AccessLogStatus.RESOURCE_NOT_FOUND,
+                ],
+                'forbidden_access': {
+                    'dev': {
+                        'image': 1,
+                    }
+                }
+            }
+        }
+        self.service.rights = self.test_rights
+        result = self.service.check_access_batch(**test_table['input'])
+        self.assertEqual(result, test_table['result']['decisions'])
+        self.assertEqual(forbidden_counts(self.service), test_table['result']['forbidden_access'])
+
+    def test_check_access_inherited(self):
+        test_table = {
+            'grants': [
+                {'user': 'dev', 'resource': '/projects', 'read': True, 'inherit': True},
+                {'user': 'dev', 'resource': '/projects/42/', 'read': True, 'write': True, 'inherit': True},
+                {'user': 'dev', 'resource': '/projects/42/logs/today', 'execute': True},
+                {'user': 'ops', 'resource': '/', 'execute': True, 'inherit': True},
+            ],
+            'checks': [
+                (('dev', '/projects'), AccessRights(True, False, False)),
+                (('dev', '/projects/7/logs'), AccessRights(True, False, False)),
+                (('dev', '/projects/42'), AccessRights(True, True, False)),
+                (('dev', '/projects/42/logs/today'), AccessRights(False, False, True)),
+                (('dev', '/projects/42/logs/today/raw'), AccessRights(True, True, False)),
+                (('dev', '/projects420'), AccessLogStatus.RESOURCE_NOT_FOUND),
+                (('dev', '/archive'), AccessLogStatus.RESOURCE_NOT_FOUND),
+                (('ops', '/archive/2020'), AccessRights(False, False, True)),
+            ],
+        }
+        for grant in test_table['grants']:
+            self.service.add_entry(**grant)
+        for (user, resource), decision in test_table['checks']:
+            self.assertEqual(self.service.check_access(user, resource), decision, resource)
+        self.assertEqual(
+            self.service.check_access_batch([pair for pair, _ in test_table['checks']]),
+            [decision for _, decision in test_table['checks']],
+        )
+
+    def test_check_access_pattern(self):
+        test_table = {
+            'grants': [
+                {'user': 'dev', 'resource': 'reports/*', 'read': True},
+                {'user': 'dev', 'resource': 'reports/2024-??', 'read': True, 'write': True},
+                {'user': 'dev', 'resource': 'reports/2024-01', 'execute': True},
+                {'user': 'dev', 'resource': 'svc-*:config', 'write': True},
+                {'user': 'dev', 'resource': 'archive/**/[!.]*.log', 'read': True, 'execute': True},
+                {'user': 'dev', 'resource': '/projects', 'inherit': True},
+            ],
+            'checks': [
+                (('dev', 'reports/summary'), AccessRights(True, False, False)),
+                (('dev', 'reports/2024-05'), AccessRights(True, True, False)),
+                (('dev', 'reports/2024-01'), AccessRights(False, False, True)),
+                (('dev', 'reports/2024/05'), AccessLogStatus.RESOURCE_NOT_FOUND),
+                (('dev', 'svc-billing:config'), AccessRights(False, True, False)),
+                (('dev', 'svc-billing:secrets'), AccessLogStatus.RESOURCE_NOT_FOUND),
+                (('dev', 'archive/2020/01/app.log'), AccessRights(True, False, True)),
+                (('dev', 'archive/2020/.hidden.log'), AccessLogStatus.RESOURCE_NOT_FOUND),
+                (('dev', '/projects/*'), AccessRights(False, False, False)),
+            ],
+        }
+        for grant in test_table['grants']:
+            self.service.add_entry(**grant)
+        for (user, resource), decision in test_table['checks']:
+            self.assertEqual(self.service.check_access(user, resource), decision, resource)
+        self.assertEqual(len(self.service.patterns['dev']), 4)
+
+    def test_pattern_matcher_recompiles_on_new_patterns_only(self):
+        self.service.add_entry('dev', 'reports/*', read=True)
+        self.service.add_entry('dev', 'logs/*', read=True)
+        self.assertEqual(self.service.check_access('dev', 'reports/q1'), AccessRights(True, False, False))
+        self.assertEqual(self.service.check_access('dev', 'logs/app'), AccessRights(True, False, False))
+        buckets = self.service.patterns['dev']._buckets
+        reports, logs = buckets['reports/'].compiled[1], buckets['logs/'].compiled[1]
+
+        self.service.add_entry('dev', 'reports/*', write=True)
+        self.assertEqual(self.service.check_access('dev', 'reports/q1'), AccessRights(False, True, False))
+        self.assertIs(buckets['reports/'].compiled[1], reports)
+
+        # Only the bucket of the new pattern's first segment is rebuilt.
+        self.service.add_entry('dev', 'reports/q?', execute=True)
+        self.assertEqual(self.service.check_access('dev', 'reports/q1'), AccessRights(False, False, True))
+        self.assertEqual(self.service.check_access('dev', 'logs/app'), AccessRights(True, False, False))
+        self.assertIsNot(buckets['reports/'].compiled[1], reports)
+        self.assertIs(buckets['logs/'].compiled[1], logs)
+
+    def test_pattern_buckets_pick_the_most_specific(self):
+        test_table = {
+            'grants': [
+                {'user': 'dev', 'resource': '*/q1', 'read': True},
+                {'user': 'dev', 'resource': 'reports/*', 'write': True},
+                {'user': 'dev', 'resource': '**/2024-01-31', 'execute': True},
+                {'user': 'dev', 'resource': '/projects/*/logs', 'read': True, 'write': True},
+            ],
+            'checks': [
+                (('dev', 'reports/q1'), AccessRights(False, True, False)),
+                (('dev', 'archive/q1'), AccessRights(True, False, False)),
+                (('dev', 'reports/2024-01-31'), AccessRights(False, False, True)),
+                (('dev', 'reports/2024'), AccessRights(False, True, False)),
+                (('dev', '/projects/42/logs'), AccessRights(True, True, False)),
+                (('dev', 'q1'), AccessLogStatus.RESOURCE_NOT_FOUND),
+            ],
+        }
+        for grant in test_table['grants']:
+            self.service.add_entry(**grant)
+        for (user, resource), decision in test_table['checks']:
+            self.assertEqual(self.service.check_access(user, resource), decision, resource)
+        matcher = self.service.patterns['dev']
+        self.assertEqual(set(matcher._buckets), {'', 'reports/', '/projects/'})
+
+        matcher.remove('reports/*')
+        self.assertEqual(set(matcher._buckets), {'', '/projects/'})
+        self.assertEqual(self.service.check_access('dev', 'reports/q1'), AccessRights(True, False, False))
 
     def test_check_get_forbidden_access_empty(self):
         test_table = {
             'input': {},
             'result': {
-                'forbidden_access': {}
+                'count': 0,
+                'forbidden_access': []
             }
         }
-        result = self.service.get_forbidden_access(**test_table['input'])
+        count, result = self.service.get_forbidden_access(**test_table['input'])
+        self.assertEqual(count, test_table['result']['count'])
         self.assertEqual(result, test_table['result']['forbidden_access'])
-        self.assertEqual(self.service.forbidden_access, test_table['result']['forbidden_access'])
 
     def test_check_get_forbidden_access_success(self):
         test_table = {
             'input': {
-                'forbidden_access': {
-                    'dev': [
-                        'image',
-                    ]
-                }
+                'checks': [
+                    ('dev', 'image'),
+                    ('dev', 'video'),
+                    ('dev', 'image'),
+                    ('ops', 'image'),
+                ]
             },
             'result': {
-                'forbidden_access': {
-                    'dev': [
-                        'image',
-                    ]
-                }
+                'count': 3,
+                'top': [
+                    ('dev', 'image', 2),
+                ],
+                'page': [
+                    ('dev', 'video', 1),
+                    ('ops', 'image', 1),
+                ],
+                'user': [
+                    ('ops', 'image', 1),
+                ],
             }
         }
-        self.service.forbidden_access = test_table['input']['forbidden_access']
-        result = self.service.get_forbidden_access()
-        self.assertEqual(result, test_table['result']['forbidden_access'])
-        self.assertEqual(self.service.forbidden_access, test_table['result']['forbidden_access'])
+        self.service.rights = {**self.test_rights, 'ops': {}}
+        for user, resource in test_table['input']['checks']:
+            self.service.check_access(user, resource)
+
+        def rows(stats):
+            return [(stat.user, stat.resource, stat.count) for stat in stats]
+
+        count, top = self.service.get_forbidden_access(top=1)
+        self.assertEqual(count, test_table['result']['count'])
+        self.assertEqual(rows(top), test_table['result']['top'])
+        _, page = self.service.get_forbidden_access(offset=1, limit=2)
+        self.assertEqual(rows(page), test_table['result']['page'])
+        count, by_user = self.service.get_forbidden_access(user='ops')
+        self.assertEqual((count, rows(by_user)), (1, test_table['result']['user']))
+
+    def test_forbidden_access_capacity(self):
+        service = AccessService(forbidden_capacity=2)
+        service.rights = self.test_rights
+        for resource in ['image'] * 5 + ['probe-1', 'probe-2', 'probe-3']:
+            service.check_access('dev', resource)
+
+        self.assertEqual(len(service.forbidden_access), 2)
+        self.assertEqual(forbidden_counts(service)['dev']['image'], 5)
+        probe = next(r for r in forbidden_counts(service)['dev'] if r != 'image')
+        self.assertEqual(service.forbidden_access.forbidden['dev'][probe].error, 2)
+
+    def test_forbidden_access_top(self):
+        service = AccessService(forbidden_capacity=3)
+        service.rights = self.test_rights
+        for resource in ['a'] * 4 + ['b'] * 2 + ['c'] * 3 + ['d', 'b', 'b']:
+            service.check_access('dev', resource)
+
+        top = service.forbidden_access.top(3)
+        self.assertEqual([(stat.resource, stat.count) for stat in top], [('b', 5), ('a', 4), ('d', 3)])
+        self.assertEqual(service.forbidden_access.top(1), top[:1])
+        self.assertEqual(service.get_forbidden_resources(), {'dev': ['a', 'd', 'b']})
+
+
+class RolesTest(TestCase):
+    def setUp(self) -> None:
+        self.service = AccessService()
+        self.service.add_role_entry('readers', 'log', read=True)
+        self.service.add_role_entry('writers', 'log', write=True)
+        self.service.add_role_entry('writers', 'reports/*', write=True)
+
+    def test_rights_are_merged_across_roles(self):
+        test_table = {
+            'members': [('readers', 'dev'), ('writers', 'dev'), ('readers', 'qa'), ('writers', 'qa'), ('readers', 'ops')],
+            'checks': [
+                (('dev', 'log'), AccessRights(True, True, False)),
+                (('dev', 'reports/q1'), AccessRights(False, True, False)),
+                (('ops', 'log'), AccessRights(True, False, False)),
+                (('ops', 'reports/q1'), AccessLogStatus.RESOURCE_NOT_FOUND),
+            ],
+        }
+        for role, user in test_table['members']:
+            self.service.add_member(role, user)
+        for (user, resource), decision in test_table['checks']:
+            self.assertEqual(self.service.check_access(user, resource), decision, (user, resource))
+        # Members without grants of their own share the merged map of their roles.
+        self.assertIs(self.service.rights['dev'], self.service.rights['qa'])
+
+    def test_changes_are_applied_incrementally(self):
+        self.service.add_entry('dev', 'log', execute=True)
+        self.service.add_member('readers', 'dev')
+        self.service.add_member('readers', 'qa')
+        self.assertEqual(self.service.check_access('dev', 'log'), AccessRights(True, False, True))
+
+        self.service.add_role_entry('readers', 'image', read=True)
+        self.service.add_entry('qa', 'video', execute=True)
+        self.assertEqual(self.service.check_access('dev', 'image'), AccessRights(True, False, False))
+        self.assertEqual(self.service.check_access('qa', 'image'), AccessRights(True, False, False))
+        self.assertEqual(self.service.check_access('qa', 'video'), AccessRights(False, False, True))
+        self.assertEqual(self.service.check_access('qa', 'log'), AccessRights(True, False, False))
+
+        self.assertTrue(self.service.remove_member('readers', 'dev'))
+        self.assertFalse(self.service.remove_member('readers', 'dev'))
+        self.assertEqual(self.service.rights['dev'], {'log': AccessRights(False, False, True)})
+        self.assertEqual(self.service.check_access('dev', 'image'), AccessLogStatus.RESOURCE_NOT_FOUND)
+        self.assertEqual(self.service._combined_users, {frozenset({'readers'}): 1})
+
+        self.assertTrue(self.service.remove_member('readers', 'qa'))
+        self.assertEqual(self.service.rights['qa'], {'video': AccessRights(False, False, True)})
+        self.service.add_member('writers', 'ops')
+        self.assertTrue(self.service.remove_member('writers', 'ops'))
+        self.assertNotIn('ops', self.service.rights)
+        self.assertNotIn('ops', self.service.versions)
+        self.assertEqual(self.service.check_access('ops', 'log'), AccessLogStatus.USER_NOT_FOUND)
+
+    def test_role_patterns_are_resolved_per_role(self):
+        self.service.add_role_entry('readers', '/projects', read=True, inherit=True)
+        self.service.add_role_entry('writers', '/projects/42', write=True, inherit=True)
+        self.service.add_entry('dev', '/projects/42', execute=True, inherit=True)
+        self.service.add_entry('dev', 'reports/q*', read=True)
+        for role, user in (('readers', 'dev'), ('writers', 'dev'), ('readers', 'qa'), ('writers', 'ops')):
+            self.service.add_member(role, user)
+
+        # Compiled once per role, members keep only their own.
+        self.assertEqual(sorted(self.service.trees), ['@readers', '@writers', 'dev'])
+        self.assertEqual(sorted(self.service.patterns), ['@writers', 'dev'])
+        test_table = [
+            # The most specific grant wins, OR-ed across the roles and the user that hold it.
+            (('dev', '/projects/42/logs'), AccessRights(False, True, True)),
+            (('dev', '/projects/7'), AccessRights(True, False, False)),
+            (('qa', '/projects/42/logs'), AccessRights(True, False, False)),
+            (('ops', '/projects/7'), AccessLogStatus.RESOURCE_NOT_FOUND),
+            # reports/q* is more specific than reports/*.
+            (('dev', 'reports/q1'), AccessRights(True, False, False)),
+            (('dev', 'reports/x'), AccessRights(False, True, False)),
+            (('ops', 'reports/q1'), AccessRights(False, True, False)),
+        ]
+        for (user, resource), decision in test_table:
+            self.assertEqual(self.service.check_access(user, resource), decision, (user, resource))
+
+        self.service.remove_member('writers', 'dev')
+        self.assertEqual(self.service.check_access('dev', '/projects/42/logs'), AccessRights(False, False, True))
+        self.assertEqual(self.service.check_access('dev', 'reports/x'), AccessLogStatus.RESOURCE_NOT_FOUND)
+
+    def test_roles_are_persisted(self):
+        with tempfile.TemporaryDirectory() as store_dir:
+            store = GrantStore(store_dir, compact_every=4)
+            service = AccessService(store=store)
+            service.add_role_entry('readers', '/projects', read=True, inherit=True)
+            service.add_member('readers', 'dev')
+            service.add_member('readers', 'ops')
+            service.add_entry('dev', 'log', write=True)
+            service.add_member('writers', 'dev')
+            service.remove_member('readers', 'ops')
+            store.close()
+
+            store = GrantStore(store_dir)
+            restarted = AccessService(store=store)
+            store.close()
+
+        self.assertEqual(restarted.memberships, {'dev': frozenset({'readers', 'writers'})})
+        self.assertEqual(restarted.direct, {'dev': {'log': AccessRights(False, True, False)}})
+        self.assertEqual(restarted.check_access('dev', '/projects/1'), AccessRights(True, False, False))
+        self.assertNotIn('ops', restarted.rights)
+
+
+class HoldersIndexTest(TestCase):
+    def setUp(self) -> None:
+        self.service = AccessService(holders_index=True)
+
+    def holders(self, resource: str) -> dict[str, list[str]]:
+        return {right: sorted(self.service.get_holders(resource, right)[1]) for right in ('read', 'write', 'execute')}
+
+    def test_grants_are_indexed(self):
+        self.service.add_entry('dev', 'log', read=True, write=True)
+        self.service.add_entry('ops', 'log', read=True)
+        self.service.add_entry('dev', 'log', read=True, execute=True)
+        self.assertEqual(self.holders('log'), {'read': ['dev', 'ops'], 'write': [], 'execute': ['dev']})
+
+        self.service.add_entry('dev', 'log')
+        self.service.add_entry('ops', 'log')
+        self.assertEqual(self.service.holders, {})
+
+    def test_roles_are_indexed(self):
+        self.service.add_entry('dev', 'log', execute=True)
+        self.service.add_role_entry('readers', 'log', read=True)
+        self.service.add_member('readers', 'dev')
+        self.service.add_member('readers', 'qa')
+        self.assertEqual(self.holders('log'), {'read': ['dev', 'qa'], 'write': [], 'execute': ['dev']})
+
+        self.service.add_role_entry('readers', 'log', write=True)
+        self.assertEqual(self.holders('log'), {'read': [], 'write': ['dev', 'qa'], 'execute': ['dev']})
+
+        self.service.remove_member('readers', 'qa')
+        self.assertEqual(self.holders('log'), {'read': [], 'write': ['dev'], 'execute': ['dev']})
+
+    def test_inherited_and_glob_grants_are_resolved(self):
+        self.service.add_entry('dev', '/projects/42/logs', read=True)
+        self.service.add_entry('qa', '/projects', write=True, inherit=True)
+        self.service.add_entry('ops', '/projects/*/logs', execute=True)
+        self.service.add_entry('ci', '/projects/42/logs', write=True)
+        self.service.add_entry('ci', '/projects', read=True, inherit=True)
+        self.assertEqual(self.holders('/projects/42/logs'), {'read': ['dev'], 'write': ['ci', 'qa'], 'execute': ['ops']})
+
+        for i in range(3):
+            self.service.add_entry(f'user-{i}', '/projects', read=True, inherit=True)
+        pages = [self.service.get_holders('/projects/42/logs', 'read', offset=offset, limit=2) for offset in (0, 2, 4)]
+        self.assertEqual(pages, [(4, ['dev', 'user-0']), (4, ['user-1', 'user-2']), (4, [])])
+
+    def test_only_covering_grants_are_resolved(self):
+        for i in range(20):
+            self.service.add_entry(f'user-{i}', f'/other/{i}', read=True, inherit=True)
+            self.service.add_entry(f'user-{i}', f'/projects/{i}/*', read=True)
+        self.service.add_entry('qa', '/projects', read=True, inherit=True)
+        resolved = []
+        resolve = self.service._resolve
+
+        def __resolve(user, *args):
+            resolved.append(user)
+            return resolve(user, *args)
+
+        self.service._resolve = __resolve
+        self.assertEqual(self.service.get_holders('/projects/7/logs', 'read'), (2, ['qa', 'user-7']))
+        self.assertEqual(resolved, ['qa', 'user-7'])
+
+    def test_role_grants_cover_members(self):
+        self.service.add_role_entry('readers', '/projects', read=True, inherit=True)
+        self.service.add_role_entry('readers', 'reports/*', read=True)
+        for user in ('qa', 'dev', 'ops'):
+            self.service.add_member('readers', user)
+        self.service.add_entry('ops', '/projects/42', write=True, inherit=True)
+        self.assertEqual(self.holders('/projects/42/logs'), {'read': ['dev', 'qa'], 'write': ['ops'], 'execute': []})
+        self.assertEqual(self.holders('reports/q1')['read'], ['dev', 'ops', 'qa'])
+
+        self.service.remove_member('readers', 'qa')
+        self.assertEqual(self.holders('/projects/7')['read'], ['dev', 'ops'])
+
+    def test_get_holders_pages(self):
+        for i in range(10):
+            self.service.add_entry(f'user-{i}', 'log', write=True)
+        self.assertEqual(self.service.get_holders('log', 'write', offset=4, limit=3), (10, ['user-4', 'user-5', 'user-6']))
+        self.assertEqual(self.service.get_holders('image', 'write'), (0, []))
+
+
+class DecisionCacheTest(TestCase):
+    @staticmethod
+    def decision(user: str, version: int) -> CachedDecision:
+        return CachedDecision(version, 200, {}, b'{}', AccessLogStatus.SUCCESS, user, 'log')
+
+    def test_stale_versions_miss(self):
+        cache = DecisionCache(capacity=10)
+        cache.put(('dev', 'log'), self.decision('dev', 1))
+
+        self.assertIsNotNone(cache.get(('dev', 'log'), {'dev': 1}))
+        self.assertIsNone(cache.get(('dev', 'log'), {'dev': 2}))
+        self.assertIsNone(cache.get(('ops', 'log'), {}))
+        self.assertEqual(cache.get_stats(), {'size': 1, 'capacity': 10, 'hits': 1, 'misses': 2, 'evictions': 0})
+
+    def test_least_recently_used_is_evicted(self):
+        cache = DecisionCache(capacity=2)
+        for user in ('dev', 'ops'):
+            cache.put((user, 'log'), self.decision(user, 0))
+        cache.get(('dev', 'log'), {})
+        cache.put(('qa', 'log'), self.decision('qa', 0))
+
+        self.assertEqual(list(cache.entries), [('dev', 'log'), ('qa', 'log')])
+        self.assertEqual(cache.evictions, 1)
+
+
+class TimingWheelTest(TestCase):
+    def test_keys_fire_on_their_tick(self):
+        rng = random.Random(0)
+        wheel = TimingWheel(tick=1.0, now=0)
+        # Spread over the first four levels.
+        deadlines = {f'key-{i}': rng.uniform(0, 64 ** 3 + 1000) for i in range(2000)}
+        deadlines.update({'next': 0.5, 'wrap': 64.0, 'cascade': 4096.5})
+        for key, deadline in deadlines.items():
+            wheel.schedule(key, deadline)
+
+        fired = {}
+        now = 0
+        while now < 64 ** 3 + 1001:
+            now += rng.uniform(0, 300)
+            for key, deadline in wheel.advance(now):
+                self.assertNotIn(key, fired)
+                self.assertEqual(deadline, deadlines[key])
+                fired[key] = now
+                wheel.cancel(key)
+        for key, at in fired.items():
+            # Never early, and on the first advance past the deadline's tick.
+            self.assertGreaterEqual(at, deadlines[key], key)
+            self.assertLess(at, deadlines[key] + 301, key)
+        self.assertEqual(fired.keys(), deadlines.keys())
+        self.assertEqual(len(wheel), 0)
+        self.assertFalse(any(slot for level in wheel.levels for slot in level))
+
+    def test_stalled_advance_jumps_to_occupied_slots(self):
+        wheel = TimingWheel(tick=1.0, now=0)
+        deadlines = {'soon': 10, 'hour': 3600.5, 'month': 30 * 86400, 'far': 64.0 ** 6 + 5}
+        for key, deadline in deadlines.items():
+            wheel.schedule(key, deadline)
+        events = []
+        next_event = wheel._next_event
+
+        def __next_event():
+            events.append(wheel.current)
+            return next_event()
+
+        wheel._next_event = __next_event
+        # Over 2000 years of ticks in one sweep: only the slots holding keys are visited.
+        self.assertEqual(sorted(wheel.advance(64.0 ** 6 + 10)), sorted(deadlines.items()))
+        self.assertLess(len(events), 30)
+        self.assertEqual(wheel.current, 64 ** 6 + 10)
+        self.assertEqual(wheel.occupied, [0] * len(wheel.occupied))
+
+    def test_reschedule_and_cancel(self):
+        wheel = TimingWheel(tick=1.0, now=0)
+        wheel.schedule('moved', 10)
+        wheel.schedule('moved', 100)
+        wheel.schedule('cancelled', 20)
+        self.assertTrue(wheel.cancel('cancelled'))
+        self.assertFalse(wheel.cancel('cancelled'))
+        self.assertEqual(wheel.advance(50), [])
+
+        self.assertEqual(wheel.advance(100), [('moved', 100)])
+        # Fired keys stay scheduled until cancelled.
+        self.assertEqual(wheel.get('moved'), 100)
+        wheel.cancel('moved')
+        self.assertEqual(len(wheel), 0)
+
+    def test_past_deadlines_fire_on_next_advance(self):
+        wheel = TimingWheel(tick=1.0, now=100)
+        wheel.schedule('late', 42)
+        self.assertEqual(wheel.advance(100), [('late', 42)])
+        wheel.cancel('late')
+        # An empty wheel skips ahead.
+        self.assertEqual(wheel.advance(10 ** 9), [])
+        self.assertEqual(wheel.current, 10 ** 9)
+
+
+def increment(registry: MetricsRegistry, counter, count: int) -> None:
+    for _ in range(count):
+        counter.inc()
+    registry.refresh()
+
+
+class MetricsRegistryTest(TestCase):
+    def test_render(self):
+        registry = MetricsRegistry()
+        entries = {
+            status: registry.counter("entries_total", "Entries.", status=status)
+            for status in ("SUCCESS", "USER_NOT_FOUND")
+        }
+        latency = registry.histogram("check_seconds", "Checks.", buckets=(0.001, 0.01))
+        registry.gauge("users", "Users.", lambda: 7)
+
+        entries["SUCCESS"].inc()
+        entries["SUCCESS"].inc(2)
+        for seconds in (0.0005, 0.001, 0.5):
+            latency.observe(seconds)
+
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP entries_total Entries.",
+            "# TYPE entries_total counter",
+            'entries_total{status="SUCCESS"} 3',
+            'entries_total{status="USER_NOT_FOUND"} 0',
+            "# HELP check_seconds Checks.",
+            "# TYPE check_seconds histogram",
+            'check_seconds_bucket{le="0.001"} 2',
+            'check_seconds_bucket{le="0.01"} 2',
+            'check_seconds_bucket{le="+Inf"} 3',
+            "check_seconds_sum 0.5015",
+            "check_seconds_count 3",
+            "# HELP users Users.",
+            "# TYPE users gauge",
+            "users 7",
+        ])
+
+    def test_processes_are_summed(self):
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        registry = MetricsRegistry()
+        counter = registry.counter("checks_total", "Checks.")
+        counter.inc()
+        registry.open(metrics_dir.name)
+        self.addCleanup(registry.close)
+        registry.gauge("users", "Users.", lambda: 7)
+        counter.inc()
+
+        # Forked children start from zero in their own file, exited ones still count.
+        context = multiprocessing.get_context("fork")
+        children = [context.Process(target=increment, args=(registry, counter, 3)) for _ in range(2)]
+        for child in children:
+            child.start()
+        for child in children:
+            child.join()
+            self.assertEqual(child.exitcode, 0)
+
+        lines = registry.render().splitlines()
+        self.assertIn("checks_total 8", lines)
+        self.assertEqual([line for line in lines if line.startswith("users")], [f'users{{pid="{os.getpid()}"}} 7'])
+        # The files of exited children were folded into the totals.
+        self.assertEqual(sorted(os.listdir(metrics_dir.name)), [
+            f"{os.getpid()}.metrics", "metrics.lock", f"totals-{registry.checksum:08x}.metrics",
+        ])
+        self.assertIn("checks_total 8", registry.render().splitlines())
+
+    def test_reused_pid_keeps_counts(self):
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        exited = MetricsRegistry(metrics_dir.name)
+        exited.counter("checks_total", "Checks.").inc(5)
+        exited.refresh()
+        exited.close()
+
+        # Another process that got the same pid maps the same file.
+        registry = MetricsRegistry()
+        counter = registry.counter("checks_total", "Checks.")
+        registry.open(metrics_dir.name)
+        self.addCleanup(registry.close)
+        counter.inc()
+        self.assertIn("checks_total 6", registry.render().splitlines())
+        # Reopening its own file counts it once.
+        registry.open(metrics_dir.name)
+        self.assertIn("checks_total 6", registry.render().splitlines())
+
+
+def describe_after_fork(registry: ServiceRegistry, scheduler: LazyScheduler, conn) -> None:
+    conn.send((registry.peek("grants"), registry.peek("writer"), registry.get("writer"), scheduler.state, scheduler.get_jobs()))
+
+
+class ServiceRegistryTest(TestCase):
+    def setUp(self):
+        self.builds = []
+        self.registry = ServiceRegistry()
+        self.registry.register("grants", lambda: self.build("grants"), inherit=True)
+        self.registry.register("writer", lambda: self.build("writer"))
+
+    def build(self, name: str) -> str:
+        self.builds.append(name)
+        return f"{name}-{os.getpid()}"
+
+    def test_built_once_on_first_use(self):
+        self.assertIsNone(self.registry.peek("grants"))
+        self.assertEqual(self.builds, [])
+
+        threads = [threading.Thread(target=self.registry.get, args=("grants",)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.builds, ["grants"])
+        self.assertEqual(self.registry.peek("grants"), f"grants-{os.getpid()}")
+
+    def test_replace(self):
+        built = self.registry.get("writer")
+        self.assertEqual(self.registry.replace("writer", "fake"), built)
+        self.assertEqual(self.registry.get("writer"), "fake")
+        self.assertEqual(self.registry.replace("writer", None), "fake")
+        self.assertIsNone(self.registry.peek("writer"))
+        self.registry.get("writer")
+        self.assertEqual(self.builds, ["writer", "writer"])
+
+    def test_fork_keeps_inherited_services_only(self):
+        scheduler = LazyScheduler()
+        self.assertEqual(scheduler.state, STATE_STOPPED)
+        scheduler.add_job(print, trigger=IntervalTrigger(hours=1))
+        self.addCleanup(scheduler.shutdown)
+        self.assertEqual(scheduler.state, STATE_RUNNING)
+        grants, writer = self.registry.get("grants"), self.registry.get("writer")
+
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        child = multiprocessing.get_context("fork").Process(target=describe_after_fork, args=(self.registry, scheduler, sender))
+        child.start()
+        kept, dropped, rebuilt, state, jobs = receiver.recv()
+        child.join()
+
+        self.assertEqual(kept, grants)
+        self.assertIsNone(dropped)
+        self.assertEqual(rebuilt, f"writer-{child.pid}")
+        self.assertEqual((state, jobs), (STATE_STOPPED, []))
+        self.assertEqual(self.registry.peek("writer"), writer)
+        self.assertEqual(len(scheduler.get_jobs()), 1)
+
+    def test_import_builds_nothing(self):
+        script = (
+            "import threading, django; django.setup();"
+            "import rights_verification_system.urls;"
+            "from access.registry import services;"
+            "from access.scheduler import scheduler;"
+            "print(sorted(services._instances), scheduler.state, [t.name for t in threading.enumerate()])"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "rights_verification_system.settings"},
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), f"[] {STATE_STOPPED} ['MainThread']")
+
+
+class ConcurrencyTest(TestCase):
+    def setUp(self) -> None:
+        # Switch threads as often as possible to interleave the compound updates.
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+    def test_forbidden_pages_beside_records(self):
+        tracker = ForbiddenAccessTracker(capacity=1000)
+        errors = []
+
+        def recorder(n: int):
+            for i in range(2000):
+                tracker.record('dev', f'res-{n}-{i}')
+
+        def pager():
+            for _ in range(200):
+                try:
+                    tracker.page(user='dev', offset=0, limit=1000)
+                    tracker.page(offset=0, limit=1000)
+                    tracker.resources()
+                except RuntimeError as exc:
+                    errors.append(exc)
+
+        workers = [threading.Thread(target=recorder, args=(n,)) for n in range(4)]
+        workers += [threading.Thread(target=pager) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(tracker.page(user='dev', limit=1)[0], 1000)
+
+    def test_concurrent_writers_and_readers(self):
+        service = AccessService(holders_index=True, stripes=4)
+        service.add_entry('base', 'log', read=True)
+        threads, rounds = 8, 500
+        errors = []
+
+        def writer(n: int):
+            for i in range(rounds):
+                service.add_entry(f'user-{i % 10}', f'res-{n}-{i}', read=True, write=bool(i % 2))
+                service.add_entry(f'user-{i % 10}', f'res-{n}-{i}/**', execute=True)
+
+        def reader(n: int):
+            for i in range(rounds):
+                if service.check_access('base', 'log') != AccessRights(True, False, False):
+                    errors.append('base')
+                service.check_access('base', f'missing-{n}')
+                service.check_access(f'user-{i % 10}', f'res-{n}-{i}/x')
+                service.get_holders(f'res-{n}-{i}/x', 'execute')
+
+        workers = [threading.Thread(target=target, args=(n,)) for n in range(threads) for target in (writer, reader)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sum(len(user_rights) for user_rights in service.rights.values()), 1 + threads * rounds * 2)
+        for n in range(threads):
+            for i in range(rounds):
+                self.assertEqual(service.check_access(f'user-{i % 10}', f'res-{n}-{i}/x'), AccessRights(False, False, True))
+            self.assertEqual(service.forbidden_access.forbidden['base'][f'missing-{n}'].count, rounds)
+        self.assertEqual(service.get_holders('res-0-1', 'write'), (1, ['user-1']))
+        self.assertEqual(service.get_holders('res-0-1/x', 'execute'), (1, ['user-1']))
+        self.assertEqual(
+            sum(len(service.get_holders(f'res-{n}-{i}', 'read')[1]) for n in range(threads) for i in range(rounds)),
+            threads * rounds,
+        )
+
+
+def hold_store(path: str, opened, release) -> None:
+    store = GrantStore(path)
+    store.load()
+    opened.set()
+    release.wait(10)
+    store.close()
+
+
+class GrantStoreTest(TestCase):
+    def setUp(self) -> None:
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.store_dir.cleanup)
+
+    def restart(self, **kwargs) -> AccessService:
+        store = GrantStore(self.store_dir.name, **kwargs)
+        self.addCleanup(store.close)
+        return AccessService(store=store)
+
+    def test_restart_replays_wal(self):
+        service = self.restart()
+        service.add_entry('dev', 'log', read=True)
+        service.add_entry('dev', 'log', read=True, execute=True)
+        service.add_entry('ops', 'image', write=True)
+        service.store.close()
+
+        self.assertEqual(self.restart().rights, {
+            'dev': {'log': AccessRights(True, False, True)},
+            'ops': {'image': AccessRights(False, True, False)},
+        })
+
+    def test_restart_loads_snapshot_and_wal_tail(self):
+        service = self.restart(compact_every=3)
+        for i in range(5):
+            service.add_entry('dev', f'res-{i}', write=bool(i % 2))
+        service.store.close()
+
+        self.assertTrue(os.path.exists(service.store.snapshot_file))
+        self.assertEqual(service.store.wal_records, 2)
+        self.assertEqual(self.restart().rights, service.rights)
+
+    def test_writes_go_on_while_compacting(self):
+        service = self.restart(compact_every=2)
+        copying, release = threading.Event(), threading.Event()
+        persisted = service._persisted_rights
+
+        def __copy():
+            copying.set()
+            release.wait(5)
+            return persisted()
+
+        service._persisted_rights = __copy
+        service.add_entry('dev', 'log', read=True)
+        service.add_entry('dev', 'image', read=True)
+        self.assertTrue(copying.wait(5))
+        # The copy waits on the compaction thread, the locks are free.
+        service.add_entry('dev', 'image', write=True)
+        service.add_entry('ops', 'log', execute=True)
+        release.set()
+        service.store.close()
+
+        self.assertEqual(service.store.wal_records, 2)
+        self.assertEqual(self.restart().rights, service.rights)
+
+    def test_store_has_one_writer(self):
+        ctx = multiprocessing.get_context('fork')
+        opened, release = ctx.Event(), ctx.Event()
+        holder = ctx.Process(target=hold_store, args=(self.store_dir.name, opened, release))
+        holder.start()
+        self.assertTrue(opened.wait(10))
+        try:
+            with self.assertRaises(StoreLockedError):
+                self.restart()
+        finally:
+            release.set()
+            holder.join()
+
+        # Free again once the holder closed it.
+        self.restart().add_entry('dev', 'log', read=True)
+
+    def test_torn_wal_tail_is_dropped(self):
+        service = self.restart()
+        service.add_entry('dev', 'log', read=True)
+        service.add_entry('dev', 'image', read=True)
+        service.store.close()
+        with open(service.store.wal_file, 'r+b') as wal:
+            wal.truncate(os.path.getsize(service.store.wal_file) - 2)
+
+        restarted = self.restart()
+        self.assertEqual(restarted.rights, {'dev': {'log': AccessRights(True, False, False)}})
+        restarted.add_entry('dev', 'video', execute=True)
+        restarted.store.close()
+        self.assertEqual(self.restart().rights['dev']['video'], AccessRights(False, False, True))
+
+
+def describe_expiry_after_fork(service: AccessService, conn) -> None:
+    conn.send((list(service.expiries.deadlines), [job.id for job in scheduler.get_jobs()], service._expiry_job.id))
+
+
+class GrantExpiryTest(TestCase):
+    # Sweeps are run by the tests, the scheduler's only come every hour.
+    tick = 3600
+
+    def setUp(self) -> None:
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.store_dir.cleanup)
+
+    def service(self, store: GrantStore | None = None, **kwargs) -> AccessService:
+        service = AccessService(store=store, expiry_tick=self.tick, **kwargs)
+        self.addCleanup(service.close)
+        return service
+
+    def restart(self, **kwargs) -> AccessService:
+        store = GrantStore(self.store_dir.name, **kwargs)
+        self.addCleanup(store.close)
+        return self.service(store=store)
+
+    def test_grants_are_revoked_after_expiry(self):
+        service = self.service(holders_index=True)
+        now = time.time()
+        service.add_entry('dev', 'log', read=True, expires_in=60)
+        service.add_entry('dev', 'image', read=True)
+        service.add_entry('dev', '/projects/42', write=True, inherit=True, expires_in=60)
+        service.add_entry('dev', 'reports/*', write=True, expires_in=120)
+        version = service.versions['dev']
+
+        self.assertEqual(service.expire_due(now + 30), 0)
+        self.assertEqual(service.check_access('dev', '/projects/42/logs'), AccessRights(False, True, False))
+        self.assertEqual(service.expire_due(now + 2 * self.tick), 3)
+        self.assertEqual(service.expire_due(now + 3 * self.tick), 0)
+
+        self.assertEqual(service.rights, {'dev': {'image': AccessRights(True, False, False)}})
+        for resource in ('log', '/projects/42/logs', 'reports/q1'):
+            self.assertEqual(service.check_access('dev', resource), AccessLogStatus.RESOURCE_NOT_FOUND, resource)
+        self.assertEqual((service.trees, service.patterns, service.covering), ({}, {}, {}))
+        self.assertEqual(list(service.holders), ['image'])
+        self.assertEqual(service.versions['dev'], version + 3)
+        self.assertEqual(len(service.expiries), 0)
+
+    def test_granting_again_replaces_expiry(self):
+        service = self.service()
+        now = time.time()
+        service.add_entry('dev', 'log', read=True, expires_in=60)
+        service.add_entry('dev', 'log', read=True)
+        service.add_entry('ops', 'log', read=True, expires_in=60)
+        service.add_entry('ops', 'log', write=True, expires_in=5 * self.tick)
+
+        self.assertEqual(service.expire_due(now + 2 * self.tick), 0)
+        self.assertEqual(service.check_access('ops', 'log'), AccessRights(False, True, False))
+        version = service.versions['ops']
+        self.assertEqual(service.expire_due(now + 7 * self.tick), 1)
+        # The last grant gone, nothing of the user is left.
+        self.assertEqual(service.rights, {'dev': {'log': AccessRights(True, False, False)}})
+        self.assertNotIn('ops', service.versions)
+        self.assertEqual(service.check_access('ops', 'log'), AccessLogStatus.USER_NOT_FOUND)
+
+        service.add_entry('ops', 'log', read=True)
+        self.assertGreater(service.versions['ops'], version)
+
+    def test_role_grants_stay(self):
+        service = self.service()
+        now = time.time()
+        service.add_role_entry('readers', 'log', read=True)
+        service.add_member('readers', 'dev')
+        service.add_entry('dev', 'log', write=True, expires_in=60)
+        self.assertEqual(service.check_access('dev', 'log'), AccessRights(True, True, False))
+
+        self.assertEqual(service.expire_due(now + 2 * self.tick), 1)
+        self.assertEqual(service.check_access('dev', 'log'), AccessRights(True, False, False))
+        self.assertEqual(service.direct, {'dev': {}})
+        self.assertIs(service.rights['dev'], service._combined[frozenset({'readers'})])
+
+    def test_expiries_are_persisted(self):
+        service = self.restart(compact_every=5)
+        now = time.time()
+        service.add_entry('dev', 'log', read=True, expires_in=60)
+        service.add_entry('dev', 'image', read=True, expires_in=60)
+        # Compacts: the snapshot keeps the deadline still pending, the new log starts empty.
+        service.add_entry('dev', 'image', read=True)
+        service.add_entry('ops', 'log', read=True)
+        service.store.close()
+        self.assertEqual(service.store.wal_records, 1)
+        self.assertEqual(os.path.getsize(service.store.wal_file), WAL_HEADER.size + len('opslog'))
+
+        restarted = self.restart()
+        self.assertEqual(restarted.expiries.deadlines, service.expiries.deadlines)
+        self.assertEqual(restarted.expire_due(now + 2 * self.tick), 1)
+        restarted.store.close()
+        self.assertEqual(self.restart().rights, {
+            'dev': {'image': AccessRights(True, False, False)},
+            'ops': {'log': AccessRights(True, False, False)},
+        })
+
+    def test_expired_while_down(self):
+        service = self.restart()
+        service.add_entry('dev', 'log', read=True)
+        service.add_entry('dev', 'image', read=True, expires_in=60)
+        with service.store.lock:
+            service.store.expire('dev', 'log', time.time() - 2 * self.tick)
+        service.store.close()
+
+        restarted = self.restart()
+        self.assertEqual(restarted.rights, {'dev': {'image': AccessRights(True, False, False)}})
+        self.assertEqual(list(restarted.expiries.deadlines), [('dev', 'image')])
+
+    def test_fork_sweeps_again(self):
+        service = self.service()
+        service.add_entry('dev', 'log', read=True, expires_in=60)
+
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        child = multiprocessing.get_context('fork').Process(target=describe_expiry_after_fork, args=(service, sender))
+        child.start()
+        pending, jobs, sweep = receiver.recv()
+        child.join()
+
+        self.assertEqual(pending, [('dev', 'log')])
+        # The parent's jobs are gone, the child has a sweep of its own.
+        self.assertIn(sweep, jobs)
+        self.assertNotEqual(sweep, service._expiry_job.id)
+
+
+def add_shared_grants(path: str, user: str, count: int) -> None:
+    service = AccessService(shared_table=SharedGrantTable(path, capacity=8))
+    for i in range(count):
+        service.add_entry(user, f'res-{i}', read=True, write=bool(i % 2))
+
+
+def add_table_grants(table: SharedGrantTable, user: str, count: int) -> None:
+    for i in range(count):
+        table.put(user, f'res-{i}', AccessRights(True, False, False))
+
+
+class SharedGrantTableTest(TestCase):
+    def setUp(self) -> None:
+        table_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(table_dir.cleanup)
+        self.path = os.path.join(table_dir.name, 'grants.shm')
+
+    def service(self) -> AccessService:
+        table = SharedGrantTable(self.path, capacity=8)
+        self.addCleanup(table.close)
+        return AccessService(shared_table=table)
+
+    def test_check_access(self):
+        service = self.service()
+        service.add_entry('dev', 'log', read=True)
+        service.add_entry('dev', 'log', read=True, execute=True)
+        service.add_entry('ops', 'image', write=True)
+
+        self.assertEqual(service.check_access('dev', 'log'), AccessRights(True, False, True))
+        self.assertEqual(service.check_access('dev', 'image'), AccessLogStatus.RESOURCE_NOT_FOUND)
+        self.assertEqual(service.check_access('qa', 'log'), AccessLogStatus.USER_NOT_FOUND)
+        self.assertEqual(dict(service.rights.items()), {
+            'dev': {'log': AccessRights(True, False, True)},
+            'ops': {'image': AccessRights(False, True, False)},
+        })
+
+    def test_grants_are_shared_across_processes(self):
+        reader = self.service()
+        # Forked workers inherit the parent's modules, spawned ones import them afresh.
+        for method in ('fork', 'spawn'):
+            with self.subTest(method=method):
+                ctx = multiprocessing.get_context(method)
+                users = [f'{method}-dev', f'{method}-ops']
+                writers = [ctx.Process(target=add_shared_grants, args=(self.path, user, 50)) for user in users]
+                for writer in writers:
+                    writer.start()
+                for writer in writers:
+                    writer.join()
+                    self.assertEqual(writer.exitcode, 0)
+
+                # The writers grew the table far past its initial capacity, the reader follows the new mapping.
+                for user in users:
+                    for i in range(50):
+                        self.assertEqual(reader.check_access(user, f'res-{i}'), AccessRights(True, bool(i % 2), False))
+        self.assertEqual(len(reader.rights.table), 200)
+
+    def test_writers_forked_after_build_exclude_each_other(self):
+        # A table built before fork, as in a preloaded server: the children share its lock file description.
+        table = SharedGrantTable(self.path, capacity=8)
+        self.addCleanup(table.close)
+        ctx = multiprocessing.get_context('fork')
+        users = [f'dev-{i}' for i in range(4)]
+        writers = [ctx.Process(target=add_table_grants, args=(table, user, 300)) for user in users]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            # Writers that do not exclude each other can corrupt the probe chains and spin forever.
+            writer.join(60)
+            if writer.is_alive():
+                writer.kill()
+                writer.join()
+        self.assertEqual([writer.exitcode for writer in writers], [0] * 4)
+
+        self.assertEqual(len(table), 1200)
+        self.assertEqual(sorted(table.users()), users)
+
+    def test_delete_and_reuse(self):
+        service = self.service()
+        for i in range(20):
+            service.add_entry('dev', f'res-{i}', read=True)
+        for i in range(0, 20, 2):
+            del service.rights['dev'][f'res-{i}']
+            service.add_entry('dev', f'new-{i}', execute=True)
+
+        self.assertEqual(service.check_access('dev', 'res-0'), AccessLogStatus.RESOURCE_NOT_FOUND)
+        self.assertEqual(service.check_access('dev', 'res-1'), AccessRights(True, False, False))
+        self.assertEqual(service.check_access('dev', 'new-0'), AccessRights(False, False, True))
+        self.assertEqual(len(service.rights['dev']), 20)
+
+    def test_check_access_inherited(self):
+        service = self.service()
+        service.add_entry('dev', '/projects/42', read=True, inherit=True)
+        service.add_entry('dev', '/projects/42/logs', write=True)
+
+        self.assertEqual(service.check_access('dev', '/projects/42/logs/today'), AccessRights(True, False, False))
+        self.assertEqual(service.check_access('dev', '/projects/42/logs'), AccessRights(False, True, False))
+        self.assertEqual(service.check_access('dev', '/projects/7'), AccessLogStatus.RESOURCE_NOT_FOUND)
+
+    def test_expiring_grants_unsupported(self):
+        service = self.service()
+        with self.assertRaises(ValueError):
+            service.add_entry('dev', 'log', read=True, expires_in=60)
+        self.assertEqual(service.check_access('dev', 'log'), AccessLogStatus.USER_NOT_FOUND)
+
+    def test_reader_repairs_counter_of_dead_writer(self):
+        service = self.service()
+        service.add_entry('dev', 'log', read=True)
+        table = service.rights.table
+        # A writer killed between bumping the counter and bumping it back.
+        table._begin()
+
+        self.assertEqual(service.check_access('dev', 'log'), AccessRights(True, False, False))
+        self.assertFalse(struct.unpack_from('<Q', table._mm, SEQ_OFFSET)[0] & 1)
+
+    def test_corrupted_table_raises(self):
+        service = self.service()
+        service.add_entry('dev', 'log', read=True)
+        table = service.rights.table
+        # A capacity past the end of the mapping: every probe reads out of bounds.
+        struct.pack_into('<Q', table._mm, 8, 1 << 40)
+
+        with self.assertRaises(struct.error):
+            table.get('dev', 'log')
+
+    def test_cannot_combine_with_store(self):
+        with tempfile.TemporaryDirectory() as store_dir:
+            store = GrantStore(store_dir)
+            with self.assertRaises(ValueError):
+                AccessService(store=store, shared_table=SharedGrantTable(self.path))
+
+
+class ImportServiceTest(TestCase):
+    def setUp(self) -> None:
+        self.access_service = AccessService()
+        self.service = ImportService(self.access_service, chunk_size=2)
+
+    def test_load_ndjson(self):
+        lines = [
+            '{"user": "dev", "resource": "log", "read": true}\n',
+            '{"user": "dev", "resource": "log", "write": true}\n',
+            '{"user": "d", "resource": "log"}\n',
+            'not json\n',
+            '{"user": "ops", "resource": "image", "execute": true}\n',
+        ]
+        report = self.service.load(iter_ndjson(lines))
+
+        self.assertEqual(
+            (report.total, report.created, report.updated, report.failed),
+            (5, 2, 1, 2),
+        )
+        self.assertEqual([error["line"] for error in report.errors], [3, 4])
+        self.assertIn("user", report.errors[0]["errors"])
+        self.assertEqual(self.access_service.rights, {
+            'dev': {'log': AccessRights(False, True, False)},
+            'ops': {'image': AccessRights(False, False, True)},
+        })
+
+    def test_load_csv(self):
+        lines = [
+            "user,resource,read,write,execute\n",
+            "dev,log,true,,1\n",
+            "dev,,true,false,false\n",
+        ]
+        report = self.service.load(iter_csv(lines))
+
+        self.assertEqual((report.total, report.created, report.failed), (2, 1, 1))
+        self.assertEqual(report.errors[0]["line"], 3)
+        self.assertEqual(self.access_service.rights, {'dev': {'log': AccessRights(True, False, True)}})
+
+    def test_role_rights_are_not_own_grants(self):
+        self.access_service.add_role_entry('readers', 'log', read=True)
+        self.access_service.add_member('readers', 'dev')
+        self.access_service.add_entry('dev', 'image', read=True)
+        lines = [
+            '{"user": "dev", "resource": "log", "read": true}\n',
+            '{"user": "dev", "resource": "image", "write": true}\n',
+        ]
+        report = self.service.load(iter_ndjson(lines))
+
+        self.assertEqual((report.created, report.updated), (1, 1))
+        self.assertEqual(self.access_service.direct['dev'], {
+            'log': AccessRights(True, False, False),
+            'image': AccessRights(False, True, False),
+        })
+
+    def test_load_grants_refuses_store_in_use(self):
+        store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(store_dir.cleanup)
+        # The store of a running server.
+        server = GrantStore(store_dir.name)
+        server.load()
+        self.addCleanup(server.close)
+        self.addCleanup(services.replace, 'access', services.replace('access', None))
+
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as grants_file:
+            grants_file.write('{"user": "dev", "resource": "log", "read": true}\n')
+            grants_file.flush()
+            with override_settings(ACCESS={**settings.ACCESS, 'STORE_PATH': store_dir.name}):
+                with self.assertRaisesMessage(CommandError, 'running server'):
+                    call_command('load_grants', grants_file.name, stdout=io.StringIO())
+
+    def test_load_grants_needs_persistent_backend(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as grants_file:
+            grants_file.write('{"user": "dev", "resource": "log", "read": true}\n')
+            grants_file.flush()
+            with self.assertRaisesMessage(CommandError, '--url'):
+                call_command('load_grants', grants_file.name, stdout=io.StringIO())
+
+
+def remove_log_files(service: LogService) -> None:
+    service.close()
+    for path in glob.glob(service.output_log_path + service.log_file_stem + ".*"):
+        os.remove(path)
+
+
+def wait_for(predicate, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
 
 
 class LogServiceTest(TestCase):
     def setUp(self) -> None:
         self.log_file_name = "test_log_service.csv"
         self.service = LogService(log_file_name=self.log_file_name)
+        self.addCleanup(remove_log_files, self.service)
 
     def test_log_service_init_success(self):
         a = AccessLogEntry("", "", "")
@@ -138,11 +1325,444 @@ class LogServiceTest(TestCase):
             self.assertEqual(row_names, columns)
             self.assertEqual(log_entry, str(a)+"\n")
 
+    def test_write_entries_success(self):
+        entries = [
+            AccessLogEntry("dev", "log", "SUCCESS"),
+            AccessLogEntry("tester", "log", "USER_NOT_FOUND"),
+        ]
+        self.service.write_entries([
+            ("dev", "log", AccessLogStatus.SUCCESS),
+            ("tester", "log", AccessLogStatus.USER_NOT_FOUND),
+        ])
+        with open(self.service.log_file) as csv_file:
+            csv_file.readline()
+            self.assertEqual(csv_file.readlines(), [str(a) + "\n" for a in entries])
+
+    def test_buffered_write_entry_flush(self):
+        service = LogService(log_file_name="test_buffered_log_service.csv", buffered=True, flush_interval=60)
+        self.addCleanup(remove_log_files, service)
+        service.write_entry("dev", "log", AccessLogStatus.SUCCESS)
+        with open(service.log_file) as csv_file:
+            self.assertEqual(len(csv_file.readlines()), 1)
+
+        service.flush()
+        with open(service.log_file) as csv_file:
+            self.assertEqual(csv_file.readlines()[1:], [str(AccessLogEntry("dev", "log", "SUCCESS")) + "\n"])
+
+    def test_buffered_write_entry_size_threshold(self):
+        service = LogService(log_file_name="test_buffered_log_service.csv", buffered=True, flush_size=10)
+        self.addCleanup(remove_log_files, service)
+        for _ in range(10):
+            service.write_entry("dev", "log", AccessLogStatus.SUCCESS)
+
+        wait_for(lambda: not service._queue)
+        with service._write_lock, open(service.log_file) as csv_file:
+            self.assertEqual(len(csv_file.readlines()), 11)
+
+    def test_write_after_close_is_kept(self):
+        service = LogService(log_file_name="test_buffered_log_service.csv", buffered=True, flush_interval=60)
+        self.addCleanup(remove_log_files, service)
+        service.write_entry("dev", "log", AccessLogStatus.SUCCESS)
+        service.close()
+        service.write_entry("ops", "log", AccessLogStatus.SUCCESS)
+
+        self.assertFalse(service._queue)
+        with open(service.log_file) as csv_file:
+            self.assertEqual(len(csv_file.readlines()), 3)
+
+    def test_active_size_counts_bytes(self):
+        self.service.write_entry("разработчик", "журнал", AccessLogStatus.SUCCESS)
+        header_size = len(self.service._header().encode())
+        self.assertEqual(self.service._active_bytes, os.path.getsize(self.service.log_file) - header_size)
+
+    def test_restart_keeps_previous_log(self):
+        self.service.write_entry("dev", "log", AccessLogStatus.SUCCESS)
+        restarted = LogService(log_file_name=self.log_file_name)
+
+        segments = restarted.get_log_files()["segments"]
+        self.assertEqual([segment["rows"] for segment in segments], [1, 0])
+        with open(segments[0]["path"]) as csv_file:
+            self.assertEqual(csv_file.readlines()[1:], [str(AccessLogEntry("dev", "log", "SUCCESS")) + "\n"])
+
+    def test_size_rotation_compressed(self):
+        service = LogService(log_file_name=self.log_file_name, max_bytes=40, compression="gzip")
+        for _ in range(4):
+            service.write_entry("dev", "log", AccessLogStatus.SUCCESS)
+
+        wait_for(lambda: all(s["compression"] for s in service.get_log_files()["segments"][:-1]))
+        segments = service.get_log_files()["segments"]
+        self.assertEqual([segment["rows"] for segment in segments], [3, 1])
+        self.assertTrue(segments[0]["path"].endswith(".csv.gz"))
+        with gzip.open(segments[0]["path"], "rt") as csv_file:
+            self.assertEqual(len(csv_file.readlines()), 4)
+
+    def test_get_log_files_time_range(self):
+        self.service.write_entry("dev", "log", AccessLogStatus.SUCCESS)
+        self.service.rotate()
+
+        now = datetime.now(timezone.utc)
+        self.assertEqual(len(self.service.get_log_files(since=now - timedelta(hours=1))["segments"]), 2)
+        self.assertEqual(len(self.service.get_log_files(until=now - timedelta(hours=1))["segments"]), 0)
+        self.assertEqual(len(self.service.get_log_files(since=now + timedelta(seconds=1))["segments"]), 1)
+
+    def test_query_entries_index(self):
+        service = LogService(log_file_name="test_indexed_log_service.csv", index=True)
+        self.addCleanup(remove_log_files, service)
+        service.write_entries([
+            ("dev", "log", AccessLogStatus.SUCCESS),
+            ("dev", "image", AccessLogStatus.RESOURCE_NOT_FOUND),
+            ("ops", "image", AccessLogStatus.RESOURCE_NOT_FOUND),
+        ])
+        service.write_entry("dev", "image", AccessLogStatus.RESOURCE_NOT_FOUND)
+
+        count, entries, _ = service.query_entries(user="dev", status="RESOURCE_NOT_FOUND", limit=1)
+        self.assertEqual(count, 2)
+        self.assertEqual([(e["user"], e["resource"]) for e in entries], [("dev", "image")])
+
+        count, groups = service.aggregate_entries("user", status="RESOURCE_NOT_FOUND")
+        self.assertEqual(count, 3)
+        self.assertEqual(groups, [{"key": "dev", "count": 2}, {"key": "ops", "count": 1}])
+
+        count, _, next_cursor = service.query_entries(since=datetime.now(timezone.utc) + timedelta(seconds=1))
+        self.assertEqual((count, next_cursor), (0, None))
+
+    def test_query_entries_cursor(self):
+        service = LogService(log_file_name="test_indexed_log_service.csv", index=True)
+        self.addCleanup(remove_log_files, service)
+        # One batch: every entry has the same timestamp, the rowid orders them.
+        service.write_entries([(f"user-{i}", "log", AccessLogStatus.SUCCESS) for i in range(5)])
+
+        pages, cursor = [], None
+        while True:
+            count, entries, cursor = service.query_entries(limit=2, cursor=cursor)
+            pages.append([entry["user"] for entry in entries])
+            if cursor is None:
+                break
+        self.assertEqual(count, 5)
+        self.assertEqual(pages, [["user-4", "user-3"], ["user-2", "user-1"], ["user-0"]])
+
+    def test_query_plans_need_no_sort(self):
+        service = LogService(log_file_name="test_indexed_log_service.csv", index=True)
+        self.addCleanup(remove_log_files, service)
+        conn = service.index._connection()
+        for where in ("user = ?", "resource = ?", "status = ?", "user = ? AND status = ?", "resource = ? AND status = ?"):
+            plan = conn.execute(
+                f"EXPLAIN QUERY PLAN SELECT ts, rowid FROM entries WHERE {where} ORDER BY ts DESC, rowid DESC LIMIT 10",
+                ("dev",) * where.count("?"),
+            ).fetchall()
+            self.assertNotIn("TEMP B-TREE", " ".join(row[-1] for row in plan), where)
+
+    def test_connections_of_exited_threads_are_closed(self):
+        service = LogService(log_file_name="test_indexed_log_service.csv", index=True)
+        self.addCleanup(remove_log_files, service)
+        for _ in range(3):
+            thread = threading.Thread(target=service.query_entries, kwargs={"user": "dev"})
+            thread.start()
+            thread.join()
+
+        # This thread's and the last worker's, not yet replaced.
+        self.assertEqual(len(service.index._connections), 2)
+
+    def test_expired_segments_leave_the_index(self):
+        service = LogService(log_file_name="test_indexed_log_service.csv", index=True, max_segments=1)
+        self.addCleanup(remove_log_files, service)
+        for user in ("dev", "ops", "qa"):
+            service.write_entry(user, "log", AccessLogStatus.SUCCESS)
+            time.sleep(0.01)
+            service.rotate()
+
+        segments = service.get_log_files()["segments"]
+        self.assertEqual([segment["rows"] for segment in segments], [1, 0])
+        self.assertEqual(len(glob.glob(service.output_log_path + service.log_file_stem + ".2*")), 1)
+        _, entries, _ = service.query_entries()
+        self.assertEqual([entry["user"] for entry in entries], ["qa"])
+
     def test_get_log_file_path_success(self):
         file_path = (settings.STATIC_URL + "log/" + self.log_file_name)[1:]
         self.assertEqual(self.service.get_log_file_path(), file_path)
 
 
+class OperationsServiceTest(TestCase):
+    def run_operation(self, service: OperationsService) -> UUID:
+        op_id = service.execute_operation(lambda: {"rows": 0})
+        wait_for(lambda: service.get_operation(op_id).done)
+        return op_id
+
+    def test_sweep_expires_finished_operations(self):
+        service = OperationsService(ttl=0.05)
+        op_id = self.run_operation(service)
+        release = threading.Event()
+        running_id = service.execute_operation(release.wait, args=(5,))
+        self.addCleanup(release.set)
+
+        time.sleep(0.1)
+        self.assertEqual(service.sweep(), 1)
+        self.assertIsNone(service.get_operation(op_id))
+        self.assertTrue(service.is_expired(op_id))
+        self.assertIsNotNone(service.get_operation(running_id))
+        self.assertEqual(service.get_stats(), {"live": 1, "running": 1, "expired": 1})
+
+    def test_wait_operation_woken_by_finish(self):
+        service = OperationsService()
+        release = threading.Event()
+        op_id = service.execute_operation(release.wait, args=(5,))
+        threading.Timer(0.1, release.set).start()
+
+        started = time.monotonic()
+        op = service.wait_operation(op_id, timeout=5)
+        self.assertTrue(op.done)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertIsNone(service.wait_operation(uuid4(), timeout=5))
+
+    def test_wait_operation_woken_by_expiry(self):
+        service = OperationsService()
+        release = threading.Event()
+        self.addCleanup(release.set)
+        op_id = service.execute_operation(release.wait, args=(5,))
+
+        def __expire():
+            with service._lock:
+                service._expire(op_id)
+
+        threading.Timer(0.1, __expire).start()
+        started = time.monotonic()
+        self.assertIsNone(service.wait_operation(op_id, timeout=5))
+        self.assertLess(time.monotonic() - started, 2)
+
+    async def test_wait_operation_async(self):
+        service = OperationsService()
+        release = threading.Event()
+        self.addCleanup(release.set)
+        op_id = service.execute_operation(release.wait, args=(5,))
+
+        op = await service.wait_operation_async(op_id, timeout=0.05)
+        self.assertFalse(op.done)
+        self.assertEqual(service._waiters, {})
+
+        threading.Timer(0.1, release.set).start()
+        started = time.monotonic()
+        op = await service.wait_operation_async(op_id, timeout=5)
+        self.assertTrue(op.done)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertIsNone(await service.wait_operation_async(uuid4(), timeout=5))
+
+    def test_max_operations_evicts_least_recently_used(self):
+        service = OperationsService(max_operations=2)
+        first = self.run_operation(service)
+        second = self.run_operation(service)
+        service.get_operation(first)
+        third = self.run_operation(service)
+
+        self.assertEqual(list(service.operations), [first, third])
+        self.assertTrue(service.is_expired(second))
+
+    def test_expiry_cleans_up_results(self):
+        service = OperationsService(max_operations=1)
+        cleaned = []
+        release = threading.Event()
+        self.addCleanup(release.set)
+        running = service.execute_operation(lambda: release.wait(5) and "late", cleanup=cleaned.append)
+        done = service.execute_operation(lambda: "kept", cleanup=cleaned.append)
+        wait_for(lambda: service.get_operation(done).done)
+        self.assertTrue(service.is_expired(running))
+        self.assertEqual(cleaned, [])
+
+        release.set()
+        wait_for(lambda: cleaned)
+        self.assertEqual(cleaned, ["late"])
+        self.run_operation(service)
+        self.assertEqual(cleaned, ["late", "kept"])
+
+    def test_cleanups_run_outside_the_lock(self):
+        service = OperationsService(ttl=0.05, max_operations=1)
+        unlocked = []
+
+        def __cleanup(result):
+            # Fails to acquire if this very thread still held it.
+            acquired = service._lock.acquire(timeout=1)
+            if acquired:
+                service._lock.release()
+            unlocked.append((result, acquired))
+
+        evicted = service.execute_operation(lambda: "evicted", cleanup=__cleanup)
+        wait_for(lambda: service.get_operation(evicted).done)
+        swept = service.execute_operation(lambda: "swept", cleanup=__cleanup)
+        wait_for(lambda: service.get_operation(swept).done)
+        time.sleep(0.1)
+        self.assertEqual(service.sweep(), 1)
+        self.assertEqual(unlocked, [("evicted", True), ("swept", True)])
+
+
+class CompiledValidatorTest(TestCase):
+    def test_accepts_what_serializer_accepts(self):
+        validator = CompiledValidator(ModifyAccessSerializer)
+        test_table = [
+            ({"user": "dev", "resource": "log"}, {"user": "dev", "resource": "log", "read": False, "write": False, "execute": False}),
+            ({"user": " dev ", "resource": "log", "read": "true", "inherit": 0}, {"user": "dev", "resource": "log", "read": True, "write": False, "execute": False, "inherit": False}),
+            ({"user": "dev"}, None),
+            ({"user": "de", "resource": "log"}, None),
+            ({"user": "d" * 21, "resource": "log"}, None),
+            ({"user": "dev", "resource": "l\x00g"}, None),
+            ({"user": "dev", "resource": "@auditors"}, None),
+            ({"user": "dev", "resource": "/projects/**"}, None),
+            ({"user": "dev", "resource": "/projects/**/logs"}, {"user": "dev", "resource": "/projects/**/logs", "read": False, "write": False, "execute": False}),
+            ({"user": "dev", "resource": "log", "read": "maybe"}, None),
+            ({"user": "dev", "resource": "log", "read": []}, None),
+            ({"user": 12345, "resource": "log"}, None),
+            ({"user": "dev", "resource": "log", "expires_in": 60}, {"user": "dev", "resource": "log", "read": False, "write": False, "execute": False, "expires_in": 60}),
+            ({"user": "dev", "resource": "log", "expires_in": 0}, None),
+            ({"user": "dev", "resource": "log", "expires_in": "60"}, None),
+            ({"user": "dev", "resource": "log", "expires_in": True}, None),
+            ([], None),
+        ]
+        for data, expected in test_table:
+            self.assertEqual(validator(data), expected, data)
+            if expected is not None:
+                serializer = ModifyAccessSerializer(data=data)
+                self.assertTrue(serializer.is_valid(), data)
+                self.assertEqual(serializer.data, expected, data)
+
+    def test_unsupported_fields(self):
+        with self.assertRaises(TypeError):
+            CompiledValidator(ForbiddenAccessEntrySerializer)
+
+
+class BenchmarksTest(TestCase):
+    def test_suite_results(self):
+        logged = []
+        results = Suite(sizes=(100,), repeat=2, groups=("access", "ops"), log=lambda name, _: logged.append(name)).run()
+
+        expected = [
+            "access.add_entry[n=100]",
+            "access.check_access[n=100]",
+            "access.check_access_denied[n=100]",
+            "access.add_entry_expiring[n=100]",
+            "access.expire_due[n=100]",
+            "ops.execute_operation",
+            "ops.round_trip",
+        ]
+        self.assertEqual(list(results["results"]), expected)
+        self.assertEqual(logged, expected)
+        self.assertEqual(results["meta"]["sizes"], [100])
+        for result in results["results"].values():
+            self.assertEqual(len(result["runs_ns_per_op"]), 2)
+            self.assertEqual(result["ns_per_op"], min(result["runs_ns_per_op"]))
+        json.dumps(results)
+
+    def test_compare(self):
+        baseline = {"results": {"a": {"ns_per_op": 100.0}, "b": {"ns_per_op": 100.0}, "gone": {"ns_per_op": 1.0}}}
+        results = {"results": {"a": {"ns_per_op": 119.0}, "b": {"ns_per_op": 121.0}, "new": {"ns_per_op": 1.0}}}
+        self.assertEqual(
+            [(change["name"], change["change"], change["regression"]) for change in compare(results, baseline, 0.2)],
+            [("a", 0.19, False), ("b", 0.21, True)],
+        )
+
+    def test_isolated_views_restore_services(self):
+        served = services.get("access")
+        with tempfile.TemporaryDirectory() as log_dir:
+            with isolated_views(log_dir) as service:
+                self.assertIs(services.get("access"), service)
+                service.add_entry("bench", "file", read=True)
+        self.assertIs(services.get("access"), served)
+        self.assertIs(served.check_access("bench", "file"), AccessLogStatus.USER_NOT_FOUND)
+
+
+class LoadgenTest(TestCase):
+    def test_zipf(self):
+        zipf = Zipf(100, 1.2, random.Random(0))
+        counts = collections.Counter(zipf() for _ in range(20000))
+        self.assertLessEqual(set(counts), set(range(100)))
+        self.assertEqual(counts.most_common(1)[0][0], 0)
+        self.assertGreater(counts[0], 2 * counts[1])
+        self.assertEqual([Zipf(100, 1.2, random.Random(5))() for _ in range(10)], [Zipf(100, 1.2, random.Random(5))() for _ in range(10)])
+
+    def test_percentile(self):
+        ordered = [i / 1000 for i in range(1, 1001)]
+        self.assertEqual(percentile(ordered, 0.5), 0.5)
+        self.assertEqual(percentile(ordered, 0.99), 0.99)
+        self.assertEqual(percentile(ordered, 0.999), 0.999)
+        self.assertEqual(percentile([3.0], 0.999), 3.0)
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix("access=9,log_status=1"), {"access": 9.0, "log_status": 1.0})
+        for mix in ("access=1,sitemap=1", "access=-1", "access=0", "access"):
+            with self.assertRaises(ValueError, msg=mix):
+                parse_mix(mix)
+
+    def test_replay_entries(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            plain = os.path.join(log_dir, "access.csv")
+            with open(plain, "w") as log_file:
+                log_file.write("user;resource;status\ndev;a;b;SUCCESS\nops;log;USER_NOT_FOUND\n")
+            rotated = os.path.join(log_dir, "access-1.csv.gz")
+            with gzip.open(rotated, "wt") as log_file:
+                log_file.write("user;resource;status\ndev;log;RESOURCE_NOT_FOUND\n")
+
+            workload = ReplayWorkload([rotated, plain])
+            self.assertEqual(list(workload.entries()), [
+                ("dev", "log", "RESOURCE_NOT_FOUND"),
+                ("dev", "a;b", "SUCCESS"),
+                ("ops", "log", "USER_NOT_FOUND"),
+            ])
+            self.assertEqual([request.query for request in workload], [
+                "user=dev&resource=log",
+                "user=dev&resource=a%3Bb",
+                "user=ops&resource=log",
+            ])
+
+    @override_settings(ALLOWED_HOSTS=["localhost"])
+    def test_replay_prepare_keeps_statuses(self):
+        with tempfile.TemporaryDirectory() as log_dir, isolated_views(log_dir) as service:
+            path = os.path.join(log_dir, "captured.csv")
+            with open(path, "w") as log_file:
+                log_file.write(
+                    "user;resource;status\n"
+                    "dev;/data/a;SUCCESS\n"
+                    "dev;/data/b;RESOURCE_NOT_FOUND\n"
+                    "ops;/data/a;RESOURCE_NOT_FOUND\n"
+                    "bob;/data/a;USER_NOT_FOUND\n"
+                )
+            ReplayWorkload([path]).prepare(WSGITarget())
+
+            self.assertTrue(service.check_access("dev", "/data/a").read)
+            self.assertEqual(service.check_access("dev", "/data/b"), AccessLogStatus.RESOURCE_NOT_FOUND)
+            self.assertEqual(service.check_access("ops", "/data/a"), AccessLogStatus.RESOURCE_NOT_FOUND)
+            self.assertEqual(service.check_access("bob", "/data/a"), AccessLogStatus.USER_NOT_FOUND)
+
+    @override_settings(ALLOWED_HOSTS=["localhost"])
+    def test_run_synthetic_load(self):
+        with tempfile.TemporaryDirectory() as log_dir, isolated_views(log_dir) as service:
+            target = WSGITarget()
+            workload = SyntheticWorkload(users=20, resources=3, hit_ratio=0.8, write_ratio=0.1, seed=1)
+            workload.prepare(target)
+            self.assertTrue(service.check_access("user19", "/data/19/file2").read)
+
+            report, elapsed = run_load(target, workload, concurrency=2, limit=300)
+            summary = report.summary(elapsed)
+
+        self.assertEqual(summary["total"]["requests"], 300)
+        self.assertEqual(summary["total"]["errors"], 0)
+        self.assertLessEqual(set(summary), {"GET access", "POST access", "GET access/forbidden", "GET log/", "GET log/status/", "total"})
+        self.assertEqual(set(summary["GET access"]["statuses"]), {"200", "403"})
+        self.assertEqual(set(summary["GET log/status/"]["statuses"]), {"200"})
+        self.assertLessEqual(summary["total"]["p50_ms"], summary["total"]["p999_ms"])
+
+    def test_rate(self):
+        sent = []
+
+        class Target:
+            def request(self, request):
+                sent.append(request)
+                return 200, b""
+
+        requests = [LoadRequest("GET access", "GET", "access")] * 20
+        report, elapsed = run_load(Target(), requests, rate=100, concurrency=4)
+
+        self.assertEqual(len(sent), 20)
+        self.assertGreaterEqual(elapsed, 0.19)
+        self.assertEqual(report.summary(elapsed)["GET access"]["statuses"], {"200": 20})
+
+
 # Component tests
 class DistanceEducationSystemTests(APITestCase):
     def setUp(self):
@@ -163,6 +1783,18 @@ class DistanceEducationSystemTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data, self.test_data)
 
+    def test_post_access_expiring(self):
+        request = self.factory.post("/access", {**self.test_data, "expires_in": 3600})
+        response = AccessViewSet.as_view({"post": "post_access"})(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {**self.test_data, "expires_in": 3600})
+        expiries = services.get("access").expiries
+        self.assertAlmostEqual(expiries.get(("dev", "log")), time.time() + 3600, delta=60)
+
+        request = self.factory.post("/access", self.test_data)
+        AccessViewSet.as_view({"post": "post_access"})(request)
+        self.assertIsNone(expiries.get(("dev", "log")))
+
     def test_post_access_validation_error(self):
         request = self.factory.post("/access", {})
         response = AccessViewSet.as_view({"post": "post_access"})(request)
@@ -179,6 +1811,87 @@ class DistanceEducationSystemTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, desired_response_data)
 
+    def test_get_access_inherited(self):
+        grant = {**self.test_data, "resource": "/projects/42", "inherit": True}
+        request = self.factory.post("/access", grant, format="json")
+        response = AccessViewSet.as_view({"post": "post_access"})(request)
+        self.assertEqual(response.data, grant)
+
+        request = self.factory.get(f"/access?user={grant['user']}&resource=/projects/42/logs")
+        response = AccessViewSet.as_view({"get": "get_access"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"read": True, "write": True, "execute": False})
+
+    def test_role_member_success(self):
+        request = self.factory.post("/access/roles", {"role": "auditors", "resource": "audit", "read": True})
+        response = AccessViewSet.as_view({"post": "post_role_access"})(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {"role": "auditors", "resource": "audit", "read": True, "write": False, "execute": False})
+
+        request = self.factory.post("/access/roles/members", {"role": "auditors", "user": "tester"})
+        response = AccessViewSet.as_view({"post": "post_role_member"})(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        request = self.factory.get("/access?user=tester&resource=audit")
+        response = AccessViewSet.as_view({"get": "get_access"})(request)
+        self.assertEqual(response.data, {"read": True, "write": False, "execute": False})
+
+        for expected in (status.HTTP_204_NO_CONTENT, status.HTTP_404_NOT_FOUND):
+            request = self.factory.delete("/access/roles/members?role=auditors&user=tester")
+            response = AccessViewSet.as_view({"delete": "delete_role_member"})(request)
+            self.assertEqual(response.status_code, expected)
+
+    def test_post_access_role_name_error(self):
+        request = self.factory.post("/access", {**self.test_data, "resource": "@auditors"})
+        response = AccessViewSet.as_view({"post": "post_access"})(request)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertIn("resource", response.data["errors"])
+
+    def test_post_access_inherit_key_error(self):
+        request = self.factory.post("/access", {**self.test_data, "resource": "/projects/**"})
+        response = AccessViewSet.as_view({"post": "post_access"})(request)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertIn("resource", response.data["errors"])
+
+    def test_get_holders_success(self):
+        request = self.factory.post("/access", {**self.test_data, "resource": "holders-log"})
+        AccessViewSet.as_view({"post": "post_access"})(request)
+
+        request = self.factory.get("/access/holders?resource=holders-log&right=write")
+        response = AccessViewSet.as_view({"get": "get_holders"})(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"count": 1, "results": ["dev"]})
+
+        request = self.factory.get("/access/holders?resource=holders-log&right=delete")
+        response = AccessViewSet.as_view({"get": "get_holders"})(request)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_get_access_cached(self):
+        view = AccessViewSet.as_view({"get": "get_access"})
+        grant = {**self.test_data, "user": "cached", "resource": "cached-log"}
+        AccessViewSet.as_view({"post": "post_access"})(self.factory.post("/access", grant))
+        hits = services.get("decision_cache").hits
+
+        for _ in range(2):
+            response = view(self.factory.get("/access?user=cached&resource=cached-log"))
+            response.render()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(json.loads(response.content), {"read": True, "write": True, "execute": False})
+        self.assertEqual(services.get("decision_cache").hits, hits + 1)
+
+        AccessViewSet.as_view({"post": "post_access"})(self.factory.post("/access", {**grant, "write": False}))
+        response = view(self.factory.get("/access?user=cached&resource=cached-log"))
+        self.assertEqual(response.data, {"read": True, "write": False, "execute": False})
+
+        for _ in range(2):
+            response = view(self.factory.get("/access?user=cached&resource=cached-image"))
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(services.get("access").forbidden_access.forbidden["cached"]["cached-image"].count, 2)
+
+        response = AccessViewSet.as_view({"get": "get_decision_cache_stats"})(self.factory.get("/access/cache/stats"))
+        self.assertEqual(response.data["hits"], hits + 2)
+
     def test_get_access_validation_error(self):
         desired_response_data = {
             "errors": {
@@ -209,6 +1922,112 @@ class DistanceEducationSystemTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_post_access_bulk_success(self):
+        body = (
+            '{"user": "dev", "resource": "log", "read": true}\n'
+            '{"user": "dev", "resource": "img"}\n'
+        )
+        request = self.factory.post("/access/bulk", body, content_type="application/x-ndjson")
+        response = AccessViewSet.as_view({"post": "post_access_bulk"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], 2)
+        self.assertEqual(response.data["failed"], 0)
+
+    def test_post_access_bulk_unsupported_media_type(self):
+        request = self.factory.post("/access/bulk", "<grants/>", content_type="application/xml")
+        response = AccessViewSet.as_view({"post": "post_access_bulk"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_post_access_batch_success(self):
+        request = self.factory.post("/access", self.test_data)
+        AccessViewSet.as_view({"post": "post_access"})(request)
+
+        desired_response_data = {
+            "results": [
+                {
+                    "user": "dev",
+                    "resource": "log",
+                    "status": "SUCCESS",
+                    "read": True,
+                    "write": True,
+                    "execute": False,
+                },
+                {
+                    "user": "dev",
+                    "resource": "image",
+                    "status": "RESOURCE_NOT_FOUND",
+                    "read": False,
+                    "write": False,
+                    "execute": False,
+                },
+                {
+                    "user": "nonexistent_user",
+                    "resource": "log",
+                    "status": "USER_NOT_FOUND",
+                    "read": False,
+                    "write": False,
+                    "execute": False,
+                },
+            ]
+        }
+        request = self.factory.post(
+            "/access/batch",
+            {
+                "checks": [
+                    {"user": "dev", "resource": "log"},
+                    {"user": "dev", "resource": "image"},
+                    {"user": "nonexistent_user", "resource": "log"},
+                ]
+            },
+            format="json",
+        )
+        response = AccessViewSet.as_view({"post": "post_access_batch"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, desired_response_data)
+
+    def test_post_access_batch_validation_error(self):
+        request = self.factory.post(
+            "/access/batch",
+            {"checks": [{"user": "dev", "resource": "log"}, {"user": "dev"}]},
+            format="json",
+        )
+        response = AccessViewSet.as_view({"post": "post_access_batch"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(response.data, {"errors": {"checks[1].resource": ["This field is required."]}})
+
+    def test_get_forbidden(self):
+        request = self.factory.post("/access", self.test_data)
+        AccessViewSet.as_view({"post": "post_access"})(request)
+        request = self.factory.get(f"/access?user={self.test_data['user']}&resource=plain_probe")
+        AccessViewSet.as_view({"get": "get_access"})(request)
+
+        request = self.factory.get("/access/forbidden")
+        response = AccessViewSet.as_view({"get": "get_forbidden"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data), ["forbidden"])
+        self.assertIn("plain_probe", response.data["forbidden"]["dev"])
+
+    def test_get_forbidden_top(self):
+        request = self.factory.post("/access", self.test_data)
+        AccessViewSet.as_view({"post": "post_access"})(request)
+        for resource in ("top_probe", "top_probe", "top_probe"):
+            request = self.factory.get(f"/access?user={self.test_data['user']}&resource={resource}")
+            AccessViewSet.as_view({"get": "get_access"})(request)
+
+        request = self.factory.get("/access/forbidden", {"top": 1})
+        response = AccessViewSet.as_view({"get": "get_forbidden"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {key: response.data["results"][0][key] for key in ("user", "resource", "count")},
+            {"user": "dev", "resource": "top_probe", "count": 3},
+        )
+
     def test_get_log_file_success(self):
 
         request = self.factory.get("/log")
@@ -223,7 +2042,11 @@ class DistanceEducationSystemTests(APITestCase):
             "id": None,
             "done": True,
             "result": {
-                "path": "static/log/access.csv"
+                "path": None,
+                "format": "csv",
+                "bytes": None,
+                "rows": None,
+                "segments": [],
             },
         }
 
@@ -236,8 +2059,97 @@ class DistanceEducationSystemTests(APITestCase):
         request = self.factory.get(f"/log/status?id={response.data['id']}")
         response = AccessViewSet.as_view({"get": "get_log_file_status"})(request)
 
+        result = response.data["result"]
+        with open(result["path"]) as csv_file:
+            desired_response_data["result"]["rows"] = len(csv_file.readlines()) - 1
+        desired_response_data["result"]["path"] = result["path"]
+        desired_response_data["result"]["bytes"] = os.path.getsize(result["path"])
+        desired_response_data["result"]["segments"] = result["segments"]
+
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, desired_response_data)
+        self.assertTrue(result["path"].startswith("static/log/exports/"))
+        self.assertEqual(result["segments"][-1], "access.csv")
+
+        with services.get("ops")._lock:
+            cleanup = services.get("ops")._expire(UUID(response.data["id"]))
+        cleanup()
+        self.assertFalse(os.path.exists(result["path"]))
+
+    def test_get_log_file_filtered_ndjson(self):
+        for resource in ("image", "video"):
+            request = self.factory.get(f"/access?user=export_user&resource={resource}")
+            AccessViewSet.as_view({"get": "get_access"})(request)
+
+        request = self.factory.get("/log", {"user": "export_user", "export_format": "ndjson", "compress": True})
+        response = AccessViewSet.as_view({"get": "get_log_file"})(request)
+
+        time.sleep(1)
+
+        op_id = UUID(response.data["id"])
+        request = self.factory.get(f"/log/status?id={op_id}")
+        response = AccessViewSet.as_view({"get": "get_log_file_status"})(request)
+
+        result = response.data["result"]
+        self.assertEqual(result["format"], "ndjson.gz")
+        with gzip.open(result["path"], "rt") as export_file:
+            rows = [json.loads(line) for line in export_file]
+        self.assertEqual(result["rows"], len(rows))
+        self.assertEqual(
+            rows[-2:],
+            [
+                {"user": "export_user", "resource": "image", "status": "USER_NOT_FOUND"},
+                {"user": "export_user", "resource": "video", "status": "USER_NOT_FOUND"},
+            ],
+        )
+
+        with services.get("ops")._lock:
+            cleanup = services.get("ops")._expire(op_id)
+        cleanup()
+        self.assertFalse(os.path.exists(result["path"]))
+
+    def test_get_log_file_shares_running_job(self):
+        ops_service = OperationsService()
+        started, release = threading.Event(), threading.Event()
+
+        def __job():
+            started.set()
+            release.wait(5)
+            return {"rows": 0}
+
+        first = ops_service.execute_operation(__job, key="export")
+        started.wait(5)
+        second = ops_service.execute_operation(__job, key="export")
+        release.set()
+
+        self.assertEqual(first, second)
+        wait_for(lambda: ops_service.get_operation(first).done)
+        self.assertNotEqual(ops_service.execute_operation(__job, key="export"), first)
+        release.set()
+
+    def test_get_log_query_aggregate(self):
+        since = datetime.now(timezone.utc).isoformat()
+        for resource in ("image", "image", "video"):
+            request = self.factory.get(f"/access?user=query_user&resource={resource}")
+            AccessViewSet.as_view({"get": "get_access"})(request)
+
+        request = self.factory.get("/log/query/", {"user": "query_user", "since": since, "group_by": "status"})
+        response = AccessViewSet.as_view({"get": "get_log_query"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"count": 3, "groups": [{"key": "USER_NOT_FOUND", "count": 3}]})
+
+    def test_get_log_query_validation_error(self):
+        test_table = [
+            {"group_by": "time"},
+            {"cursor": "yesterday"},
+            {"cursor": "1760000000.5:7", "group_by": "user"},
+            {"offset": 10 ** 6},
+        ]
+        for params in test_table:
+            request = self.factory.get("/log/query/", params)
+            response = AccessViewSet.as_view({"get": "get_log_query"})(request)
+            self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY, params)
 
     def test_get_log_file_status_validation_error(self):
         desired_response_data = {
@@ -254,6 +2166,72 @@ class DistanceEducationSystemTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
         self.assertEqual(response.data, desired_response_data)
 
+    def test_get_log_file_status_expired(self):
+        request = self.factory.get("/log")
+        op_id = AccessViewSet.as_view({"get": "get_log_file"})(request).data["id"]
+        wait_for(lambda: services.get("ops").get_operation(UUID(op_id)).done)
+        path = services.get("ops").get_operation(UUID(op_id)).result["path"]
+        with services.get("ops")._lock:
+            cleanup = services.get("ops")._expire(UUID(op_id))
+        cleanup()
+        self.assertFalse(os.path.exists(path))
+
+        request = self.factory.get(f"/log/status?id={op_id}")
+        response = AccessViewSet.as_view({"get": "get_log_file_status"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_get_log_file_status_long_poll(self):
+        release = threading.Event()
+        op_id = services.get("ops").execute_operation(release.wait, args=(5,))
+        threading.Timer(0.1, release.set).start()
+
+        request = self.factory.get(f"/log/status?id={op_id}&wait=5")
+        response = AccessViewSet.as_view({"get": "get_log_file_status"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["done"], True)
+
+    def test_stream_log_file_status(self):
+        release = threading.Event()
+        op_id = services.get("ops").execute_operation(release.wait, args=(5,))
+        threading.Timer(0.1, release.set).start()
+
+        request = self.factory.get(f"/log/status/stream/?id={op_id}", HTTP_ACCEPT="text/event-stream")
+        response = AccessViewSet.as_view(
+            {"get": "stream_log_file_status"},
+            renderer_classes=[EventStreamRenderer],
+        )(request)
+        events = [chunk.decode() for chunk in response.streaming_content]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertTrue(events[0].startswith("event: status\n"))
+        self.assertIn('"done": false', events[0])
+        self.assertIn('"done": true', events[-1])
+
+    def test_get_metrics(self):
+        services.get("access").add_entry("metrics-dev", "metrics-log", read=True)
+        request = self.factory.get("/access?user=metrics-dev&resource=metrics-log")
+        AccessViewSet.as_view({"get": "get_access"})(request)
+
+        view = AccessViewSet.as_view({"get": "get_metrics"}, renderer_classes=[MetricsRenderer])
+        response = view(self.factory.get("/metrics"))
+        response.render()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        lines = response.content.decode().splitlines()
+        self.assertIn("# TYPE access_check_seconds histogram", lines)
+        self.assertTrue(any(line.startswith('access_log_entries_total{status="SUCCESS"} ') for line in lines))
+        self.assertTrue(any(line.startswith("access_users ") for line in lines))
+
+    def test_get_operations_stats(self):
+        request = self.factory.get("/log/stats/")
+        response = AccessViewSet.as_view({"get": "get_operations_stats"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {"live", "running", "expired"})
+
     def test_get_log_file_status_not_found(self):
         op_id = uuid4()
 
@@ -262,3 +2240,112 @@ class DistanceEducationSystemTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+
+class LeanAPITest(APITestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.addCleanup(setattr, AccessViewSet, "lean", AccessViewSet.lean)
+
+    def respond(self, lean: bool, request_args: tuple) -> tuple[int, str, bytes]:
+        AccessViewSet.lean = lean
+        method, path, data, fmt = request_args
+        if method == "post":
+            view = AccessViewSet.as_view({"post": "post_access"})
+            response = view(self.factory.post(path, data, format=fmt))
+        else:
+            view = AccessViewSet.as_view({"get": "get_access"})
+            response = view(self.factory.get(path, data))
+        response.render()
+        return response.status_code, response.get("Content-Type"), response.content
+
+    def test_responses_match_default(self):
+        grant = {"user": "lean-dev", "resource": "lean-log", "read": True}
+        test_table = [
+            ("post", "/access", grant, "json"),
+            ("post", "/access", grant, "multipart"),
+            ("post", "/access", {**grant, "write": "true", "inherit": True}, "json"),
+            ("post", "/access", {**grant, "user": "  lean-dev  "}, "json"),
+            ("post", "/access", {**grant, "user": "ld"}, "json"),
+            ("post", "/access", {**grant, "user": 12345}, "json"),
+            ("post", "/access", {**grant, "read": "maybe"}, "json"),
+            ("post", "/access", {**grant, "resource": "@auditors"}, "json"),
+            ("post", "/access", {**grant, "resource": "lean/**"}, "json"),
+            ("post", "/access", {**grant, "resource": "lean\x00log"}, "json"),
+            ("post", "/access", [grant], "json"),
+            ("post", "/access", {**grant, "expires_in": 3600}, "json"),
+            ("post", "/access", {**grant, "expires_in": "3600"}, "json"),
+            ("post", "/access", {**grant, "expires_in": 0}, "json"),
+            ("post", "/access", grant, "json"),
+            ("get", "/access", {"user": "lean-dev", "resource": "lean-log"}, None),
+            ("get", "/access", {"user": "lean-dev", "resource": "lean-image"}, None),
+            ("get", "/access", {"user": "lean-qa", "resource": "lean-log"}, None),
+            ("get", "/access", {"user": "lean-dev"}, None),
+            ("get", "/access", {"user": "ld", "resource": "lean-log"}, None),
+        ]
+        for request_args in test_table:
+            self.assertEqual(self.respond(True, request_args), self.respond(False, request_args), request_args)
+
+    def test_browsable_api_is_off(self):
+        AccessViewSet.lean = True
+        request = self.factory.get("/access?user=lean-dev&resource=lean-log", HTTP_ACCEPT="text/html")
+        response = AccessViewSet.as_view({"get": "get_access"})(request)
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+        request = self.factory.get("/access/holders?resource=lean-log&right=read", HTTP_ACCEPT="text/html")
+        response = AccessViewSet.as_view({"get": "get_holders"})(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_schema_is_unchanged(self):
+        schemas = []
+        for lean in (False, True):
+            AccessViewSet.lean = lean
+            schemas.append(SchemaGenerator().get_schema(request=None, public=True))
+        self.assertEqual(schemas[0], schemas[1])
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        services.get("access").add_entry("async-dev", "async-log", read=True, execute=True)
+
+    async def test_get_access(self):
+        test_table = [
+            ("user=async-dev&resource=async-log", status.HTTP_200_OK, {"read": True, "write": False, "execute": True}),
+            ("user=async-dev&resource=async-log", status.HTTP_200_OK, {"read": True, "write": False, "execute": True}),
+            ("user=async-dev&resource=async-image", status.HTTP_403_FORBIDDEN, None),
+            ("user=async-qa&resource=async-log", status.HTTP_404_NOT_FOUND, None),
+            ("user=async-dev", status.HTTP_422_UNPROCESSABLE_ENTITY, {"errors": {"resource": ["This field is required."]}}),
+        ]
+        for query, response_status, data in test_table:
+            response = await async_views.get_access(self.factory.get(f"/async/access?{query}"))
+            self.assertEqual(response.status_code, response_status, query)
+            self.assertEqual(json.loads(response.content) if response.content else None, data, query)
+            self.assertEqual(response.get("Content-Type"), None if data is None else "application/json", query)
+
+    async def test_post_access_batch(self):
+        checks = [{"user": "async-dev", "resource": "async-log"}, {"user": "async-dev", "resource": "async-image"}]
+        request = self.factory.post("/async/access/batch", {"checks": checks}, content_type="application/json")
+        response = await async_views.post_access_batch(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {"results": [
+            {"user": "async-dev", "resource": "async-log", "status": "SUCCESS", "read": True, "write": False, "execute": True},
+            {"user": "async-dev", "resource": "async-image", "status": "RESOURCE_NOT_FOUND", "read": False, "write": False, "execute": False},
+        ]})
+
+        request = self.factory.post("/async/access/batch", "{", content_type="application/json")
+        response = await async_views.post_access_batch(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_get_log_file_status_wait(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        op_id = services.get("ops").execute_operation(release.wait, args=(5,))
+        threading.Timer(0.1, release.set).start()
+
+        response = await async_views.get_log_file_status(self.factory.get(f"/async/log/status/?id={op_id}&wait=5"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(json.loads(response.content)["done"])
+
+        response = await async_views.get_log_file_status(self.factory.get(f"/async/log/status/?id={uuid4()}"))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,25 +1,61 @@
-from uuid import UUID
+from uuid import UUID, uuid4
 
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
-from drf_spectacular.utils import extend_schema_view, extend_schema
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiResponse, PolymorphicProxySerializer
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
-from .models import AccessLogStatus
-from .services.access_service import AccessService
-from .services.log_service import LogService
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
+from .models import AccessLogStatus, CachedDecision
+from .registry import ServiceAttribute
+from .renderers import EventStreamRenderer, LeanContentNegotiation, LeanJSONRenderer, MetricsRenderer, format_event
+from .services.export_service import export_log, remove_export
+from .services.import_service import ImportService, iter_csv, iter_ndjson
 from .serializers import (
     ModifyAccessSerializer,
     ValidationErrorSerializer,
     CheckAccessSerializer,
     AccessSerializer,
+    BatchCheckAccessSerializer,
+    BatchAccessSerializer,
+    ForbiddenAccessQuerySerializer,
     ForbiddenAccessSerializer,
+    ForbiddenAccessStatsSerializer,
+    GrantImportReportSerializer,
     OperationSerializer,
+    OperationsStatsSerializer,
+    GetLogFileQuerySerializer,
+    LogQuerySerializer,
+    LogQueryResultSerializer,
     GetOperationQuerySerializer,
+    ModifyRoleAccessSerializer,
+    RoleMemberSerializer,
+    HoldersQuerySerializer,
+    HoldersSerializer,
+    DecisionCacheStatsSerializer,
+    CompiledValidator,
 )
-from .services.ops_service import OperationsService
+
+
+def _flatten_errors(errors, prefix: str = "") -> dict[str, list[str]]:
+    if isinstance(errors, dict):
+        flat = {}
+        for field, field_errors in errors.items():
+            flat.update(_flatten_errors(field_errors, f"{prefix}.{field}" if prefix else field))
+        return flat
+
+    if errors and all(isinstance(item, (dict, list)) for item in errors):
+        flat = {}
+        for i, item_errors in enumerate(errors):
+            flat.update(_flatten_errors(item_errors, f"{prefix}[{i}]"))
+        return flat
+
+    return {prefix: errors} if errors else {}
 
 
 @extend_schema_view(
@@ -29,6 +65,38 @@ from .services.ops_service import OperationsService
         responses={
             status.HTTP_201_CREATED: ModifyAccessSerializer,
             status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+            status.HTTP_501_NOT_IMPLEMENTED: None,
+        },
+        auth=False,
+    ),
+    post_role_access=extend_schema(
+        summary="Post new role access to resource",
+        request=ModifyRoleAccessSerializer,
+        responses={
+            status.HTTP_201_CREATED: ModifyRoleAccessSerializer,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+            status.HTTP_501_NOT_IMPLEMENTED: None,
+        },
+        auth=False,
+    ),
+    post_role_member=extend_schema(
+        summary="Add user to role",
+        request=RoleMemberSerializer,
+        responses={
+            status.HTTP_201_CREATED: RoleMemberSerializer,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+            status.HTTP_501_NOT_IMPLEMENTED: None,
+        },
+        auth=False,
+    ),
+    delete_role_member=extend_schema(
+        summary="Remove user from role",
+        parameters=[RoleMemberSerializer],
+        responses={
+            status.HTTP_204_NO_CONTENT: None,
+            status.HTTP_404_NOT_FOUND: None,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+            status.HTTP_501_NOT_IMPLEMENTED: None,
         },
         auth=False,
     ),
@@ -43,17 +111,70 @@ from .services.ops_service import OperationsService
         },
         auth=False,
     ),
+    post_access_bulk=extend_schema(
+        summary="Upsert user accesses from an NDJSON or CSV stream",
+        request={
+            "application/x-ndjson": ModifyAccessSerializer,
+            "text/csv": ModifyAccessSerializer,
+        },
+        responses={
+            status.HTTP_200_OK: GrantImportReportSerializer,
+            status.HTTP_415_UNSUPPORTED_MEDIA_TYPE: None,
+        },
+        auth=False,
+    ),
+    post_access_batch=extend_schema(
+        summary="User access rights to multiple resources",
+        request=BatchCheckAccessSerializer,
+        responses={
+            status.HTTP_200_OK: BatchAccessSerializer,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+        },
+        auth=False,
+    ),
     get_forbidden=extend_schema(
         summary="Get forbidden accesses",
+        description="The resources each user was denied, or hit counts of denied pairs "
+                    "when any of `user`, `top`, `offset` or `limit` is given.",
+        parameters=[ForbiddenAccessQuerySerializer],
         responses={
-            status.HTTP_200_OK: ForbiddenAccessSerializer,
+            status.HTTP_200_OK: PolymorphicProxySerializer(
+                component_name="ForbiddenAccessResponse",
+                serializers=[ForbiddenAccessSerializer, ForbiddenAccessStatsSerializer],
+                resource_type_field_name=None,
+            ),
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+        },
+        auth=False,
+    ),
+    get_holders=extend_schema(
+        summary="Get users holding a right on resource",
+        description="Users granted the resource itself, in the order they got it, then those "
+                    "covered only by an inherited or glob grant, sorted.",
+        parameters=[HoldersQuerySerializer],
+        responses={
+            status.HTTP_200_OK: HoldersSerializer,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+            status.HTTP_501_NOT_IMPLEMENTED: None,
         },
         auth=False,
     ),
     get_log_file=extend_schema(
-        summary="Generate log.csv and get operation details",
+        summary="Export access log and get operation details",
+        parameters=[GetLogFileQuerySerializer],
         responses={
             status.HTTP_200_OK: OperationSerializer,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+        },
+        auth=False,
+    ),
+    get_log_query=extend_schema(
+        summary="Filter and aggregate access log entries",
+        parameters=[LogQuerySerializer],
+        responses={
+            status.HTTP_200_OK: LogQueryResultSerializer,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+            status.HTTP_501_NOT_IMPLEMENTED: None,
         },
         auth=False,
     ),
@@ -63,77 +184,340 @@ from .services.ops_service import OperationsService
         responses={
             status.HTTP_200_OK: OperationSerializer,
             status.HTTP_404_NOT_FOUND: None,
+            status.HTTP_410_GONE: None,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+        },
+        auth=False,
+    ),
+    stream_log_file_status=extend_schema(
+        summary="Stream log generation status as Server-Sent Events",
+        parameters=[GetOperationQuerySerializer],
+        responses={
+            (status.HTTP_200_OK, EventStreamRenderer.media_type): OpenApiResponse(
+                response=OpenApiTypes.STR,
+                description="`status` events with an Operation payload until it is done, "
+                            "or a final `expired` event",
+            ),
+            status.HTTP_404_NOT_FOUND: None,
+            status.HTTP_410_GONE: None,
             status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
         },
         auth=False,
     ),
+    get_decision_cache_stats=extend_schema(
+        summary="Get access decision cache counters",
+        responses={
+            status.HTTP_200_OK: DecisionCacheStatsSerializer,
+            status.HTTP_501_NOT_IMPLEMENTED: None,
+        },
+        auth=False,
+    ),
+    get_metrics=extend_schema(
+        summary="Get service metrics in the Prometheus text format",
+        responses={
+            (status.HTTP_200_OK, MetricsRenderer.media_type): OpenApiResponse(
+                response=OpenApiTypes.STR,
+                description="Counters and latency histograms, summed over the worker processes "
+                            "sharing METRICS[\"PATH\"], and gauges per process",
+            ),
+        },
+        auth=False,
+    ),
+    get_operations_stats=extend_schema(
+        summary="Get number of live, running and expired operations",
+        responses={
+            status.HTTP_200_OK: OperationsStatsSerializer,
+        },
+        auth=False,
+    ),
 )
 class AccessViewSet(ViewSet):
-    access_service = AccessService()
-    log_service = LogService()
-    ops_service = OperationsService()
+    access_service = ServiceAttribute("access")
+    decision_cache = ServiceAttribute("decision_cache")
+    log_service = ServiceAttribute("log")
+    ops_service = ServiceAttribute("ops")
+    bulk_formats = {
+        "application/x-ndjson": iter_ndjson,
+        "text/csv": iter_csv,
+    }
+    sse_keepalive = 15
+    lean = settings.ACCESS["LEAN_API"]
+    lean_actions = ("get_access", "post_access")
+    check_access_validator = CompiledValidator(CheckAccessSerializer)
+    modify_access_validator = CompiledValidator(ModifyAccessSerializer)
+
+    def get_renderers(self):
+        if self.lean and self.action in self.lean_actions:
+            return [LeanJSONRenderer()]
+        return super().get_renderers()
+
+    def get_content_negotiator(self):
+        # Also called before the action is known, to build the request.
+        if self.lean and getattr(self, "action", None) in self.lean_actions:
+            return LeanContentNegotiation()
+        return super().get_content_negotiator()
 
     @action(detail=False, methods=["POST"])
     def post_access(self, request):
-        in_access = ModifyAccessSerializer(data=request.data)
+        # The validator declines anything the serializer has to rule on.
+        access = self.modify_access_validator(request.data) if self.lean else None
+        if access is None:
+            in_access = ModifyAccessSerializer(data=request.data)
+            if not in_access.is_valid():
+                return Response(
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    data=ValidationErrorSerializer({"errors": in_access.errors}).data,
+                )
+            access = in_access.data
+
+        try:
+            self.access_service.add_entry(**access)
+        except ValueError:
+            return Response(status=status.HTTP_501_NOT_IMPLEMENTED)
+        return Response(
+            status=status.HTTP_201_CREATED,
+            data=access if self.lean else ModifyAccessSerializer(access).data,
+        )
+
+    @action(detail=False, methods=["POST"])
+    def post_role_access(self, request):
+        in_access = ModifyRoleAccessSerializer(data=request.data)
         if not in_access.is_valid():
             return Response(
                 status=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 data=ValidationErrorSerializer({"errors": in_access.errors}).data,
             )
 
-        self.access_service.add_entry(**in_access.data)
+        try:
+            self.access_service.add_role_entry(**in_access.data)
+        except ValueError:
+            return Response(status=status.HTTP_501_NOT_IMPLEMENTED)
         return Response(
             status=status.HTTP_201_CREATED,
-            data=ModifyAccessSerializer(in_access.data).data
+            data=ModifyRoleAccessSerializer(in_access.data).data
         )
 
-    @action(detail=False, methods=["GET"])
-    def get_access(self, request):
-        query_ser = CheckAccessSerializer(data=request.query_params)
+    @action(detail=False, methods=["POST"])
+    def post_role_member(self, request):
+        in_member = RoleMemberSerializer(data=request.data)
+        if not in_member.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": in_member.errors}).data,
+            )
+
+        try:
+            self.access_service.add_member(**in_member.data)
+        except ValueError:
+            return Response(status=status.HTTP_501_NOT_IMPLEMENTED)
+        return Response(status=status.HTTP_201_CREATED, data=in_member.data)
+
+    @action(detail=False, methods=["DELETE"])
+    def delete_role_member(self, request):
+        query_ser = RoleMemberSerializer(data=request.query_params)
         if not query_ser.is_valid():
             return Response(
                 status=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
             )
 
-        access = self.access_service.check_access(**query_ser.data)
+        try:
+            removed = self.access_service.remove_member(**query_ser.data)
+        except ValueError:
+            return Response(status=status.HTTP_501_NOT_IMPLEMENTED)
+        return Response(status=status.HTTP_204_NO_CONTENT if removed else status.HTTP_404_NOT_FOUND)
 
-        if access is AccessLogStatus.USER_NOT_FOUND:
-            self.log_service.write_entry(**query_ser.data, status=access)
+    @action(detail=False, methods=["GET"])
+    def get_access(self, request):
+        cache_key = None
+        if self.decision_cache is not None and request.accepted_renderer.format == "json":
+            cache_key = (request.query_params.get("user"), request.query_params.get("resource"), request.accepted_media_type)
+            cached = self.decision_cache.get(cache_key, self.access_service.versions)
+            if cached is not None:
+                return self._cached_access_response(cached)
+
+        query = self.check_access_validator(request.query_params) if self.lean else None
+        if query is None:
+            query_ser = CheckAccessSerializer(data=request.query_params)
+            if not query_ser.is_valid():
+                return Response(
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
+                )
+            query = query_ser.data
+
+        version = self.access_service.versions.get(query["user"], 0)
+        access = self.access_service.check_access(**query)
+
+        log_status, response_status, data = self._access_decision(access)
+        self.log_service.write_entry(**query, status=log_status)
+        if cache_key is not None:
+            content = request.accepted_renderer.render(data, request.accepted_media_type, self.get_renderer_context())
+            self.decision_cache.put(
+                cache_key,
+                CachedDecision(version, response_status, data, content, log_status, **query),
+            )
+        return Response(
+            status=response_status,
+            data=data,
+        )
+
+    def _cached_access_response(self, cached: CachedDecision) -> Response:
+        if cached.log_status is AccessLogStatus.RESOURCE_NOT_FOUND:
+            self.access_service.forbidden_access.record(cached.user, cached.resource)
+        self.log_service.write_entry(cached.user, cached.resource, status=cached.log_status)
+        response = Response(status=cached.status, data=cached.data)
+        # Setting the content marks the response rendered, so DRF skips the renderer.
+        response.content = cached.content
+        if cached.content:
+            response["Content-Type"] = "application/json"
+        else:
+            del response["Content-Type"]
+        return response
+
+    @action(detail=False, methods=["GET"])
+    def get_decision_cache_stats(self, _):
+        if self.decision_cache is None:
+            return Response(status=status.HTTP_501_NOT_IMPLEMENTED)
+        return Response(
+            status=status.HTTP_200_OK,
+            data=DecisionCacheStatsSerializer(self.decision_cache.get_stats()).data,
+        )
+
+    @action(detail=False, methods=["POST"])
+    def post_access_bulk(self, request):
+        media_type = request.content_type.split(";")[0].strip()
+        if media_type not in self.bulk_formats:
             return Response(
-                status=status.HTTP_404_NOT_FOUND,
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
             )
 
-        if access is AccessLogStatus.RESOURCE_NOT_FOUND:
-            self.log_service.write_entry(**query_ser.data, status=access)
+        stream = request.stream or ()
+        lines = (line.decode("utf-8", "replace") for line in stream)
+        report = ImportService(self.access_service).load(self.bulk_formats[media_type](lines))
+        return Response(
+            status=status.HTTP_200_OK,
+            data=GrantImportReportSerializer(report).data,
+        )
+
+    @action(detail=False, methods=["POST"])
+    def post_access_batch(self, request):
+        in_batch = BatchCheckAccessSerializer(data=request.data)
+        if not in_batch.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": _flatten_errors(in_batch.errors)}).data,
+            )
+
+        pairs = [(check["user"], check["resource"]) for check in in_batch.validated_data["checks"]]
+        results, log_entries = self._batch_decisions(pairs, self.access_service.check_access_batch(pairs))
+        self.log_service.write_entries(log_entries)
+        return Response(
+            status=status.HTTP_200_OK,
+            data=BatchAccessSerializer({"results": results}).data,
+        )
+
+    @action(detail=False, methods=["GET"])
+    def get_forbidden(self, request):
+        query_ser = ForbiddenAccessQuerySerializer(data=request.query_params)
+        if not query_ser.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            )
+
+        if not any(param in request.query_params for param in ForbiddenAccessQuerySerializer.STATS_PARAMS):
             return Response(
-                status=status.HTTP_403_FORBIDDEN,
+                status=status.HTTP_200_OK,
+                data=ForbiddenAccessSerializer({"forbidden": self.access_service.get_forbidden_resources()}).data,
             )
 
-        self.log_service.write_entry(**query_ser.data, status=AccessLogStatus.SUCCESS)
+        count, forbidden = self.access_service.get_forbidden_access(**query_ser.validated_data)
         return Response(
             status=status.HTTP_200_OK,
-            data=AccessSerializer(access).data,
+            data=ForbiddenAccessStatsSerializer({"count": count, "results": forbidden}).data,
         )
 
     @action(detail=False, methods=["GET"])
-    def get_forbidden(self, _):
-        forbidden = self.access_service.get_forbidden_access()
+    def get_holders(self, request):
+        query_ser = HoldersQuerySerializer(data=request.query_params)
+        if not query_ser.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            )
+
+        if self.access_service.holders is None:
+            return Response(status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        count, users = self.access_service.get_holders(**query_ser.validated_data)
         return Response(
             status=status.HTTP_200_OK,
-            data=ForbiddenAccessSerializer({"forbidden": forbidden}).data,
+            data=HoldersSerializer({"count": count, "results": users}).data,
         )
 
     @action(detail=False, methods=["GET"])
-    def get_log_file(self, _):
-        op_id = self.ops_service.execute_operation(self.log_service.get_log_file_path)
+    def get_log_file(self, request):
+        query_ser = GetLogFileQuerySerializer(data=request.query_params)
+        if not query_ser.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            )
+
+        params = query_ser.validated_data
+        since, until = params.get("since"), params.get("until")
+        filters = {column: params.get(column) for column in ("user", "resource", "status")}
+        fmt, compress = params["export_format"], params["compress"]
+
+        def __export_args() -> tuple:
+            sources, _ = self.log_service.snapshot(since, until)
+            output_path = (
+                f"{self.log_service.output_log_path}exports/"
+                f"export-{uuid4().hex}.{fmt}{'.gz' if compress else ''}"
+            )
+            return sources, output_path, fmt, compress, filters
+
+        op_id = self.ops_service.execute_operation(
+            export_log,
+            key=("export_log", since, until, fmt, compress, *filters.values()),
+            args_factory=__export_args,
+            cleanup=remove_export,
+        )
         op = self.ops_service.get_operation(op_id)
         return Response(
             status=status.HTTP_200_OK,
             data=OperationSerializer(op).data,
         )
 
+    @action(detail=False, methods=["GET"])
+    def get_log_query(self, request):
+        query_ser = LogQuerySerializer(data=request.query_params)
+        if not query_ser.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            )
+
+        if self.log_service.index is None:
+            return Response(
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
+
+        filters = dict(query_ser.validated_data)
+        group_by = filters.pop("group_by", None)
+        if group_by is None:
+            count, entries, next_cursor = self.log_service.query_entries(**filters)
+            result = {"count": count, "entries": entries, "next": next_cursor}
+        else:
+            count, groups = self.log_service.aggregate_entries(group_by, **filters)
+            result = {"count": count, "groups": groups}
+
+        return Response(
+            status=status.HTTP_200_OK,
+            data=LogQueryResultSerializer(result).data,
+        )
+
     @action(detail=False, methods=["GET"])
     def get_log_file_status(self, request):
         query_ser = GetOperationQuerySerializer(data=request.query_params)
@@ -143,7 +527,18 @@ class AccessViewSet(ViewSet):
                 data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
             )
 
-        op = self.ops_service.get_operation(UUID(query_ser.data.get("id")))
+        op_id = UUID(query_ser.data.get("id"))
+        wait = query_ser.validated_data.get("wait")
+        if wait:
+            op = self.ops_service.wait_operation(op_id, timeout=wait)
+        else:
+            op = self.ops_service.get_operation(op_id)
+
+        if op is None and self.ops_service.is_expired(op_id):
+            return Response(
+                status=status.HTTP_410_GONE,
+            )
+
         if op is None:
             return Response(
                 status=status.HTTP_404_NOT_FOUND,
@@ -151,13 +546,100 @@ class AccessViewSet(ViewSet):
 
         return Response(
             status=status.HTTP_200_OK,
-            data=OperationSerializer(
-                {
-                    "id": op.id,
-                    "done": op.done,
-                    "result": {
-                        "path": op.result,
-                    },
-                }
-            ).data,
+            data=self._operation_data(op),
+        )
+
+    @action(detail=False, methods=["GET"])
+    def stream_log_file_status(self, request):
+        query_ser = GetOperationQuerySerializer(data=request.query_params)
+        if not query_ser.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            )
+
+        op_id = UUID(query_ser.data.get("id"))
+        op = self.ops_service.get_operation(op_id)
+        if op is None:
+            return Response(
+                status=status.HTTP_410_GONE if self.ops_service.is_expired(op_id) else status.HTTP_404_NOT_FOUND,
+            )
+
+        def __events():
+            current = op
+            yield format_event("status", self._operation_data(current))
+            while not current.done:
+                current = self.ops_service.wait_operation(op_id, timeout=self.sse_keepalive)
+                if current is None:
+                    yield format_event("expired", {"id": str(op_id)})
+                    return
+                if current.done:
+                    yield format_event("status", self._operation_data(current))
+                else:
+                    yield ": keepalive\n\n"
+
+        response = StreamingHttpResponse(__events(), content_type=EventStreamRenderer.media_type)
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    @action(detail=False, methods=["GET"])
+    def get_metrics(self, _):
+        return Response(
+            status=status.HTTP_200_OK,
+            data=metrics.render(),
+            content_type=METRICS_CONTENT_TYPE,
         )
+
+    @action(detail=False, methods=["GET"])
+    def get_operations_stats(self, _):
+        return Response(
+            status=status.HTTP_200_OK,
+            data=OperationsStatsSerializer(self.ops_service.get_stats()).data,
+        )
+
+    @staticmethod
+    def _access_decision(access) -> tuple[AccessLogStatus, int, dict | None]:
+        if access is AccessLogStatus.USER_NOT_FOUND:
+            return access, status.HTTP_404_NOT_FOUND, None
+        if access is AccessLogStatus.RESOURCE_NOT_FOUND:
+            return access, status.HTTP_403_FORBIDDEN, None
+        return AccessLogStatus.SUCCESS, status.HTTP_200_OK, {
+            "read": access.read,
+            "write": access.write,
+            "execute": access.execute,
+        }
+
+    @staticmethod
+    def _batch_decisions(pairs: list[tuple[str, str]], decisions: list) -> tuple[list[dict], list[tuple]]:
+        results = []
+        log_entries = []
+        for (user, resource), access in zip(pairs, decisions):
+            if isinstance(access, AccessLogStatus):
+                log_entries.append((user, resource, access))
+                results.append({"user": user, "resource": resource, "status": access.value})
+                continue
+
+            log_entries.append((user, resource, AccessLogStatus.SUCCESS))
+            results.append({
+                "user": user,
+                "resource": resource,
+                "status": AccessLogStatus.SUCCESS.value,
+                "read": access.read,
+                "write": access.write,
+                "execute": access.execute,
+            })
+        return results, log_entries
+
+    @staticmethod
+    def _operation_data(op) -> dict:
+        return OperationSerializer(
+            {
+                "id": op.id,
+                "done": op.done,
+                "result": op.result if isinstance(op.result, dict) else {
+                    "path": op.result,
+                },
+            }
+        ).data
+
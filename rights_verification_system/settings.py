@@ -87,6 +87,64 @@ SPECTACULAR_SETTINGS = {
 }
 
 
+ACCESS = {
+    "FORBIDDEN_CAPACITY": 100000,
+    # Directory for the grant write-ahead log and snapshots, e.g.
+    # BASE_DIR / "data" / "grants". Grants are kept in memory only when None.
+    # One process at a time: a second server worker or load_grants fails to
+    # open a store in use, run a single worker or use SHARED_TABLE_PATH.
+    "STORE_PATH": None,
+    "STORE_FSYNC": False,
+    "STORE_COMPACT_EVERY": 1000000,
+    # File holding a grant table shared by every worker process on the host,
+    # e.g. "/dev/shm/rvs-grants". Each worker keeps its own table when None.
+    # Cannot be combined with STORE_PATH.
+    "SHARED_TABLE_PATH": None,
+    "SHARED_TABLE_CAPACITY": 1 << 20,
+    # Resource -> users index behind GET access/holders, about 26 bytes per
+    # held right. Off when SHARED_TABLE_PATH is set.
+    "HOLDERS_INDEX": True,
+    # Rendered GET /access decisions kept per (user, resource), 0 disables.
+    # Off when SHARED_TABLE_PATH is set.
+    "DECISION_CACHE_SIZE": 100000,
+    # Seconds between sweeps revoking grants whose expires_in passed, so a
+    # grant can outlive its expiry by up to this long.
+    "EXPIRY_TICK": 1.0,
+    # GET/POST /access check input with compiled validators and render JSON
+    # only, without the browsable API. Invalid input still gets the same 422.
+    "LEAN_API": False,
+}
+
+ACCESS_LOG = {
+    "BUFFERED": True,
+    "FLUSH_INTERVAL": 1.0,
+    "FLUSH_SIZE": 1000,
+    "MAX_BYTES": 64 * 1024 * 1024,
+    "ROTATE_INTERVAL": 24 * 60 * 60,
+    "COMPRESSION": "gzip",
+    "INDEX": True,
+    # Rotated segments kept, oldest deleted first, 0 keeps all. The query
+    # index drops the entries of deleted segments.
+    "MAX_SEGMENTS": 0,
+}
+
+OPERATIONS = {
+    "EXECUTOR": "thread",
+    "MAX_WORKERS": 4,
+    "TTL": 60 * 60,
+    "MAX_OPERATIONS": 10000,
+    "SWEEP_INTERVAL": 60,
+}
+
+METRICS = {
+    # Directory where every worker process keeps its metrics so GET /metrics
+    # reports all of them, e.g. "/dev/shm/rvs-metrics". Each worker reports
+    # only its own when None.
+    "PATH": None,
+    # Seconds between copies of a worker's metrics to its file there, the
+    # other workers' numbers in GET /metrics are up to this old.
+    "REFRESH_INTERVAL": 15,
+}
 
 WSGI_APPLICATION = 'rights_verification_system.wsgi.application'
 
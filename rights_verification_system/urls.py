@@ -19,6 +19,9 @@ from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from rest_framework.renderers import JSONRenderer
+from access import async_views
+from access.renderers import EventStreamRenderer, MetricsRenderer
 from access.views import AccessViewSet
 
 urlpatterns = [
@@ -34,6 +37,61 @@ urlpatterns = [
         ),
         name="access_ops",
     ),
+    path(
+        "access/bulk",
+        AccessViewSet.as_view(
+            {
+                "post": "post_access_bulk",
+            }
+        ),
+        name="access_bulk_ops",
+    ),
+    path(
+        "access/batch",
+        AccessViewSet.as_view(
+            {
+                "post": "post_access_batch",
+            }
+        ),
+        name="access_batch_ops",
+    ),
+    path(
+        "access/roles",
+        AccessViewSet.as_view(
+            {
+                "post": "post_role_access",
+            }
+        ),
+        name="role_access_ops",
+    ),
+    path(
+        "access/roles/members",
+        AccessViewSet.as_view(
+            {
+                "post": "post_role_member",
+                "delete": "delete_role_member",
+            }
+        ),
+        name="role_member_ops",
+    ),
+    path(
+        "access/holders",
+        AccessViewSet.as_view(
+            {
+                "get": "get_holders",
+            }
+        ),
+        name="holders_ops",
+    ),
+    path(
+        "access/cache/stats",
+        AccessViewSet.as_view(
+            {
+                "get": "get_decision_cache_stats",
+            }
+        ),
+        name="decision_cache_stats",
+    ),
     path(
         "access/forbidden",
         AccessViewSet.as_view(
@@ -52,6 +110,15 @@ urlpatterns = [
         ),
         name="get_log_file",
     ),
+    path(
+        "log/query/",
+        AccessViewSet.as_view(
+            {
+                "get": "get_log_query",
+            }
+        ),
+        name="get_log_query",
+    ),
     path(
         "log/status/",
         AccessViewSet.as_view(
@@ -61,5 +128,49 @@ urlpatterns = [
         ),
         name="get_log_file_status",
     ),
+    path(
+        "log/status/stream/",
+        AccessViewSet.as_view(
+            {
+                "get": "stream_log_file_status",
+            },
+            renderer_classes=[JSONRenderer, EventStreamRenderer],
+        ),
+        name="stream_log_file_status",
+    ),
+    path(
+        "log/stats/",
+        AccessViewSet.as_view(
+            {
+                "get": "get_operations_stats",
+            }
+        ),
+        name="get_operations_stats",
+    ),
+    path(
+        "metrics",
+        AccessViewSet.as_view(
+            {
+                "get": "get_metrics",
+            },
+            renderer_classes=[MetricsRenderer],
+        ),
+        name="get_metrics",
+    ),
+    path(
+        "async/access",
+        async_views.get_access,
+        name="async_access_ops",
+    ),
+    path(
+        "async/access/batch",
+        async_views.post_access_batch,
+        name="async_access_batch_ops",
+    ),
+    path(
+        "async/log/status/",
+        async_views.get_log_file_status,
+        name="async_get_log_file_status",
+    ),
 
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)